@@ -6,7 +6,7 @@ from flask_mail import Mail
 from flask_migrate import Migrate
 from flask_cors import CORS
 from config import get_config
-from sqlalchemy import text
+from app.json_provider import FastJSONProvider
 
 # =======================
 # ایجاد نمونه اکستنشن‌ها
@@ -30,11 +30,28 @@ def create_app(config_name=None):
         Flask app instance
     """
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
 
     env = config_name or os.getenv("FLASK_ENV", "development")
     cfg_class = get_config(env)
     app.config.from_object(cfg_class)
     cfg_class.init_app(app)  
+
+    # =======================
+    # فشرده‌سازی پاسخ‌ها (اول ثبت می‌شود تا آخر اجرا شود)
+    # =======================
+    from app.compression import init_compression
+    init_compression(app)
+
+    # =======================
+    # ردیابی درخواست‌ها (span ها، هدر Server-Timing، خروجی OTLP)
+    # =======================
+    from app.tracing import init_tracing
+    init_tracing(app)
+
+    # پروفایل‌گیری درخواست‌ها فقط با PROFILING_ENABLED و هدر X-Profile
+    from app.profiling import init_profiling
+    init_profiling(app)
     
     # =======================
     # فعال‌سازی CORS برای مسیرهای API
@@ -48,17 +65,24 @@ def create_app(config_name=None):
     # =======================
     # مقداردهی اکستنشن‌ها
     # =======================
+    sqlite_profile = (
+        app.config.get('SQLITE_ENGINE_PROFILE')
+        and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+    )
+    if sqlite_profile:
+        from app.sqlite_profile import sqlite_engine_options
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options(app.config)
+
     db.init_app(app)
+    if sqlite_profile:
+        from app.sqlite_profile import init_sqlite_profile
+        init_sqlite_profile(app)
     login_manager.init_app(app)
     mail.init_app(app)
-    migrate.init_app(app, db)
-
-    # Enable WAL mode for better SQLite concurrency
-    if 'sqlite' in app.config['SQLALCHEMY_DATABASE_URI']:
-        with app.app_context():
-            with db.engine.connect() as connection:
-                with connection.begin():
-                    connection.execute(text("PRAGMA journal_mode=WAL"))
+    migrate.init_app(app, db, directory=app.config['MIGRATIONS_DIR'])
+
+    # No database I/O here: the schema check lives in app.startup and is run
+    # once by the entry point, not on every create_app call.
     # =======================
     # تنظیمات Login Manager
     # =======================
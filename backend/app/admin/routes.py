@@ -1,5 +1,6 @@
 # admin/routes.py
-from flask import jsonify, request
+import os
+from flask import current_app, jsonify, request
 from flask_login import login_required, current_user
 import datetime
 from datetime import timedelta
@@ -7,6 +8,7 @@ import pytz
 from app.models.user import User
 from app.models.score import Score
 from app.models.notification import Notification
+from app.data_version import GLOBAL, NOTIFICATIONS, bump, conditional
 from . import bp  # admin blueprint
 from functools import wraps
 
@@ -19,53 +21,8 @@ def admin_required(f):
     return decorated_function
 
 
-@bp.route('/user-results', methods=['GET'])
-@login_required
-@admin_required
-def api_user_results():
-    """
-    Returns user test results grouped per attempt for admin.
-    Optional filters:
-    - username
-    - test_number
-    - test_time (ISO string)
-    """
-
-    # Filters
-    filter_username = request.args.get('username')
-    filter_test_number = request.args.get('test_number')
-    filter_test_time = request.args.get('test_time')
-
-    # Base query with join to User
-    scores_query = Score.query.join(User, Score.user_id == User.id)
-
-    if filter_username:
-        scores_query = scores_query.filter(User.username == filter_username)
-
-    if filter_test_number:
-        try:
-            scores_query = scores_query.filter(Score.test_number == int(filter_test_number))
-        except ValueError:
-            return jsonify({'error': 'Invalid test_number'}), 400
-
-    if filter_test_time:
-        try:
-            # Parse frontend date as Tehran local midnight
-            tehran_tz = pytz.timezone('Asia/Tehran')
-            date_str = filter_test_time.split('T')[0]  # Extract YYYY-MM-DD
-            local_dt = datetime.datetime.strptime(date_str, '%Y-%m-%d').replace(tzinfo=tehran_tz)
-            # Convert to UTC for DB comparison
-            start_utc = local_dt.astimezone(pytz.UTC)
-            end_utc = start_utc + timedelta(days=1)
-            scores_query = scores_query.filter(
-                Score.test_time >= start_utc,
-                Score.test_time < end_utc
-            )
-        except ValueError:
-            return jsonify({'error': 'Invalid test_time format'}), 400
-
-    scores = scores_query.all()
-
+def build_user_result_rows(scores):
+    """Group Score rows per (user, test, attempt) into admin result rows, latest first"""
     # Group by (user_id, test_number, attempt_number)
     from collections import defaultdict
     groups = defaultdict(list)
@@ -92,7 +49,7 @@ def api_user_results():
             'round3': next((it.score for it in items_sorted if it.round_number == 3), None),
             'round4': next((it.score for it in items_sorted if it.round_number == 4), None),
             'round5': next((it.score for it in items_sorted if it.round_number == 5), None),
-            'test_time': (max(times).isoformat() if times else None),
+            'test_time': (max(times) if times else None),
             'approved': 'Yes' if approved else 'No',
             'total_score': total_score,
         }
@@ -130,22 +87,70 @@ def api_user_results():
     # sort results latest to oldest
     result.sort(
         key=lambda r: (
-            datetime.datetime.fromisoformat(r['test_time']) if r['test_time'] else datetime.datetime.min,
+            r['test_time'] or datetime.datetime.min,
             r['username'], r['test_number'], r['attempt_number']
         ),
         reverse=True
     )
+    return result
+
+
+@bp.route('/user-results', methods=['GET'])
+@login_required
+@admin_required
+@conditional(GLOBAL)
+def api_user_results():
+    """
+    Returns user test results grouped per attempt for admin.
+    Optional filters:
+    - username
+    - test_number
+    - test_time (ISO string)
+    """
+
+    # Filters
+    filter_username = request.args.get('username')
+    filter_test_number = request.args.get('test_number')
+    filter_test_time = request.args.get('test_time')
+
+    # Base query with join to User
+    scores_query = Score.query.join(User, Score.user_id == User.id)
+
+    if filter_username:
+        scores_query = scores_query.filter(User.username == filter_username)
+
+    if filter_test_number:
+        try:
+            scores_query = scores_query.filter(Score.test_number == int(filter_test_number))
+        except ValueError:
+            return jsonify({'error': 'Invalid test_number'}), 400
+
+    if filter_test_time:
+        try:
+            # Parse frontend date as Tehran local midnight
+            tehran_tz = pytz.timezone('Asia/Tehran')
+            date_str = filter_test_time.split('T')[0]  # Extract YYYY-MM-DD
+            local_dt = datetime.datetime.strptime(date_str, '%Y-%m-%d').replace(tzinfo=tehran_tz)
+            # Convert to UTC for DB comparison
+            start_utc = local_dt.astimezone(pytz.UTC)
+            end_utc = start_utc + timedelta(days=1)
+            scores_query = scores_query.filter(
+                Score.test_time >= start_utc,
+                Score.test_time < end_utc
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid test_time format'}), 400
+
+    scores = scores_query.all()
+
+    result = build_user_result_rows(scores)
 
     # Apply approved filter if requested
     filter_approved = request.args.get('approved')
     if filter_approved == 'Yes':
         result = [r for r in result if r['approved'] == 'Yes']
 
-    response = jsonify(result)
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    return jsonify(result)
 
 
 @bp.route('/user/<int:user_id>')
@@ -179,6 +184,7 @@ def get_current_user():
 @bp.route('/user-results/<username>', methods=['GET'])
 @login_required
 @admin_required
+@conditional(GLOBAL)
 def api_user_results_detail(username):
     """
     Returns approved test results for a specific user.
@@ -214,65 +220,8 @@ def api_user_results_detail(username):
 
     scores = scores_query.all()
 
-    # Group by (user_id, test_number, attempt_number)
-    from collections import defaultdict
-    groups = defaultdict(list)
-    for s in scores:
-        groups[(s.user_id, s.test_number, getattr(s, 'attempt_number', 1))].append(s)
-
-    result = []
-    for (user_id, test_number, attempt_number), items in groups.items():
-        items_sorted = sorted(items, key=lambda x: x.round_number)
-        round_set = {it.round_number for it in items_sorted}
-        times = [it.test_time for it in items_sorted]
-        approved = (round_set == {1, 2, 3, 4, 5} and times == sorted(times))
-        if not approved:
-            continue  # Only include approved
-        total_score = sum(it.score for it in items_sorted)
-
-        user = items_sorted[0].user
-        row = {
-            'username': user.username,
-            'age': user.age,
-            'gender': user.sex,
-            'test_number': test_number,
-            'attempt_number': attempt_number,
-            'round1': next((it.score for it in items_sorted if it.round_number == 1), None),
-            'round2': next((it.score for it in items_sorted if it.round_number == 2), None),
-            'round3': next((it.score for it in items_sorted if it.round_number == 3), None),
-            'round4': next((it.score for it in items_sorted if it.round_number == 4), None),
-            'round5': next((it.score for it in items_sorted if it.round_number == 5), None),
-            'test_time': (max(times).isoformat() if times else None),
-            'approved': 'Yes',
-            'total_score': total_score,
-        }
-        # Add per-round details and aggregate duplicates
-        from collections import Counter
-        all_correct = []
-        all_incorrect = []
-        rounds_detail = []
-        for item in items_sorted:
-            cw = item.correct_words or []
-            iw = item.incorrect_words or []
-            all_correct.extend(cw)
-            all_incorrect.extend(iw)
-            cd = [w for w, c in Counter(cw).items() if c > 1]
-            idup = [w for w, c in Counter(iw).items() if c > 1]
-            rounds_detail.append({
-                'round': item.round_number,
-                'correct_words': cw,
-                'incorrect_words': iw,
-                'correct_duplicates': cd,
-                'incorrect_duplicates': idup,
-            })
-        row['correct_words'] = all_correct
-        row['incorrect_words'] = all_incorrect
-        row['correct_duplicates'] = [w for w, c in Counter(all_correct).items() if c > 1]
-        row['incorrect_duplicates'] = [w for w, c in Counter(all_incorrect).items() if c > 1]
-        row['rounds_detail'] = rounds_detail
-        result.append(row)
-
-    # sort by test_number, attempt_number
+    # Only approved attempts, by test_number, attempt_number
+    result = [row for row in build_user_result_rows(scores) if row['approved'] == 'Yes']
     result.sort(key=lambda r: (r['test_number'], r['attempt_number']))
 
     return jsonify(result)
@@ -281,6 +230,7 @@ def api_user_results_detail(username):
 @bp.route('/notifications', methods=['GET'])
 @login_required
 @admin_required
+@conditional(NOTIFICATIONS)
 def get_notifications():
     """
     Returns recent notifications for admin.
@@ -314,6 +264,7 @@ def mark_notification_read(notification_id):
     
     notification = Notification.query.get_or_404(notification_id)
     notification.is_read = True
+    bump(NOTIFICATIONS)
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'Notification marked as read'})
@@ -329,6 +280,7 @@ def mark_all_notifications_read():
     from app import db
     
     Notification.query.filter(Notification.is_read == False).update({'is_read': True})
+    bump(NOTIFICATIONS)
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'All notifications marked as read'})
@@ -337,9 +289,161 @@ def mark_all_notifications_read():
 @bp.route('/notifications/count', methods=['GET'])
 @login_required
 @admin_required
+@conditional(NOTIFICATIONS)
 def get_unread_notifications_count():
     """
     Returns the count of unread notifications.
     """
     count = Notification.query.filter(Notification.is_read == False).count()
     return jsonify({'count': count})
+
+
+@bp.route('/recordings/<username>/<int:test_number>/<int:attempt_number>/<int:round_number>', methods=['GET'])
+@login_required
+@admin_required
+def get_recording(username, test_number, attempt_number, round_number):
+    """
+    Streams the stored recording behind one round's score (Range supported).
+    Optional query parameters:
+    - format: 'original' (default) or 'opus' (16 kHz mono, transcoded once and cached)
+    """
+    from flask import current_app
+    from app.delivery import send_offloaded
+    from app.recordings import OPUS_MIMETYPE, find_recording, transcode_opus
+
+    fmt = request.args.get('format', 'original')
+    if fmt not in ('original', 'opus'):
+        return jsonify({'error': 'Invalid format'}), 400
+
+    user = User.query.filter_by(username=username).first_or_404()
+    score = Score.query.filter_by(user_id=user.id, test_number=test_number,
+                                  attempt_number=attempt_number, round_number=round_number).first_or_404()
+    previous = Score.query.filter_by(user_id=user.id, test_number=test_number,
+                                     attempt_number=attempt_number - 1, round_number=round_number).first()
+
+    root = os.path.abspath(current_app.config['RECORDINGS_DIR'])
+    path = find_recording(root, user.username, test_number, round_number, score.test_time,
+                          previous.test_time if previous else None)
+    if path is None:
+        return jsonify({'error': 'Recording is no longer stored'}), 404
+
+    if path.endswith('.opus'):
+        # archived recording: already 16 kHz mono Opus
+        return send_offloaded(root, path, 'recordings', mimetype=OPUS_MIMETYPE, private=True)
+    if fmt == 'opus':
+        cache_root = os.path.abspath(current_app.config['RECORDINGS_CACHE_DIR'])
+        try:
+            path = transcode_opus(root, cache_root, path, current_app.config['RECORDINGS_OPUS_BITRATE'])
+        except Exception as e:
+            current_app.logger.error(f"Transcoding {path} failed: {e}")
+            return jsonify({'error': 'Transcoding failed'}), 500
+        return send_offloaded(cache_root, path, 'recordings_cache', mimetype=OPUS_MIMETYPE, private=True)
+    return send_offloaded(root, path, 'recordings', private=True)
+
+
+@bp.route('/metrics/compression', methods=['GET'])
+@login_required
+@admin_required
+def get_compression_metrics():
+    """
+    Returns response compression totals per encoding for this worker process.
+    """
+    from app.compression import compression_report
+    return jsonify(compression_report())
+
+
+@bp.route('/metrics/audio-decode', methods=['GET'])
+@login_required
+@admin_required
+def get_audio_decode_metrics():
+    """
+    Returns upload decode counts and timings per decode plan for this worker process.
+    """
+    from app.tests.probe import decode_report
+    return jsonify(decode_report())
+
+
+@bp.route('/metrics/asr-payload', methods=['GET'])
+@login_required
+@admin_required
+def get_asr_payload_metrics():
+    """
+    Returns recognizer payload bytes per stage (upload, pcm, trimmed, flac) for this worker process.
+    """
+    from app.tests.payload import payload_report
+    return jsonify(payload_report())
+
+
+@bp.route('/metrics/asr', methods=['GET'])
+@login_required
+@admin_required
+def get_asr_metrics():
+    """
+    Returns the ASR admission gauges (in flight, queued, waits, shed requests) and the
+    resilience stats (latency percentiles, hedges, timeouts, breaker state) and the recognizer
+    connection pool reuse for this worker process.
+    """
+    from app.tests.admission import get_governor
+    from app.tests.resilience import get_resilience
+    report = get_governor().report()
+    report['resilience'] = get_resilience().report()
+    if current_app.config['ASR_HTTP_POOL_SIZE']:
+        from app.tests.asr_pool import get_speech_client
+        report['http_pool'] = get_speech_client().report()
+    return jsonify(report)
+
+
+@bp.route('/metrics/logging', methods=['GET'])
+@login_required
+@admin_required
+def get_logging_metrics():
+    """
+    Returns the log queue depth and the records dropped (queue full) or sampled out for this worker process.
+    """
+    from app.log_pipeline import logging_report
+    return jsonify(logging_report())
+
+
+@bp.route('/profiles', methods=['GET'])
+@login_required
+@admin_required
+def list_profiles():
+    """
+    Lists the stored request profiles (newest first) of all worker processes.
+    """
+    from app.profiling import list_captures
+    return jsonify({'enabled': current_app.config['PROFILING_ENABLED'],
+                    'captures': list_captures(current_app.config['PROFILING_DIR'])})
+
+
+@bp.route('/profiles/<capture_id>', methods=['GET'])
+@login_required
+@admin_required
+def get_profile(capture_id):
+    """
+    Returns one capture's summary: timings, top allocation sites and, for cProfile captures, the top functions.
+    """
+    from app.profiling import capture_path
+    path = capture_path(current_app.config['PROFILING_DIR'], capture_id, '.json')
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    with open(path) as f:
+        return current_app.response_class(f.read(), mimetype='application/json')
+
+
+@bp.route('/profiles/<capture_id>/download', methods=['GET'])
+@login_required
+@admin_required
+def download_profile(capture_id):
+    """
+    Downloads a capture's profile: folded stacks (flamegraph.pl, speedscope) or a cProfile .prof file.
+    """
+    from flask import send_file
+    from app.profiling import ARTIFACTS, capture_path
+    directory = current_app.config['PROFILING_DIR']
+    for suffix in ('.folded', '.prof'):
+        path = capture_path(directory, capture_id, suffix)
+        if path:
+            return send_file(path, mimetype=ARTIFACTS[suffix], as_attachment=True,
+                             download_name=os.path.basename(path))
+    return jsonify({'error': 'Profile not found'}), 404
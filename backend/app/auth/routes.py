@@ -55,20 +55,16 @@ def rate_limit(key, max_attempts=None, window_minutes=None):
     return True
 
 def log_security_event(event_type, details, ip_address, username=None, severity="INFO"):
-    """Centralized security logging"""
-    log_message = f"SECURITY EVENT [{event_type}] - IP: {ip_address}"
+    """Centralized security logging; the event fields are also structured fields of the record"""
+    level = getattr(logging, severity, logging.INFO)
+    if not logger.isEnabledFor(level):
+        return
+    extra = {'event': event_type, 'ip': ip_address, 'user': username}
     if username:
-        log_message += f" - User: {username}"
-    log_message += f" - Details: {details}"
-    
-    if severity == "WARNING":
-        logger.warning(log_message)
-    elif severity == "ERROR":
-        logger.error(log_message)
-    elif severity == "CRITICAL":
-        logger.critical(log_message)
+        logger.log(level, "SECURITY EVENT [%s] - IP: %s - User: %s - Details: %s",
+                   event_type, ip_address, username, details, extra=extra)
     else:
-        logger.info(log_message)
+        logger.log(level, "SECURITY EVENT [%s] - IP: %s - Details: %s", event_type, ip_address, details, extra=extra)
 
 # ----------------------
 # Input Validation Decorator
@@ -107,7 +103,7 @@ def login(data):
 
         # Input validation
         if not username or not password:
-            logger.warning(f"Login attempt with missing credentials from IP: {client_ip}")
+            logger.warning("Login attempt with missing credentials from IP: %s", client_ip)
             return jsonify({"login": "failed", "error": "Username and password required"}), 400
 
         # Rate limiting using config values
@@ -156,7 +152,7 @@ def login(data):
             return jsonify({"login": "failed", "error": error_message}), 401
 
     except Exception as e:
-        logger.error(f"Login error: {str(e)}")
+        logger.error("Login error: %s", e)
         db.session.rollback()
         return jsonify({"login": "failed", "error": "Internal server error"}), 500
 
@@ -211,13 +207,13 @@ def register_api(data):
             return jsonify({"register": "failed", "error": "User already exists"}), 400
 
         user = create_user(username, email, password, age, sex)
-        logger.info(f"New user registered: {username}")
+        logger.info("New user registered: %s", username)
         return jsonify({"register": "successful", "user_id": user.id}), 201
 
     except ValueError as e:
         return jsonify({"register": "failed", "error": str(e)}), 400
     except Exception as e:
-        logger.error(f"Registration error: {str(e)}")
+        logger.error("Registration error: %s", e)
         db.session.rollback()
         return jsonify({"register": "failed", "error": "Internal server error"}), 500
 
@@ -243,7 +239,7 @@ def reset_password(data):
         reset_window_minutes = int(current_app.config.get('RESET_RATE_LIMIT_WINDOW', 3600)) // 60
         
         if not rate_limit(f"reset_{client_ip}", max_reset_attempts, reset_window_minutes):
-            logger.warning(f"Rate limit exceeded for password reset from IP: {client_ip}")
+            logger.warning("Rate limit exceeded for password reset from IP: %s", client_ip)
             return jsonify({"reset": "failed", "error": "Too many reset requests. Please try again later."}), 429
 
         user = User.query.filter(db.func.lower(User.email) == email.lower()).first()
@@ -261,17 +257,17 @@ def reset_password(data):
             
             record_reset_attempt(user)
             send_password_reset_email(user)
-            logger.info(f"Password reset requested for email: {email}")
+            logger.info("Password reset requested for email: %s", email)
             
             # Only successful if user exists and email is sent
             return jsonify({"reset": "successful"}), 200
 
         else:
-            logger.warning(f"Password reset requested for non-existent email: {email}")
+            logger.warning("Password reset requested for non-existent email: %s", email)
             return jsonify({"reset": "failed", "error": "Email does not exist!"}), 404
 
     except Exception as e:
-        logger.error(f"Password reset error: {str(e)}")
+        logger.error("Password reset error: %s", e)
         return jsonify({"reset": "failed", "error": "Internal server error."}), 500
 
 # ----------------------
@@ -288,7 +284,7 @@ def api_password_reset_confirm(token, data):
         user = User.query.filter_by(reset_token=token).first()
 
         if not user:
-            logger.warning(f"Invalid password reset token attempted: {token[:10]}...")
+            logger.warning("Invalid password reset token attempted: %s...", token[:10])
             return jsonify({"reset": "invalidToken"}), 400
 
         # Check token expiration
@@ -321,11 +317,11 @@ def api_password_reset_confirm(token, data):
         
         db.session.commit()
 
-        logger.info(f"Password reset completed for user: {user.username}")
+        logger.info("Password reset completed for user: %s", user.username)
         return jsonify({"reset": "successful"}), 200
 
     except Exception as e:
-        logger.error(f"Password reset confirm error: {str(e)}")
+        logger.error("Password reset confirm error: %s", e)
         db.session.rollback()
         return jsonify({"reset": "failed", "error": "Internal server error"}), 500
 
@@ -349,7 +345,7 @@ def api_logout():
         session.permanent = False
         session.modified = True
 
-        logger.info(f"User logged out successfully: {username} (ID: {user_id})")
+        logger.info("User logged out successfully: %s (ID: %s)", username, user_id)
         
         # Create response with proper headers
         response = jsonify({"logoutStatus": "1", "message": "Logged out successfully"})
@@ -366,7 +362,7 @@ def api_logout():
         return response, 200
 
     except Exception as e:
-        logger.error(f"Logout error: {str(e)}")
+        logger.error("Logout error: %s", e)
         # Even if error occurs, try to clear session
         try:
             session.clear()
@@ -394,7 +390,7 @@ def check_login():
         return response
         
     except Exception as e:
-        logger.error(f"Check login error: {str(e)}")
+        logger.error("Check login error: %s", e)
         response = jsonify({"logged": "false"})
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         return response
@@ -422,7 +418,7 @@ def check_admin():
         return response
         
     except Exception as e:
-        logger.error(f"Check admin error: {str(e)}")
+        logger.error("Check admin error: %s", e)
         response = jsonify({"isAdmin": "false"})
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         return response
@@ -448,20 +444,20 @@ def get_current_user():
         return response
         
     except Exception as e:
-        logger.error(f"Get current user error: {str(e)}")
+        logger.error("Get current user error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 
 # ----------------------
 # Session cleanup on app startup
 # ----------------------
-@bp.before_app_request  # changed, "before_app_first_request" is removed in flask 2.3 
-def cleanup_sessions():
+@bp.record_once  # once per app at registration, not before every request
+def cleanup_sessions(state):
     """Clean up any stale sessions on app startup"""
     try:
         # This would be implemented based the session storage
         # For file-based sessions, to clean up old session files
         # For Redis/database sessions, clean up expired entries
-        logger.info("Session cleanup completed")
+        logger.debug("Session cleanup completed")
     except Exception as e:
-        logger.error(f"Session cleanup error: {str(e)}")
\ No newline at end of file
+        logger.error("Session cleanup error: %s", e)
\ No newline at end of file
@@ -204,57 +204,66 @@ If you did not request this, please ignore this email.
         raise
 
 
+# ----------------------
+# Validate new user fields
+# ----------------------
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256:150000'
+
+RESERVED_USERNAMES = [
+    'admin', 'administrator', 'root', 'system', 'api', 'www',
+    'mail', 'email', 'support', 'help', 'info', 'contact',
+    'test', 'demo', 'guest', 'null', 'undefined'
+]
+
+VALID_SEX_VALUES = ['male', 'female', 'other', 'prefer_not_to_say']
+
+
+def validate_new_user(username, email, password, age=None, sex=None):
+    """Raise ValueError if the fields of a new user break a registration rule"""
+    # Basic validation
+    if not username or not email or not password:
+        raise ValueError("Username, email, and password are required")
+
+    # Validate email
+    if not is_valid_email(email):
+        raise ValueError("Invalid email format")
+
+    # Validate password
+    is_valid, message = validate_password_strength(password)
+    if not is_valid:
+        raise ValueError(message)
+
+    # Validate username
+    if len(username) < 3 or len(username) > 50:
+        raise ValueError("Username must be between 3 and 50 characters")
+
+    if not re.match(r'^[a-zA-Z0-9_]+$', username):
+        raise ValueError("Username can only contain letters, numbers, and underscores")
+
+    # Check for reserved usernames
+    if username.lower() in RESERVED_USERNAMES:
+        raise ValueError("Username is not available")
+
+    # Validate age if provided
+    if age is not None:
+        if not isinstance(age, int) or age < 13 or age > 120:
+            raise ValueError("Age must be between 13 and 120")
+
+    # Validate sex if provided
+    if sex and sex not in VALID_SEX_VALUES:
+        raise ValueError("Invalid sex value")
+
+
 # ----------------------
 # Create user with validation
 # ----------------------
 def create_user(username, email, password, age=None, sex=None):
     """Create user with comprehensive validation and security measures"""
     try:
-        # Basic validation
-        if not username or not email or not password:
-            raise ValueError("Username, email, and password are required")
-        
-        # Validate email
-        if not is_valid_email(email):
-            raise ValueError("Invalid email format")
-        
-        # Validate password
-        is_valid, message = validate_password_strength(password)
-        if not is_valid:
-            raise ValueError(message)
-        
-        # Validate username
-        if len(username) < 3 or len(username) > 50:
-            raise ValueError("Username must be between 3 and 50 characters")
-        
-        if not re.match(r'^[a-zA-Z0-9_]+$', username):
-            raise ValueError("Username can only contain letters, numbers, and underscores")
-        
-        # Check for reserved usernames
-        reserved_usernames = [
-            'admin', 'administrator', 'root', 'system', 'api', 'www',
-            'mail', 'email', 'support', 'help', 'info', 'contact',
-            'test', 'demo', 'guest', 'null', 'undefined'
-        ]
-        
-        if username.lower() in reserved_usernames:
-            raise ValueError("Username is not available")
-        
-        # Validate age if provided
-        if age is not None:
-            if not isinstance(age, int) or age < 13 or age > 120:
-                raise ValueError("Age must be between 13 and 120")
-        
-        # Validate sex if provided
-        valid_sex_values = ['male', 'female', 'other', 'prefer_not_to_say']
-        if sex and sex not in valid_sex_values:
-            raise ValueError("Invalid sex value")
-        
+        validate_new_user(username, email, password, age, sex)
+
         # Generate secure password hash
-        password_hash = generate_password_hash(
-            password, 
-            method='pbkdf2:sha256:150000'
-        )
+        password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
         
         # Create user object
         user_data = {
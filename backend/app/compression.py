@@ -0,0 +1,164 @@
+"""
+Response compression for the JSON APIs.
+
+An after_request hook negotiates brotli (when the ``brotli`` package is
+installed) or gzip from Accept-Encoding and compresses eligible responses:
+
+- only COMPRESS_MIMETYPES (JSON/text), so audio, images and send_file
+  responses (direct passthrough) are left alone
+- buffered bodies below COMPRESS_MIN_SIZE are sent as is
+- streamed (generator) bodies are compressed chunk by chunk and flushed
+  after every chunk, so the client still receives them incrementally
+
+Compressed responses get ``Vary: Accept-Encoding`` and their strong ETag is
+weakened, as the bytes differ per encoding (If-None-Match still matches,
+see app.data_version). Bytes in/out and CPU time per encoding are collected
+in ``compression_stats``.
+"""
+import threading
+import time
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+compression_stats = {}
+_stats_lock = threading.Lock()
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def process(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def process(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def make_compressor(encoding, config):
+    if encoding == 'br':
+        return BrotliCompressor(config['COMPRESS_BR_QUALITY'])
+    return GzipCompressor(config['COMPRESS_GZIP_LEVEL'])
+
+
+def choose_encoding(accept_encodings):
+    """Best supported encoding by client quality (brotli wins ties), or None"""
+    candidates = ('br', 'gzip') if brotli is not None else ('gzip',)
+    best = max(candidates, key=lambda encoding: accept_encodings.quality(encoding))
+    return best if accept_encodings.quality(best) > 0 else None
+
+
+def record(encoding, bytes_in, bytes_out, cpu_s):
+    with _stats_lock:
+        stats = compression_stats.setdefault(encoding, {'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_s': 0.0})
+        stats['responses'] += 1
+        stats['bytes_in'] += bytes_in
+        stats['bytes_out'] += bytes_out
+        stats['cpu_s'] += cpu_s
+
+
+def compression_report():
+    """Snapshot of compression_stats with ratio and mean CPU time per response"""
+    with _stats_lock:
+        report = {encoding: dict(stats) for encoding, stats in compression_stats.items()}
+    for stats in report.values():
+        stats['ratio'] = stats['bytes_in'] / stats['bytes_out'] if stats['bytes_out'] else None
+        stats['cpu_ms_per_response'] = stats['cpu_s'] * 1000 / stats['responses']
+    return report
+
+
+def _compress_stream(chunks, compressor, encoding):
+    bytes_in = bytes_out = 0
+    cpu_s = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if not chunk:
+                continue
+            start = time.thread_time()
+            data = compressor.process(chunk) + compressor.flush()
+            cpu_s += time.thread_time() - start
+            bytes_in += len(chunk)
+            bytes_out += len(data)
+            yield data
+        start = time.thread_time()
+        data = compressor.finish()
+        cpu_s += time.thread_time() - start
+        bytes_out += len(data)
+        yield data
+        record(encoding, bytes_in, bytes_out, cpu_s)
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    config = current_app.config
+    if response.status_code == 304:
+        # a revalidated representation carries the same Vary as the full one
+        response.vary.add('Accept-Encoding')
+        return response
+    if (
+        request.method == 'HEAD'
+        or response.status_code < 200 or response.status_code in (204, 206)
+        or response.status_code >= 300
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in config['COMPRESS_MIMETYPES']
+        or 'no-transform' in response.headers.get('Cache-Control', '')
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    compressor = make_compressor(encoding, config)
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, compressor, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < config['COMPRESS_MIN_SIZE']:
+            return response
+        start = time.thread_time()
+        data = compressor.process(body) + compressor.finish()
+        record(encoding, len(body), len(data), time.thread_time() - start)
+        response.set_data(data)
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    """Register the compression hook; call before other after_request hooks (it runs last)"""
+    if app.config.get('COMPRESS_ENABLED'):
+        app.after_request(compress_response)
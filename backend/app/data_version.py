@@ -0,0 +1,103 @@
+"""
+Data-version counters and conditional GET for the dashboard APIs.
+
+Every write that changes what a dashboard endpoint returns bumps one or more
+counters in the same transaction as the write. Read endpoints derive an
+ETag from the counters they depend on plus the request (path, query string,
+user) and answer a matching If-None-Match with 304 after a single
+primary-key lookup, before any score query runs. The ETag is always sent
+weak (``W/"..."``): it identifies the data, not the bytes, which differ per
+Content-Encoding once responses are compressed, and a 304 carries the same
+form as the 200 it revalidates.
+
+Scopes:
+- GLOBAL         any score (admin result views)
+- NOTIFICATIONS  notification rows and their read state
+- user:<id>      one user's scores and profile fields
+"""
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request
+from flask_login import current_user
+from sqlalchemy import insert, select, update
+
+from app import db
+from app.db_utils import dialect_insert, supports_upsert
+from app.models.data_version import DataVersion
+
+GLOBAL = 'global'
+NOTIFICATIONS = 'notifications'
+USER = 'user:{user_id}'
+
+CACHE_CONTROL = 'private, no-cache'
+
+
+def user_scope(user_id):
+    return USER.format(user_id=user_id)
+
+
+def bump(*names):
+    """Increment the given counters in the current transaction; the caller commits"""
+    table = DataVersion.__table__
+    names = sorted(set(names))  # fixed lock order
+    if supports_upsert():
+        stmt = dialect_insert(table).values([{'name': name, 'version': 1} for name in names])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.name], set_={'version': table.c.version + 1}
+        ))
+        return
+
+    for name in names:
+        updated = db.session.execute(
+            update(table).where(table.c.name == name).values(version=table.c.version + 1)
+        ).rowcount
+        if not updated:
+            db.session.execute(insert(table).values(name=name, version=1))
+
+
+def get_versions(names):
+    """Current counter per name (0 when never bumped)"""
+    table = DataVersion.__table__
+    rows = db.session.execute(select(table.c.name, table.c.version).where(table.c.name.in_(names)))
+    versions = dict(rows.all())
+    return [versions.get(name, 0) for name in names]
+
+
+def compute_etag(names, versions):
+    user_id = current_user.get_id() if current_user.is_authenticated else ''
+    key = '|'.join([
+        request.path,
+        '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True))),
+        str(user_id),
+        ','.join(f"{name}={version}" for name, version in zip(names, versions)),
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def conditional(*scopes):
+    """
+    Serve the view with an ETag derived from `scopes` and answer If-None-Match with 304.
+
+    Scopes may use '{user_id}' for the logged-in user. Place below
+    login_required/admin_required. The versions are read before the view
+    runs, so a write racing the view can only make the ETag older than the
+    body, which costs the client one extra full response, never a stale 304.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            names = [scope.format(user_id=current_user.get_id()) for scope in scopes]
+            etag = compute_etag(names, get_versions(names))
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,45 @@
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+# dialects whose INSERT supports ON CONFLICT DO NOTHING / DO UPDATE
+UPSERT_DIALECTS = ('sqlite', 'postgresql')
+
+
+def supports_upsert():
+    return db.session.get_bind().dialect.name in UPSERT_DIALECTS
+
+
+def dialect_insert(table):
+    """
+    INSERT construct of the session's dialect, for ON CONFLICT (SQLite and PostgreSQL only).
+
+    Callers check supports_upsert() first and take a portable path on other
+    databases, so the NotImplementedError below is never reached from a request.
+    """
+    name = db.session.get_bind().dialect.name
+    if name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as upsert_insert
+    elif name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as upsert_insert
+    else:
+        raise NotImplementedError(
+            f"INSERT ... ON CONFLICT is not available on {name}; supported databases: {', '.join(UPSERT_DIALECTS)}"
+        )
+    return upsert_insert(table)
+
+
+def insert_if_absent(table, values):
+    """
+    Portable INSERT ... ON CONFLICT DO NOTHING: insert `values` in a savepoint.
+
+    Returns False, leaving the outer transaction intact, if a unique
+    constraint rejected the row.
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(table).values(**values))
+    except IntegrityError:
+        return False
+    return True
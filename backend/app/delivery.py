@@ -0,0 +1,81 @@
+"""
+File delivery with front-proxy offload.
+
+send_offloaded() is send_from_directory plus cache headers, with the
+transfer itself optionally handed to the web server in front of the app
+(SENDFILE_BACKEND):
+
+- None          the worker streams the file (werkzeug: Range, ETag, Last-Modified)
+- 'x-sendfile'  Apache mod_xsendfile / lighttpd: X-Sendfile with the absolute path
+- 'x-accel'     nginx: X-Accel-Redirect to SENDFILE_ACCEL_PREFIX/<location>/<path>,
+                an `internal` location aliased to the same directory
+
+With offload the proxy answers Range and conditional requests, the worker
+only resolves the path and sets headers.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import current_app, request
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def cache_control(response, max_age=None, immutable=False, private=False):
+    directives = ['private' if private else 'public']
+    if max_age is None:
+        directives.append('no-cache')
+    else:
+        directives.append(f"max-age={max_age}")
+        if immutable:
+            directives.append('immutable')
+    response.headers['Cache-Control'] = ', '.join(directives)
+    return response
+
+
+def send_offloaded(directory, path, location, mimetype=None, max_age=None, immutable=False,
+                   private=False, download_name=None):
+    """
+    Send `path` from `directory`, offloading to the front proxy when configured.
+
+    `location` names the directory for X-Accel-Redirect (nginx maps
+    SENDFILE_ACCEL_PREFIX/<location>/ to `directory`). max_age=None means
+    always revalidate; immutable is for content-addressed names only.
+    """
+    config = current_app.config
+    filename = safe_join(os.fspath(directory), path)
+    if filename is None or not os.path.isfile(filename):
+        raise NotFound()
+
+    backend = config.get('SENDFILE_BACKEND')
+    if backend == 'x-accel':
+        response = current_app.response_class(mimetype=mimetype or _guess_mimetype(filename))
+        prefix = config['SENDFILE_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = quote(f"{prefix}/{location}/{path}")
+        if download_name:
+            response.headers['Content-Disposition'] = f"inline; filename*=UTF-8''{quote(download_name)}"
+    else:
+        response = send_file(
+            filename,
+            request.environ,
+            mimetype=mimetype,
+            download_name=download_name,
+            conditional=True,
+            etag=True,
+            max_age=max_age,
+            use_x_sendfile=backend == 'x-sendfile',
+            response_class=current_app.response_class,
+            _root_path=current_app.root_path,
+        )
+        if backend is None and response.status_code == 200:
+            # werkzeug only sends it on 206; advertise it so players seek with Range
+            response.accept_ranges = 'bytes'
+    return cache_control(response, max_age=max_age, immutable=immutable, private=private)
+
+
+def _guess_mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
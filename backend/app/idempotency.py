@@ -0,0 +1,111 @@
+"""
+Idempotency-Key support for submit_audio.
+
+A client that retries an upload (timeout, flaky mobile connection) sends
+the same ``Idempotency-Key`` header. The first request claims the key; the
+successful result is stored in the same commit as the score, and retries
+get that stored response back without saving or transcribing again.
+
+- same key, different request (test, round or audio)  -> MISMATCH (422)
+- same key while the first request is still running    -> IN_PROGRESS (409)
+- failed requests release their claim so a retry runs normally
+- claims older than IDEMPOTENCY_LOCK_TIMEOUT without a result are treated
+  as abandoned, stored results expire after IDEMPOTENCY_TTL
+"""
+import hashlib
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, update
+
+from app import db
+from app.db_utils import dialect_insert, insert_if_absent, supports_upsert
+from app.models.idempotency_key import IdempotencyKey
+from app.sqlite_profile import retry_on_busy
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+CLAIMED = 'claimed'
+REPLAY = 'replay'
+IN_PROGRESS = 'in_progress'
+MISMATCH = 'mismatch'
+
+
+def request_fingerprint(*parts, stream=None):
+    """sha256 over `parts` and, if given, the contents of `stream` (rewound afterwards)"""
+    digest = hashlib.sha256('|'.join(str(p) for p in parts).encode('utf-8'))
+    if stream is not None:
+        for block in iter(lambda: stream.read(1 << 16), b''):
+            digest.update(block)
+        stream.seek(0)
+    return digest.hexdigest()
+
+
+@retry_on_busy()
+def claim(user_id, key, fingerprint):
+    """Claim `key` for this request; returns (state, IdempotencyKey or None)"""
+    table = IdempotencyKey.__table__
+    now = datetime.utcnow()
+    values = {'user_id': user_id, 'key': key, 'fingerprint': fingerprint, 'created_at': now}
+    if supports_upsert():
+        inserted = db.session.execute(
+            dialect_insert(table).values(**values)
+            .on_conflict_do_nothing(index_elements=[table.c.user_id, table.c.key])
+        ).rowcount
+    else:
+        inserted = insert_if_absent(table, values)
+    if inserted:
+        db.session.commit()
+        return CLAIMED, None
+
+    record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).one()
+    age = now - record.created_at
+    expired = age > current_app.config['IDEMPOTENCY_TTL']
+    abandoned = record.status_code is None and age > current_app.config['IDEMPOTENCY_LOCK_TIMEOUT']
+    if expired or abandoned:
+        # take over, unless another request took it over first
+        taken = db.session.execute(
+            update(table)
+            .where(table.c.id == record.id, table.c.created_at == record.created_at)
+            .values(fingerprint=fingerprint, status_code=None, response=None, created_at=now)
+        ).rowcount
+        db.session.commit()
+        return (CLAIMED, None) if taken else (IN_PROGRESS, None)
+
+    db.session.rollback()
+    if record.fingerprint != fingerprint:
+        return MISMATCH, record
+    if record.status_code is None:
+        return IN_PROGRESS, record
+    return REPLAY, record
+
+
+def record_response(user_id, key, status_code, payload):
+    """Store the result in the current transaction; the caller commits it together with the data"""
+    table = IdempotencyKey.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.user_id == user_id, table.c.key == key)
+        .values(status_code=status_code, response=payload)
+    )
+
+
+@retry_on_busy()
+def release(user_id, key):
+    """Drop an unfinished claim so the client can retry"""
+    table = IdempotencyKey.__table__
+    db.session.execute(
+        delete(table).where(table.c.user_id == user_id, table.c.key == key, table.c.status_code.is_(None))
+    )
+    db.session.commit()
+
+
+def purge_expired():
+    """Delete stored keys older than IDEMPOTENCY_TTL; returns the number deleted"""
+    cutoff = datetime.utcnow() - current_app.config['IDEMPOTENCY_TTL']
+    deleted = db.session.execute(
+        delete(IdempotencyKey.__table__).where(IdempotencyKey.__table__.c.created_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    return deleted
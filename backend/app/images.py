@@ -0,0 +1,92 @@
+"""
+Profile photo pipeline.
+
+An upload is decoded once, EXIF orientation is applied and all metadata
+(EXIF, GPS, ICC, comments) is dropped by re-encoding. Square thumbnails are
+written for every PROFILE_PHOTO_SIZES entry as WebP and JPEG under
+content-hash names ``<hash>-<size>.<ext>``. A name never changes content,
+so the files can be cached forever (see get_profile_photo), and identical
+uploads share the same files.
+
+Pillow is imported on the first upload, so workers that never process a
+photo do not load it at start.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+ACCEPTED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+HASHED_NAME = re.compile(r'^[0-9a-f]{20}-\d+\.(webp|jpg)$')
+
+ENCODERS = {
+    'webp': ('WEBP', {'method': 4}),
+    'jpg': ('JPEG', {'optimize': True, 'progressive': True}),
+}
+
+
+def is_hashed_name(filename):
+    return bool(HASHED_NAME.match(filename))
+
+
+def _load(stream, max_pixels, largest_size):
+    """Decode `stream` to an upright RGB image; raises ValueError for anything unusable"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(stream) as image:
+            if image.format not in ACCEPTED_FORMATS:
+                raise ValueError('Unsupported image format')
+            if image.width * image.height > max_pixels:
+                raise ValueError('Image dimensions are too large')
+            # JPEG can decode at 1/2..1/8 scale directly, far cheaper than a full decode
+            image.draft('RGB', (largest_size * 2, largest_size * 2))
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                return background
+            return image.convert('RGB')
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError('Invalid image file') from e
+
+
+def _write_atomic(image, path, fmt, options):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, fmt, **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def process_profile_photo(stream, dest_dir, sizes, quality=82, max_pixels=40_000_000):
+    """
+    Write the thumbnails of the image in `stream` to `dest_dir`.
+
+    Returns {size: {'webp': filename, 'jpg': filename}}. Files that already
+    exist (same content hash) are not rewritten.
+    """
+    from PIL import Image, ImageOps
+
+    image = _load(stream, max_pixels, max(sizes))
+    digest = hashlib.sha256(image.tobytes()).hexdigest()[:20]
+    os.makedirs(dest_dir, exist_ok=True)
+
+    variants = {}
+    for size in sorted(sizes):
+        thumbnail = None
+        variants[size] = {}
+        for ext, (fmt, options) in ENCODERS.items():
+            filename = f"{digest}-{size}.{ext}"
+            variants[size][ext] = filename
+            path = os.path.join(dest_dir, filename)
+            if os.path.exists(path):
+                continue
+            if thumbnail is None:
+                thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            _write_atomic(thumbnail, path, fmt, dict(options, quality=quality))
+    return variants
@@ -0,0 +1,63 @@
+import datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib json module is used without it
+    orjson = None
+
+
+def _default(o):
+    """Dates as ISO 8601 (Flask's default is an HTTP date), everything else as Flask does"""
+    if isinstance(o, (datetime.date, datetime.time)):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider for large API payloads.
+
+    Uses orjson when it is installed (native datetime support, UTF-8 output
+    written straight into the response body) and falls back to the stdlib
+    provider otherwise. Both paths produce the same document: datetimes as
+    ISO 8601, non-ASCII text unescaped and keys in insertion order.
+    """
+    default = staticmethod(_default)
+    ensure_ascii = False
+    sort_keys = False
+
+    def _orjson_option(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._orjson_option(kwargs.get('indent'))).decode()
+        except TypeError:
+            # e.g. integers beyond 64 bits, which only the stdlib encoder accepts
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            body = orjson.dumps(obj, default=self.default,
+                                option=self._orjson_option(indent) | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
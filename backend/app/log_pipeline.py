@@ -0,0 +1,285 @@
+"""
+Asynchronous, structured logging.
+
+configure_logging() puts a single QueueHandler on the root logger, so every
+logger of the app (and of its libraries) hands its records to an in-memory
+queue and returns. A QueueListener thread takes them off the queue and does
+the formatting and I/O:
+
+- stdout: JSON lines, or the classic text format with LOG_FORMAT='text'
+- LOG_FILE: JSON lines through MultiProcessRotatingFileHandler, which
+  rotates under an flock so several gunicorn workers can share one file
+- syslog (/dev/log) for warnings and above when LOG_SYSLOG is set
+
+Messages are formatted lazily: calls use ``logger.info("... %s", value)``
+and the message is only built in the listener thread, unless one of the
+arguments is a mutable object that could change before then. Values passed
+with ``extra={...}`` become fields of the JSON record.
+
+Records below WARNING from the loggers in LOG_SAMPLING are sampled: with
+``{'app.tests.admission': 10}`` one in ten is kept and carries
+``"sampled": 10``. When the queue (LOG_QUEUE_SIZE) is full, records are
+dropped instead of blocking the request; log_stats counts both.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, SysLogHandler
+from multiprocessing import util as mp_util
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; rotation is then per process only
+    fcntl = None
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'sampled'}
+_IMMUTABLE = (str, int, float, bool, type(None), bytes)
+
+log_stats = {'dropped': 0, 'sampled_out': 0}
+_stats_lock = threading.Lock()
+
+_queue_handler = None
+_listener = None
+
+
+def _is_immutable(value):
+    if isinstance(value, tuple):
+        return all(_is_immutable(item) for item in value)
+    return isinstance(value, _IMMUTABLE)
+
+
+def _count(key):
+    with _stats_lock:
+        log_stats[key] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, source and extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+            'src': f'{record.module}:{record.lineno}',
+        }
+        sampled = getattr(record, 'sampled', None)
+        if sampled:
+            entry['sampled'] = sampled
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in `rates[logger]` records below WARNING from the listed loggers (and their children)"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {name: int(rate) for name, rate in rates.items() if int(rate) > 1}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _rate(self, name):
+        while name:
+            if name in self.rates:
+                return name, self.rates[name]
+            name = name.rpartition('.')[0]
+        return None, 1
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name, rate = self._rate(record.name)
+        if rate == 1:
+            return True
+        with self._lock:
+            count = self._counters.get(name, 0)
+            self._counters[name] = count + 1
+        if count % rate:
+            _count('sampled_out')
+            return False
+        record.sampled = rate
+        return True
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks and defers formatting.
+
+    The stdlib prepare() formats the message in the calling thread; here the
+    record keeps msg and args when all arguments are immutable, so the
+    listener does the formatting. Tracebacks are rendered right away, as
+    they reference live frames.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if args and not _is_immutable(tuple(args.values()) if isinstance(args, dict) else args):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count('dropped')
+
+
+class MultiProcessRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler for a file shared by several processes.
+
+    Every write takes an exclusive flock on ``<file>.lock``. Under the lock
+    the handler first checks whether another process already rotated the
+    file (its inode changed) and reopens it, then lets RotatingFileHandler
+    check the size and rotate. The stream is opened in append mode, so
+    concurrent writers never overwrite each other.
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, encoding='utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self._lock_file = None
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self.stream.fileno()).st_ino:
+            self.stream.close()
+            self.stream = None  # reopened by emit()
+
+    def emit(self, record):
+        if fcntl is None:
+            return super().emit(record)
+        try:
+            if self._lock_file is None:
+                self._lock_file = open(self.baseFilename + '.lock', 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._reopen_if_rotated()
+                super().emit(record)
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+    def reopen(self):
+        """Drop the inherited stream and lock after a fork: an flock is shared with the parent's descriptor"""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def build_handlers(config):
+    """The handlers the listener writes to, per LOG_* settings"""
+    handlers = []
+    if config.get('LOG_TO_STDOUT'):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if config.get('LOG_FORMAT', 'json') == 'json'
+                             else logging.Formatter(TEXT_FORMAT))
+        handlers.append(handler)
+
+    log_file = config.get('LOG_FILE')
+    if log_file and not config.get('TESTING'):
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        handler = MultiProcessRotatingFileHandler(log_file, config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+                                                  config.get('LOG_BACKUP_COUNT', 5))
+        handler.setFormatter(JsonFormatter())
+        handlers.append(handler)
+
+    if config.get('LOG_SYSLOG') and os.path.exists('/dev/log'):
+        handler = SysLogHandler(address='/dev/log')
+        handler.setLevel(logging.WARNING)
+        handler.setFormatter(logging.Formatter('%(name)s: %(levelname)s %(message)s'))
+        handlers.append(handler)
+    return handlers
+
+
+def _start_listener(handlers):
+    global _listener
+    _queue_handler.queue = queue.Queue(_queue_handler.queue.maxsize)
+    _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork():
+    # the listener thread does not survive a fork: start a new one on a fresh queue
+    if _listener is not None:
+        for handler in _listener.handlers:
+            if isinstance(handler, MultiProcessRotatingFileHandler):
+                handler.reopen()
+        _start_listener(_listener.handlers)
+
+
+def stop_logging():
+    """Flush the queue and stop the listener (registered with atexit)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def configure_logging(config):
+    """Route all logging through the queue; later calls in the same process are no-ops"""
+    global _queue_handler
+    if _queue_handler is not None:
+        return
+
+    level = getattr(logging, config.get('LOG_LEVEL', 'INFO').upper())
+    _queue_handler = AsyncQueueHandler(queue.Queue(config.get('LOG_QUEUE_SIZE', 10000)))
+    _queue_handler.addFilter(SamplingFilter(config.get('LOG_SAMPLING') or {}))
+    _start_listener(build_handlers(config))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    atexit.register(stop_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_after_fork)
+    # multiprocessing children leave through os._exit, past atexit: drain the queue in their finalizers
+    mp_util.register_after_fork(_queue_handler, lambda handler: mp_util.Finalize(None, stop_logging, exitpriority=0))
+
+
+def logging_report():
+    with _stats_lock:
+        report = dict(log_stats)
+    report['queued'] = _queue_handler.queue.qsize() if _queue_handler is not None else None
+    return report
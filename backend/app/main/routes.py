@@ -2,10 +2,14 @@ from flask_login import login_required, current_user
 from app.main import bp
 from app.models.score import Score
 import os
-from flask import request, jsonify, current_app, send_from_directory, send_file
-from werkzeug.utils import secure_filename
+from flask import request, jsonify, current_app
+from werkzeug.security import safe_join
 from app.models.user import User
 from app import db
+from app.data_version import USER, bump, conditional, user_scope
+from app.delivery import IMMUTABLE_MAX_AGE, send_offloaded
+from app.images import is_hashed_name, process_profile_photo
+from app import prompt_audio
 """
 @bp.route('/')   #handeled by react app
 def index():
@@ -18,8 +22,46 @@ from datetime import timedelta
 import pytz
 
 
+def build_profile_rows(all_scores):
+    """Group a user's Score rows per (test, attempt) into profile rows, latest first"""
+    # Group by (test_number, attempt_number)
+    from collections import defaultdict
+    groups = defaultdict(list)
+    for s in all_scores:
+        groups[(s.test_number, getattr(s, 'attempt_number', 1))].append(s)
+
+    rows = []
+    for (test_number, attempt_number), items in groups.items():
+        # sort by round_number to compute approval and end time
+        items_sorted = sorted(items, key=lambda x: x.round_number)
+        round_set = {it.round_number for it in items_sorted}
+        times = [it.test_time for it in items_sorted]
+        approved = (round_set == {1, 2, 3, 4, 5} and times == sorted(times))
+        total_score = sum(it.score for it in items_sorted) if approved else 'N/A'
+        # build row with round1..round5
+        row = {
+            'test_number': test_number,
+            'attempt_number': attempt_number,
+            'round1': next((it.score for it in items_sorted if it.round_number == 1), None),
+            'round2': next((it.score for it in items_sorted if it.round_number == 2), None),
+            'round3': next((it.score for it in items_sorted if it.round_number == 3), None),
+            'round4': next((it.score for it in items_sorted if it.round_number == 4), None),
+            'round5': next((it.score for it in items_sorted if it.round_number == 5), None),
+            # use last round time as test end time if exists, else latest time
+            'test_time': (max(times) if times else None),
+            'approved': 'Yes' if approved else 'No',
+            'total_score': total_score
+        }
+        rows.append(row)
+
+    # sort rows latest to oldest by test_time
+    rows.sort(key=lambda r: (r['test_time'] or datetime.datetime.min, r['test_number'], r['attempt_number']), reverse=True)
+    return rows
+
+
 @bp.route('/user-profile', methods=['GET'])
 @login_required
+@conditional(USER)
 def api_user_profile():
     # Use Flask-Login's current_user instead of session
     user = current_user
@@ -54,40 +96,9 @@ def api_user_profile():
 
     all_scores = q.all()
 
-    # Group by (test_number, attempt_number)
-    from collections import defaultdict
-    groups = defaultdict(list)
-    for s in all_scores:
-        groups[(s.test_number, getattr(s, 'attempt_number', 1))].append(s)
-
-    rows = []
-    for (test_number, attempt_number), items in groups.items():
-        # sort by round_number to compute approval and end time
-        items_sorted = sorted(items, key=lambda x: x.round_number)
-        round_set = {it.round_number for it in items_sorted}
-        times = [it.test_time for it in items_sorted]
-        approved = (round_set == {1, 2, 3, 4, 5} and times == sorted(times))
-        total_score = sum(it.score for it in items_sorted) if approved else 'N/A'
-        # build row with round1..round5
-        row = {
-            'test_number': test_number,
-            'attempt_number': attempt_number,
-            'round1': next((it.score for it in items_sorted if it.round_number == 1), None),
-            'round2': next((it.score for it in items_sorted if it.round_number == 2), None),
-            'round3': next((it.score for it in items_sorted if it.round_number == 3), None),
-            'round4': next((it.score for it in items_sorted if it.round_number == 4), None),
-            'round5': next((it.score for it in items_sorted if it.round_number == 5), None),
-            # use last round time as test end time if exists, else latest time
-            'test_time': (max(times).isoformat() if times else None),
-            'approved': 'Yes' if approved else 'No',
-            'total_score': total_score
-        }
-        rows.append(row)
-
-    # sort rows latest to oldest by test_time
-    rows.sort(key=lambda r: (datetime.datetime.fromisoformat(r['test_time']) if r['test_time'] else datetime.datetime.min, r['test_number'], r['attempt_number']), reverse=True)
+    rows = build_profile_rows(all_scores)
 
-    response = jsonify({
+    return jsonify({
         "user": {
             "id": user.id,
             "username": user.username,
@@ -96,19 +107,18 @@ def api_user_profile():
         },
         "scores": rows
     })
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
 
 #----------------------profile photo------------------------ 
 
    
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def profile_photo_folder():
+    return os.path.join(current_app.root_path, 'static/profile_photos')
+
 @bp.route('/upload-profile-photo', methods=['POST'])
 def upload_profile_photo():
     user_id = request.form.get('user_id')
@@ -120,31 +130,65 @@ def upload_profile_photo():
         return jsonify({"error": "No selected file"}), 400
 
     if file and allowed_file(file.filename):
-        # Ensure upload folder exists
-        upload_folder = os.path.join(current_app.root_path, 'static/profile_photos')
-        os.makedirs(upload_folder, exist_ok=True)
-
-        # Make filename unique per user to avoid overwriting
-        filename = f"user_{user_id}_{secure_filename(file.filename)}"
-        filepath = os.path.join(upload_folder, filename)
-        file.save(filepath)
-
         user = User.query.get(user_id)
         if not user:
             return jsonify({"error": "User not found"}), 404
 
+        # Decode once, strip metadata, write content-hashed thumbnails
+        config = current_app.config
+        try:
+            variants = process_profile_photo(
+                file.stream, profile_photo_folder(), config['PROFILE_PHOTO_SIZES'],
+                quality=config['PROFILE_PHOTO_QUALITY'], max_pixels=config['PROFILE_PHOTO_MAX_PIXELS'],
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        filename = variants[config['PROFILE_PHOTO_DEFAULT_SIZE']]['webp']
         user.profile_photo = filename
+        bump(user_scope(user.id))
         db.session.commit()
 
-        return jsonify({"message": "Uploaded successfully", "photo": filename}), 200
+        return jsonify({"message": "Uploaded successfully", "photo": filename, "variants": variants}), 200
 
     return jsonify({"error": "Invalid file type"}), 400
 
 @bp.route('/profile_photos/<filename>')
 def get_profile_photo(filename):
-    return send_from_directory(os.path.join(current_app.root_path, 'static/profile_photos'), filename)
+    if is_hashed_name(filename):
+        # content-hash names never change content
+        return send_offloaded(profile_photo_folder(), filename, 'profile_photos',
+                              max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    # photos uploaded before the thumbnail pipeline
+    return send_offloaded(profile_photo_folder(), filename, 'profile_photos')
 
 
 @bp.route("/audio/<filename>")
 def serve_audio(filename):
-    return send_file(f"static/audio/{filename}", mimetype="audio/mp4", as_attachment=False)
+    """
+    Prompt audio with Range/conditional support.
+    ?quality=<variant> picks a precomputed lower-bitrate file, ?v=<version>
+    of the file served (see /api/audio-manifest) makes the response cacheable as immutable.
+    """
+    directory = current_app.config['PROMPT_AUDIO_DIR']
+    original = safe_join(directory, filename)
+    if original is None or not os.path.isfile(original):
+        return jsonify({"error": "Audio not found"}), 404
+
+    path = prompt_audio.resolve(directory, filename, request.args.get('quality'))
+    # the version of what is sent: a variant rebuilt with --force gets a new URL
+    versioned = request.args.get('v') == prompt_audio.file_version(safe_join(directory, path))
+    mimetype = "audio/mp4" if filename.lower().endswith('.m4a') else None
+    return send_offloaded(
+        directory, path, 'audio', mimetype=mimetype,
+        max_age=IMMUTABLE_MAX_AGE if versioned else current_app.config['PROMPT_AUDIO_MAX_AGE'],
+        immutable=versioned,
+    )
+
+@bp.route("/audio-manifest")
+def audio_manifest():
+    """Current version and built variants of every prompt file"""
+    config = current_app.config
+    response = jsonify(prompt_audio.manifest(config['PROMPT_AUDIO_DIR'], config['PROMPT_AUDIO_VARIANTS']))
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response
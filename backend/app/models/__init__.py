@@ -1,5 +1,7 @@
 from app.models.user import User
 from app.models.score import Score
 from app.models.notification import Notification
+from app.models.data_version import DataVersion
+from app.models.idempotency_key import IdempotencyKey
 
-__all__ = ['User', 'Score', 'Notification']
\ No newline at end of file
+__all__ = ['User', 'Score', 'Notification', 'DataVersion', 'IdempotencyKey']
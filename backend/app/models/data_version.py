@@ -0,0 +1,12 @@
+from app import db
+
+
+class DataVersion(db.Model):
+    """Monotonic change counter per data scope, used to build ETags (see app.data_version)"""
+    __tablename__ = 'data_versions'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DataVersion {self.name}={self.version}>'
@@ -0,0 +1,22 @@
+from app import db
+from datetime import datetime
+
+
+class IdempotencyKey(db.Model):
+    """Stored outcome of a request sent with an Idempotency-Key header (see app.idempotency)"""
+    __tablename__ = 'idempotency_keys'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)  # NULL while the first request is still running
+    response = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_user_key'),
+    )
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.user_id}:{self.key}>'
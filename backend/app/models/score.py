@@ -13,6 +13,12 @@ class Score(db.Model):
     correct_words = db.Column(db.JSON, nullable=False, default=[])
     incorrect_words = db.Column(db.JSON, nullable=False, default=[])
     test_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # recording quality at submission (app/tests/quality.py); NULL for rows stored before the gate
+    audio_duration_s = db.Column(db.Float)
+    audio_rms_dbfs = db.Column(db.Float)
+    audio_peak_dbfs = db.Column(db.Float)
+    audio_clipping_ratio = db.Column(db.Float)
+    audio_speech_ratio = db.Column(db.Float)
     
     __table_args__ = (
         db.Index('idx_user_test_attempt_round', 'user_id', 'test_number', 'attempt_number', 'round_number'),
@@ -0,0 +1,277 @@
+"""
+On-demand request profiling.
+
+Off unless PROFILING_ENABLED: then no hook is registered at all. When it is
+on, a request is profiled only if it carries the ``X-Profile`` header and
+either the header value equals PROFILING_TOKEN or the caller is a logged-in
+admin. Everything else pays for one header lookup.
+
+A profiled request runs under
+
+- the sampler (PROFILING_MODE='sample'): a thread that snapshots the
+  request thread's stack every PROFILING_SAMPLE_INTERVAL_MS and counts the
+  stacks in collapsed ("folded") format, the input of flamegraph.pl and
+  speedscope; or cProfile (PROFILING_MODE='cprofile'), stored as a .prof
+  file for pstats / snakeviz. Under gevent workers the sampler cannot see
+  the request (it runs in a greenlet of the same OS thread and
+  sys._current_frames() is keyed by OS thread), so cProfile is used there.
+- tracemalloc, whose top PROFILING_TOP_ALLOCATIONS allocation sites
+  (by line, net of what was allocated before the request) are stored in the
+  capture's summary
+
+One request per worker process is profiled at a time (tracemalloc is
+process-wide); a concurrent request with the header is served normally and
+answered with ``X-Profile: busy``. Captures are written to PROFILING_DIR
+and only the newest PROFILING_MAX_CAPTURES are kept. The response carries
+``X-Profile-Capture`` with the capture id for the admin endpoints.
+"""
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Profile'
+
+# capture file suffix -> download mimetype
+ARTIFACTS = {
+    '.json': 'application/json',
+    '.folded': 'text/plain',
+    '.prof': 'application/octet-stream',
+}
+
+_CAPTURE_ID = re.compile(r'^\d{8}T\d{12}-\d+$')
+_busy = threading.Lock()
+
+
+class StackSampler:
+    """Counts the folded stacks of one thread, sampled from a background thread"""
+
+    def __init__(self, thread_id, interval_s):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _gevent_patched():
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def _profile_mode(config):
+    mode = config['PROFILING_MODE']
+    return 'cprofile' if mode == 'sample' and _gevent_patched() else mode
+
+
+def _requested():
+    value = request.headers.get(HEADER)
+    if not value:
+        return False
+    token = current_app.config.get('PROFILING_TOKEN')
+    if token and hmac.compare_digest(value.encode(), token.encode()):
+        return True
+    return current_user.is_authenticated and current_user.is_admin()
+
+
+def _start_profile():
+    if HEADER not in request.headers or not _requested():
+        return
+    if not _busy.acquire(blocking=False):
+        g.profile_busy = True
+        return
+
+    config = current_app.config
+    # leave tracemalloc running afterwards if someone else (PYTHONTRACEMALLOC) started it
+    profile = {'started': time.perf_counter(), 'mode': _profile_mode(config),
+               'stop_tracemalloc': not tracemalloc.is_tracing()}
+    try:
+        tracemalloc.start(config['PROFILING_TRACEMALLOC_FRAMES'])
+        profile['memory_before'] = tracemalloc.take_snapshot()
+        if profile['mode'] == 'cprofile':
+            profile['profiler'] = cProfile.Profile()
+            profile['profiler'].enable()
+        else:
+            profile['profiler'] = StackSampler(threading.get_ident(), config['PROFILING_SAMPLE_INTERVAL_MS'] / 1000)
+            profile['profiler'].start()
+    except Exception:
+        # e.g. cProfile already active in this thread; serve the request unprofiled
+        logger.exception("Could not start profiling %s", request.path)
+        if profile['stop_tracemalloc'] and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        _busy.release()
+        return
+    g.profile = profile
+
+
+def _mark_response(response):
+    if g.get('profile_busy'):
+        response.headers[HEADER] = 'busy'
+    elif 'profile' in g:
+        g.profile['capture_id'] = capture_id = _new_capture_id()
+        response.headers['X-Profile-Capture'] = capture_id
+    return response
+
+
+def _new_capture_id():
+    return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}"
+
+
+def _finish_profile(exc):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return
+    try:
+        profiler = profile['profiler']
+        if profile['mode'] == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+        elapsed_ms = (time.perf_counter() - profile['started']) * 1000
+        memory_after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if profile['stop_tracemalloc']:
+            tracemalloc.stop()
+        save_capture(current_app.config, profile.get('capture_id') or _new_capture_id(), profile,
+                     memory_after, peak, elapsed_ms, exc)
+    finally:
+        _busy.release()
+
+
+def _top_allocations(before, after, limit):
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+    return [{
+        'site': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+        'size_diff_bytes': stat.size_diff,
+        'count_diff': stat.count_diff,
+        'size_bytes': stat.size,
+    } for stat in stats[:limit]]
+
+
+def save_capture(config, capture_id, profile, memory_after, peak_bytes, elapsed_ms, exc=None):
+    """Write the capture's files to PROFILING_DIR and trim the ring"""
+    directory = config['PROFILING_DIR']
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, capture_id)
+
+    summary = {
+        'id': capture_id,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'user': current_user.get_id() if current_user.is_authenticated else None,
+        'mode': profile['mode'],
+        'elapsed_ms': round(elapsed_ms, 1),
+        'error': type(exc).__name__ if exc else None,
+        'created_at': datetime.utcnow().isoformat(),
+        'tracemalloc_peak_bytes': peak_bytes,
+        'top_allocations': _top_allocations(profile['memory_before'], memory_after,
+                                            config['PROFILING_TOP_ALLOCATIONS']),
+    }
+    profiler = profile['profiler']
+    if profile['mode'] == 'cprofile':
+        profiler.dump_stats(base + '.prof')
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(30)
+        summary['top_functions'] = text.getvalue()
+        summary['artifact'] = capture_id + '.prof'
+    else:
+        with open(base + '.folded', 'w') as f:
+            f.write(profiler.folded())
+        summary['samples'] = profiler.samples
+        summary['artifact'] = capture_id + '.folded'
+
+    tmp_path = f"{base}.json.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, ensure_ascii=False)
+    os.replace(tmp_path, base + '.json')
+    trim_captures(directory, config['PROFILING_MAX_CAPTURES'])
+
+
+def trim_captures(directory, keep):
+    """Remove all but the newest `keep` captures"""
+    ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+    for capture_id in ids[:-keep] if keep else ids:
+        for suffix in ARTIFACTS:
+            try:
+                os.remove(os.path.join(directory, capture_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def capture_path(directory, capture_id, suffix):
+    """Path of a capture file, or None if `capture_id` is not a capture id"""
+    if not _CAPTURE_ID.match(capture_id) or suffix not in ARTIFACTS:
+        return None
+    path = os.path.join(directory, capture_id + suffix)
+    return path if os.path.isfile(path) else None
+
+
+def list_captures(directory):
+    """Summaries (without the allocation lists) of the stored captures, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    captures = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue  # removed by the ring meanwhile
+        summary.pop('top_allocations', None)
+        summary.pop('top_functions', None)
+        captures.append(summary)
+    return captures
+
+
+def init_profiling(app):
+    """Register the profiling hooks if PROFILING_ENABLED"""
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    if app.config['PROFILING_MODE'] == 'sample' and _gevent_patched():
+        logger.warning("PROFILING_MODE 'sample' does not work under gevent; using cProfile")
+    app.before_request(_start_profile)
+    app.after_request(_mark_response)
+    app.teardown_request(_finish_profile)
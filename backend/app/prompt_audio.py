@@ -0,0 +1,113 @@
+"""
+Prompt audio (the word lists played on the test page).
+
+Files live in PROMPT_AUDIO_DIR and are served by serve_audio through
+app.delivery, so Range requests, ETag/Last-Modified validation and proxy
+offload come from there. This module adds:
+
+- content versions: a short content hash per file, cached by (mtime, size).
+  A URL carrying the current ``?v=`` of the file actually served (the
+  variant's own version with ``?quality=``) is cached as immutable,
+  anything else revalidates after PROMPT_AUDIO_MAX_AGE
+- lower-bitrate variants, precomputed by ``flask build-audio-variants`` into
+  PROMPT_AUDIO_DIR/variants as ``<stem>.<variant><ext>`` and picked with
+  ``?quality=<variant>``; the original is served when a variant is missing
+"""
+import hashlib
+import os
+import threading
+
+from werkzeug.security import safe_join
+
+VARIANTS_SUBDIR = 'variants'
+AUDIO_EXTENSIONS = ('.m4a', '.mp3', '.ogg', '.opus', '.wav')
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def file_version(path):
+    """First 12 hex digits of the file's sha256, recomputed only when mtime or size change"""
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _versions.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    version = digest.hexdigest()[:12]
+    with _versions_lock:
+        _versions[path] = (key, version)
+    return version
+
+
+def variant_name(filename, variant):
+    stem, ext = os.path.splitext(filename)
+    return f"{VARIANTS_SUBDIR}/{stem}.{variant}{ext}"
+
+
+def resolve(directory, filename, variant=None):
+    """Path (relative to `directory`) to send for `filename`: the variant if built, else the original"""
+    if variant:
+        candidate = variant_name(filename, variant)
+        path = safe_join(directory, candidate)
+        if path and os.path.isfile(path):
+            return candidate
+    return filename
+
+
+def list_prompt_audio(directory):
+    return sorted(
+        name for name in os.listdir(directory)
+        if name.lower().endswith(AUDIO_EXTENSIONS) and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def manifest(directory, variants):
+    """{filename: {'version': ..., 'variants': {built variant: its version}}} for building versioned URLs"""
+    entries = {}
+    for name in list_prompt_audio(directory):
+        built = {}
+        for variant in variants:
+            path = os.path.join(directory, variant_name(name, variant))
+            if os.path.isfile(path):
+                built[variant] = file_version(path)
+        entries[name] = {'version': file_version(os.path.join(directory, name)), 'variants': built}
+    return entries
+
+
+def build_variants(directory, variants, force=False):
+    """
+    Encode every prompt file once per variant with pydub/ffmpeg.
+
+    `variants` maps a name to export settings (bitrate, channels,
+    frame_rate). Existing variants newer than their source are skipped
+    unless `force`. Returns the list of written paths.
+    """
+    from pydub import AudioSegment
+
+    os.makedirs(os.path.join(directory, VARIANTS_SUBDIR), exist_ok=True)
+    written = []
+    for name in list_prompt_audio(directory):
+        source = os.path.join(directory, name)
+        segment = None
+        for variant, settings in variants.items():
+            target = os.path.join(directory, variant_name(name, variant))
+            if not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+                continue
+            if segment is None:
+                segment = AudioSegment.from_file(source)
+            audio = segment
+            if settings.get('channels'):
+                audio = audio.set_channels(settings['channels'])
+            if settings.get('frame_rate'):
+                audio = audio.set_frame_rate(settings['frame_rate'])
+            ext = os.path.splitext(name)[1].lower()
+            fmt, codec = ('ipod', 'aac') if ext == '.m4a' else (ext.lstrip('.'), None)
+            tmp = target + '.tmp'
+            audio.export(tmp, format=fmt, codec=codec, bitrate=settings.get('bitrate'))
+            os.replace(tmp, target)
+            written.append(target)
+    return written
@@ -0,0 +1,134 @@
+"""
+Archival of stored recordings to 16 kHz mono Opus.
+
+Uploads are kept in the format they arrived in; a 30 s WAV round is about
+1-3 MB where Opus at RECORDINGS_OPUS_BITRATE needs ~100 KB and is still fine
+for reviewing. archive_recordings() walks RECORDINGS_DIR and, on a process
+pool, transcodes every recording older than the minimum age that is not
+Opus yet:
+
+1. decode and re-encode to a temporary file in ARCHIVE_TMP_DIR (on the same
+   filesystem, but outside the round directories, whose files
+   clean_old_files counts and prunes)
+2. decode the output again and compare its duration with the source; a file
+   that does not decode, or lost audio, is dropped and the original kept
+3. give the output the original's mtime (clean_old_files and
+   find_recording order by it and by the timestamped stem), rename it to
+   ``<stem>.opus`` and only then delete the original
+
+Outputs that are not smaller than the original are discarded. A recording
+that clean_old_files removes while it is being archived is reported as
+skipped. Every archived
+file is appended to ARCHIVE_INDEX (JSON lines in RECORDINGS_DIR) with the
+original's codec and size, so what was replaced stays traceable.
+
+Runs from `flask archive-recordings` (cron / systemd timer); needs ffmpeg.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from app.recordings import opus_path, saved_at
+
+ARCHIVE_INDEX = 'archive_index.jsonl'
+ARCHIVE_TMP_DIR = '.archive-tmp'
+DURATION_TOLERANCE_MS = 100
+
+ARCHIVED = 'archived'
+NOT_SMALLER = 'not_smaller'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+def find_candidates(root, min_age_seconds):
+    """Relative paths of recordings older than `min_age_seconds` that are not Opus yet"""
+    cutoff = time.time() - min_age_seconds
+    candidates = []
+    for directory, subdirs, names in os.walk(root):
+        if directory == root and ARCHIVE_TMP_DIR in subdirs:
+            subdirs.remove(ARCHIVE_TMP_DIR)
+        for name in names:
+            if saved_at(name) is None or name.endswith('.opus'):
+                continue  # temporary and index files, already archived
+            path = os.path.join(directory, name)
+            if os.path.getmtime(path) < cutoff:
+                candidates.append(os.path.relpath(path, root))
+    return sorted(candidates)
+
+
+def archive_one(root, relative_path, bitrate, frame_rate=16000):
+    """Transcode, verify and swap one recording; returns its index entry (runs in a pool worker)"""
+    from pydub import AudioSegment
+
+    from app.tests.probe import probe_file
+
+    source = os.path.join(root, relative_path)
+    target = os.path.join(root, opus_path(relative_path))
+    tmp = os.path.join(root, ARCHIVE_TMP_DIR, f"{relative_path.replace(os.sep, '_')}.{os.getpid()}.tmp")
+    entry = {'path': opus_path(relative_path), 'original': relative_path}
+    try:
+        # clean_old_files may have removed it since find_candidates
+        stat = os.stat(source)
+        probed = probe_file(source)
+    except FileNotFoundError:
+        return {**entry, 'status': SKIPPED, 'error': 'removed before archiving'}
+    entry['original_codec'] = (probed.codec or probed.container) if probed else None
+    entry['original_bytes'] = stat.st_size
+    try:
+        audio = AudioSegment.from_file(source).set_channels(1).set_frame_rate(frame_rate)
+        audio.export(tmp, format='opus', bitrate=bitrate)
+
+        decoded = AudioSegment.from_file(tmp, format='ogg')
+        if abs(len(decoded) - len(audio)) > DURATION_TOLERANCE_MS:
+            raise ValueError(f"decoded {len(decoded)} ms of {len(audio)} ms")
+
+        archived_bytes = os.path.getsize(tmp)
+        if archived_bytes >= stat.st_size:
+            return {**entry, 'status': NOT_SMALLER, 'bytes': archived_bytes}
+
+        os.utime(tmp, (stat.st_atime, stat.st_mtime))
+        os.replace(tmp, target)
+        try:
+            os.remove(source)
+        except FileNotFoundError:
+            # pruned while transcoding: do not bring it back as Opus
+            os.remove(target)
+            return {**entry, 'status': SKIPPED, 'error': 'removed while archiving'}
+        return {**entry, 'status': ARCHIVED, 'codec': 'opus', 'bytes': archived_bytes,
+                'duration_ms': len(audio), 'archived_at': datetime.utcnow().isoformat()}
+    except Exception as e:
+        return {**entry, 'status': FAILED, 'error': str(e)}
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def archive_recordings(root, min_age_seconds, bitrate, workers=None, dry_run=False, log=print):
+    """Archive all candidates under `root`; returns a summary with the bytes reclaimed"""
+    root = os.path.abspath(root)
+    candidates = find_candidates(root, min_age_seconds)
+    summary = {'candidates': len(candidates), ARCHIVED: 0, NOT_SMALLER: 0, SKIPPED: 0, FAILED: 0,
+               'bytes_before': 0, 'bytes_after': 0, 'reclaimed_bytes': 0}
+    if dry_run or not candidates:
+        summary['candidate_bytes'] = sum(os.path.getsize(os.path.join(root, p)) for p in candidates)
+        return summary
+
+    started = time.perf_counter()
+    os.makedirs(os.path.join(root, ARCHIVE_TMP_DIR), exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            open(os.path.join(root, ARCHIVE_INDEX), 'a', encoding='utf-8') as index:
+        futures = [pool.submit(archive_one, root, path, bitrate) for path in candidates]
+        for future in as_completed(futures):
+            entry = future.result()
+            summary[entry['status']] += 1
+            if entry['status'] == ARCHIVED:
+                summary['bytes_before'] += entry['original_bytes']
+                summary['bytes_after'] += entry['bytes']
+                index.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            elif entry['status'] == FAILED:
+                log(f"Failed to archive {entry['original']}: {entry['error']}")
+    summary['reclaimed_bytes'] = summary['bytes_before'] - summary['bytes_after']
+    summary['elapsed_s'] = time.perf_counter() - started
+    return summary
@@ -0,0 +1,90 @@
+"""
+Stored student recordings.
+
+save_and_keep_original writes every upload to
+``RECORDINGS_DIR/<username>/test_<n>/round_<r>/<YYYYmmdd_HHMMSS>.<ext>`` and
+keeps the last two per round; the path carries no attempt number. A
+(user, test, attempt, round) score is matched to the newest file saved no
+later than the score's test_time (the file is written before recognition,
+the score after) and after the previous attempt's same round.
+
+Opus versions for playback are transcoded once with pydub/ffmpeg into
+RECORDINGS_CACHE_DIR under the same relative path and reused afterwards.
+Recordings already archived to Opus (app/recording_archive.py) are served
+as they are.
+"""
+import os
+from datetime import datetime
+
+from werkzeug.security import safe_join
+
+TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+OPUS_MIMETYPE = 'audio/ogg; codecs=opus'
+
+
+def round_directory(username, test_number, round_number):
+    """Directory of one round's recordings, relative to RECORDINGS_DIR"""
+    return os.path.join(username, f'test_{test_number}', f'round_{round_number}')
+
+
+def saved_at(filename):
+    stem = os.path.splitext(filename)[0]
+    try:
+        return datetime.strptime(stem, TIMESTAMP_FORMAT)
+    except ValueError:
+        return None  # e.g. a leftover *_tmp.wav from recognition
+
+
+def find_recording(root, username, test_number, round_number, submitted_at, not_after_previous=None):
+    """
+    Relative path of the recording behind a score, or None if it is no longer kept.
+
+    `submitted_at` is the score's test_time; `not_after_previous` the
+    test_time of the same round in the previous attempt, if any.
+    """
+    relative_dir = round_directory(username, test_number, round_number)
+    directory = safe_join(root, relative_dir)
+    if directory is None or not os.path.isdir(directory):
+        return None
+
+    best = None
+    for name in os.listdir(directory):
+        timestamp = saved_at(name)
+        if timestamp is None or timestamp > submitted_at:
+            continue
+        if not_after_previous is not None and timestamp <= not_after_previous:
+            continue
+        if best is None or timestamp > best[0]:
+            best = (timestamp, name)
+    return os.path.join(relative_dir, best[1]) if best else None
+
+
+def opus_path(relative_path):
+    return os.path.splitext(relative_path)[0] + '.opus'
+
+
+def transcode_opus(root, cache_root, relative_path, bitrate='24k', frame_rate=16000):
+    """
+    Cached Opus version of `relative_path`; returns its path relative to `cache_root`.
+
+    Speech only needs 16 kHz mono. The file is written to a temporary name
+    and renamed, so concurrent first requests at worst transcode twice.
+    """
+    target_relative = opus_path(relative_path)
+    source = os.path.join(root, relative_path)
+    target = os.path.join(cache_root, target_relative)
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        return target_relative
+
+    from pydub import AudioSegment
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    audio = AudioSegment.from_file(source).set_channels(1).set_frame_rate(frame_rate)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    try:
+        audio.export(tmp, format='opus', bitrate=bitrate)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return target_relative
@@ -0,0 +1,123 @@
+import functools
+import logging
+import random
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Engine options that only make sense for server databases (or that are
+# pointless for a local file: a SQLite connection never goes stale).
+SERVER_ONLY_OPTIONS = ('pool_pre_ping', 'pool_recycle', 'max_overflow', 'pool_size', 'pool_timeout')
+
+# Counters for busy handling, read by the write-concurrency benchmark
+busy_stats = {'retries': 0, 'gave_up': 0}
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def is_memory_database(uri):
+    url = make_url(uri)
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+
+# ----------------------
+# Engine options
+# ----------------------
+def sqlite_engine_options(config):
+    """
+    Return SQLALCHEMY_ENGINE_OPTIONS tuned for a SQLite file database.
+
+    Server-pool settings inherited from the config class are dropped and a
+    QueuePool sized for the worker's threads is used instead, so each thread
+    keeps one long-lived connection with its PRAGMAs already applied.
+    In-memory databases keep Flask-SQLAlchemy's StaticPool untouched.
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if is_memory_database(config['SQLALCHEMY_DATABASE_URI']):
+        return options
+
+    for key in SERVER_ONLY_OPTIONS:
+        options.pop(key, None)
+    options['poolclass'] = QueuePool
+    options['pool_size'] = config.get('SQLITE_POOL_SIZE', 8)
+    options['max_overflow'] = config.get('SQLITE_POOL_OVERFLOW', 8)
+    options['pool_timeout'] = config.get('SQLITE_POOL_TIMEOUT', 30)
+
+    connect_args = dict(options.get('connect_args') or {})
+    connect_args.setdefault('check_same_thread', False)
+    options['connect_args'] = connect_args
+    return options
+
+
+def register_pragmas(engine, pragmas):
+    """Apply `pragmas` to every new DBAPI connection of `engine`"""
+    statements = [f"PRAGMA {name}={value}" for name, value in pragmas.items()]
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def init_sqlite_profile(app):
+    """Hook the PRAGMA listener onto the app's engine (call after db.init_app)"""
+    with app.app_context():
+        register_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+
+
+# ----------------------
+# Busy handling
+# ----------------------
+def is_busy_error(exc):
+    message = str(getattr(exc, 'orig', exc)).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_on_busy(retries=None, base_delay=None, max_delay=None):
+    """
+    Retry a write unit of work when SQLite reports SQLITE_BUSY.
+
+    busy_timeout already makes SQLite wait for the write lock, but a WAL read
+    transaction that tries to upgrade after another writer committed gets
+    SQLITE_BUSY immediately. The wrapped function must therefore perform the
+    whole unit of work (queries + commit) so it can be replayed after a
+    rollback. Backoff is exponential with full jitter.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            max_retries = retries if retries is not None else current_app.config.get('SQLITE_BUSY_RETRIES', 5)
+            base = base_delay if base_delay is not None else current_app.config.get('SQLITE_BUSY_BACKOFF', 0.05)
+            cap = max_delay if max_delay is not None else current_app.config.get('SQLITE_BUSY_BACKOFF_MAX', 1.0)
+
+            attempt = 0
+            while True:
+                try:
+                    return f(*args, **kwargs)
+                except OperationalError as e:
+                    db.session.rollback()
+                    if not is_busy_error(e) or attempt >= max_retries:
+                        if is_busy_error(e):
+                            busy_stats['gave_up'] += 1
+                        raise
+                    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+                    attempt += 1
+                    busy_stats['retries'] += 1
+                    logger.warning(f"SQLite busy in {f.__name__}, retry {attempt}/{max_retries} in {delay * 1000:.0f} ms")
+                    time.sleep(delay)
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+import logging
+import os
+
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+# Revision and tables of the schema that db.create_all() used to create
+# before the app had migrations; such databases have no alembic_version
+BASELINE_REVISION = 'd1d0168e204f'
+BASELINE_TABLES = {'users', 'scores', 'notifications'}
+
+# check_schema() results the app must not serve requests with
+UNUSABLE_SCHEMA = ('behind', 'unversioned')
+
+
+def check_schema(app):
+    """
+    Cheap startup check that the database is at the migrations head.
+
+    Replaces the old import-time ``db.create_all()``: a single connection
+    reads ``alembic_version`` instead of reflecting every table. An empty
+    database is upgraded to head. A database created by the old create_all()
+    (exactly the baseline tables, no revision) is stamped at the baseline
+    revision, which only records what it contains; any other mismatch is
+    only reported, migrations are never applied implicitly to existing data.
+
+    Returns one of: 'current', 'created', 'behind', 'unversioned', 'no-migrations'
+    """
+    directory = app.config['MIGRATIONS_DIR']
+    if not os.path.isdir(directory):
+        logger.warning("Migrations directory not found: %s", directory)
+        return 'no-migrations'
+
+    heads = set(ScriptDirectory(directory).get_heads())
+
+    with app.app_context():
+        with db.engine.connect() as connection:
+            current = set(MigrationContext.configure(connection).get_current_heads())
+            tables = set() if current else set(inspect(connection).get_table_names())
+
+        if current == heads:
+            logger.info("Database schema is current (revision %s)", ', '.join(sorted(heads)))
+            return 'current'
+
+        if not current and not tables:
+            from flask_migrate import upgrade
+            upgrade(directory=directory)
+            logger.info("Empty database initialized from migrations")
+            return 'created'
+
+        if not current and tables == BASELINE_TABLES:
+            from flask_migrate import stamp
+            stamp(directory=directory, revision=BASELINE_REVISION)
+            current = {BASELINE_REVISION}
+            logger.warning("Database created before migrations was stamped at the baseline revision %s",
+                           BASELINE_REVISION)
+
+    if not current:
+        logger.error(
+            "Database has tables (%s) but no Alembic revision and does not match the baseline schema; "
+            "find the revision it matches, `flask db stamp <revision>` it and run `flask db upgrade`",
+            ', '.join(sorted(tables)),
+        )
+        return 'unversioned'
+
+    logger.error(
+        "Database schema revision %s does not match head %s; run `flask db upgrade`",
+        ', '.join(sorted(current)), ', '.join(sorted(heads)),
+    )
+    return 'behind'
+
+
+def init_logging(app):
+    from flask.logging import default_handler
+
+    from app.log_pipeline import configure_logging
+
+    configure_logging(app.config)
+    # records of app.logger reach the queue through the root logger
+    app.logger.removeHandler(default_handler)
+
+
+def setup_error_handlers(app):
+    @app.errorhandler(404)
+    def not_found_error(error):
+        return {'error': 'Not found'}, 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        db.session.rollback()
+        app.logger.error('Server Error: %s', error)
+        return {'error': 'Internal server error'}, 500
+
+
+def validate_production_config(app):
+    if os.environ.get('FLASK_ENV') != 'production':
+        return
+
+    required_configs = [
+        'SECRET_KEY',
+        'MAIL_DEFAULT_SENDER',
+        'DATABASE_URL'
+    ]
+    missing_configs = [k for k in required_configs if not os.environ.get(k)]
+    if missing_configs:
+        app.logger.warning("Missing required production configurations: %s", ', '.join(missing_configs))
+
+
+def prepare_app(app):
+    """
+    One-time process setup shared by run.py and wsgi.py: logging, error
+    handlers, config validation and the schema check.
+
+    Returns False if the schema check failed or the database is not at the
+    migrations head, so the server is not started against missing tables
+    (the reason is logged).
+    """
+    init_logging(app)
+    setup_error_handlers(app)
+    validate_production_config(app)
+    try:
+        return check_schema(app) not in UNUSABLE_SCHEMA
+    except Exception as e:
+        app.logger.error("Database schema check error: %s", e)
+        return False
+
+
+# Per-process singletons (see get_governor, get_resilience, get_speech_client):
+# they hold threads, semaphores and sockets that must not cross a fork
+PER_PROCESS_EXTENSIONS = ('asr_governor', 'asr_resilience', 'asr_http_pool')
+
+
+def dispose_engines(app, close=True):
+    """
+    Drop the pooled connections of every engine of `app`.
+
+    Called with close=True in the master before forking, so no connection
+    is inherited at all, and with close=False in each worker after the fork:
+    the child then only forgets the pool it may have inherited, without
+    closing sockets or file handles that still belong to the parent.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+
+
+def after_fork(app):
+    """Reset the per-process state of a worker forked from a preloaded master"""
+    dispose_engines(app, close=False)
+    for name in PER_PROCESS_EXTENSIONS:
+        app.extensions.pop(name, None)
@@ -0,0 +1,197 @@
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, MetaData, Table, Text, func, insert, select
+from sqlalchemy.types import JSON, DateTime
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.data_version import GLOBAL, NOTIFICATIONS, bump
+from app.models.notification import Notification
+from app.models.score import Score
+from app.models.user import User
+from app.tests.utils import TARGET_WORDS, INTRUSION_WORDS
+
+logger = logging.getLogger(__name__)
+
+SYNTHETIC_PASSWORD = 'Synthetic#2024'
+POOL_SAMPLES = 64  # distinct word lists per (test, recalled count)
+
+
+# ----------------------
+# Pre-processed insert targets
+# ----------------------
+def _preprocessed_table(table, dialect):
+    """
+    Return (plain_table, processors) for fast executemany of `table`.
+
+    JSON and DateTime columns become Text in `plain_table`; their values are
+    converted up front with the real column type's bind processor for the
+    current dialect. Word lists are drawn from small pre-serialized pools, so
+    the JSON serializer runs a few thousand times instead of once per row.
+    """
+    columns = []
+    processors = {}
+    for c in table.columns:
+        if isinstance(c.type, (JSON, DateTime)):
+            processor = c.type.dialect_impl(dialect).bind_processor(dialect)
+            processors[c.name] = processor or (lambda value: value)
+            columns.append(Column(c.name, Text, primary_key=c.primary_key))
+        else:
+            columns.append(Column(c.name, c.type, primary_key=c.primary_key))
+    return Table(table.name, MetaData(), *columns), processors
+
+
+def _word_pools(rng, to_json):
+    """Pre-serialized (json, unique count) correct lists and incorrect lists per test"""
+    correct = {}
+    incorrect = {}
+    for test_number, targets in TARGET_WORDS.items():
+        correct[test_number] = {}
+        for recalled in range(1, len(targets) + 1):
+            entries = []
+            for _ in range(POOL_SAMPLES):
+                words = rng.sample(targets, recalled)
+                # the same word is sometimes said twice
+                if rng.random() < 0.15:
+                    words.append(rng.choice(words))
+                entries.append((to_json(words), recalled))
+            correct[test_number][recalled] = entries
+
+        other_words = [w for t, ws in TARGET_WORDS.items() if t != test_number for w in ws if w not in targets]
+        entries = []
+        for _ in range(POOL_SAMPLES * 4):
+            count = rng.choices((0, 1, 2, 3), weights=(50, 30, 15, 5))[0]
+            # intrusions are either common words or words from another test's list
+            entries.append(to_json([
+                rng.choice(INTRUSION_WORDS) if rng.random() < 0.6 else rng.choice(other_words)
+                for _ in range(count)
+            ]))
+        incorrect[test_number] = entries
+    return correct, incorrect
+
+
+# ----------------------
+# Row generators
+# ----------------------
+def _generate_user_rows(rng, pools, to_datetime, user_id, username, attempts_per_user, now):
+    """Yield ('score' | 'notification', row dict) for one user's attempts"""
+    correct_pool, incorrect_pool = pools
+    ability = rng.uniform(1.0, 6.0)
+    attempt_counters = {}
+    clock = now - timedelta(days=rng.uniform(1, 365))
+    for _ in range(attempts_per_user):
+        test_number = rng.randint(1, 4)
+        attempt_number = attempt_counters.get(test_number, 0) + 1
+        attempt_counters[test_number] = attempt_number
+        rounds = 5 if rng.random() < 0.9 else rng.randint(1, 4)
+        targets = len(TARGET_WORDS[test_number])
+
+        for round_number in range(1, rounds + 1):
+            clock += timedelta(seconds=rng.randint(40, 120))
+            # recall grows with the round number
+            recalled = max(1, min(targets, int(rng.gauss(ability + round_number * 1.3, 1.5))))
+            correct_json, score = correct_pool[test_number][recalled][rng.randrange(POOL_SAMPLES)]
+            yield 'score', {
+                'user_id': user_id,
+                'test_number': test_number,
+                'attempt_number': attempt_number,
+                'round_number': round_number,
+                'score': score,
+                'correct_words': correct_json,
+                'incorrect_words': rng.choice(incorrect_pool[test_number]),
+                'test_time': to_datetime(clock),
+            }
+
+        if rounds == 5:
+            yield 'notification', {
+                'user_id': user_id,
+                'test_number': test_number,
+                'attempt_number': attempt_number,
+                'message': f"🎯 {username} completed Test {test_number} (Attempt {attempt_number}) | کاربر {username} آزمون {test_number} را تکمیل کرد (تلاش {attempt_number})",
+                'is_read': rng.random() < 0.7,
+                'created_at': clock,
+            }
+        clock += timedelta(hours=rng.uniform(1, 24 * 14))
+
+
+# ----------------------
+# Bulk seeding
+# ----------------------
+def seed_synthetic(users=1000, attempts_per_user=20, seed=42, batch_size=10000, prefix='synth'):
+    """
+    Bulk-insert synthetic users, scores and notifications with batched Core inserts.
+
+    The same seed always produces the same rows. All users share one password
+    hash (SYNTHETIC_PASSWORD), so seeding does not pay pbkdf2 per user.
+    Roughly users * attempts_per_user * 4.8 score rows are created.
+    Returns a dict of row counts and elapsed seconds.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    now = datetime(2025, 1, 1)
+
+    existing = db.session.query(func.count(User.id)).filter(User.username.like(f"{prefix}\\_%", escape='\\')).scalar()
+    if existing:
+        raise ValueError(f"{existing} users with prefix '{prefix}_' already exist; use --reset or another --prefix")
+
+    first_id = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD, method='pbkdf2:sha256:150000')
+    counts = {'users': 0, 'scores': 0, 'notifications': 0}
+
+    user_rows = []
+    for i in range(users):
+        user_rows.append({
+            'id': first_id + i,
+            'username': f"{prefix}_{i}",
+            'email': f"{prefix}_{i}@synthetic.example.com",
+            'password_hash': password_hash,
+            'age': rng.randint(18, 85),
+            'sex': rng.choice(['male', 'female']),
+            'role': 'user',
+            'failed_login_attempts': 0,
+            'created_at': now - timedelta(days=rng.randint(365, 730)),
+        })
+    for start in range(0, len(user_rows), batch_size):
+        db.session.execute(insert(User.__table__), user_rows[start:start + batch_size])
+    counts['users'] = len(user_rows)
+
+    score_table, processors = _preprocessed_table(Score.__table__, db.session.get_bind().dialect)
+    pools = _word_pools(rng, processors['correct_words'])
+    tables = {'score': score_table, 'notification': Notification.__table__}
+    batches = {'score': [], 'notification': []}
+
+    def flush(kind):
+        if batches[kind]:
+            db.session.execute(insert(tables[kind]), batches[kind])
+            counts[kind + 's'] += len(batches[kind])
+            batches[kind] = []
+
+    for row in user_rows:
+        for kind, values in _generate_user_rows(rng, pools, processors['test_time'],
+                                                row['id'], row['username'], attempts_per_user, now):
+            batches[kind].append(values)
+            if len(batches[kind]) >= batch_size:
+                flush(kind)
+    flush('score')
+    flush('notification')
+    bump(GLOBAL, NOTIFICATIONS)
+    db.session.commit()
+
+    counts['elapsed_s'] = time.perf_counter() - started
+    logger.info(f"Seeded synthetic data: {counts}")
+    return counts
+
+
+def delete_synthetic(prefix='synth'):
+    """Delete users with the given prefix and their scores/notifications; returns deleted user count"""
+    matches_prefix = User.username.like(f"{prefix}\\_%", escape='\\')
+    user_ids = select(User.id).where(matches_prefix)
+    db.session.execute(Score.__table__.delete().where(Score.user_id.in_(user_ids)))
+    db.session.execute(Notification.__table__.delete().where(Notification.user_id.in_(user_ids)))
+    deleted = db.session.execute(User.__table__.delete().where(matches_prefix)).rowcount
+    bump(GLOBAL, NOTIFICATIONS)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,125 @@
+"""
+Admission control for speech recognition calls.
+
+Every worker process admits at most ASR_MAX_CONCURRENT recognizer calls at
+a time. Further requests wait in a bounded queue (ASR_MAX_QUEUE) for up to
+ASR_MAX_WAIT_S seconds. When the queue is full or the wait runs out,
+ASRUnavailable is raised and submit_audio answers 503 with a Retry-After
+estimated from recent call durations, instead of piling more concurrent
+calls onto a saturated recognizer. Recognizer request errors (quota,
+network) are reported the same way.
+
+Queue depth, in-flight calls and wait times are kept as gauges for the
+admin metrics endpoint and logged when requests have to wait or are shed.
+"""
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class ASRUnavailable(Exception):
+    """The recognizer cannot take this request now; retry after `retry_after` seconds"""
+
+    def __init__(self, reason, retry_after=5):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionGovernor:
+    def __init__(self, max_concurrent, max_queue, max_wait):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.service_ewma = 1.0  # seconds per recognizer call
+        self.stats = {
+            'admitted': 0, 'waited': 0, 'rejected_queue_full': 0, 'rejected_timeout': 0,
+            'wait_ms_total': 0.0, 'wait_ms_max': 0.0, 'max_queue_depth': 0,
+        }
+
+    def retry_after(self):
+        """Seconds until a queued slot is likely to free up, at least 1"""
+        backlog = (self.waiting + self.active) / self.max_concurrent
+        return max(1, math.ceil(backlog * self.service_ewma))
+
+    def _shed(self, kind):
+        self.stats[kind] += 1
+        retry_after = self.retry_after()
+        logger.warning("ASR overloaded (%s): active=%d queued=%d retry_after=%ss", kind, self.active, self.waiting, retry_after)
+        raise ASRUnavailable(kind, retry_after)
+
+    @contextmanager
+    def admit(self):
+        start = time.perf_counter()
+        with self._cond:
+            if self.active >= self.max_concurrent or self.waiting:
+                if self.waiting >= self.max_queue:
+                    self._shed('rejected_queue_full')
+                self.waiting += 1
+                self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.waiting)
+                deadline = start + self.max_wait
+                try:
+                    while self.active >= self.max_concurrent:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            self._shed('rejected_timeout')
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                waited_ms = (time.perf_counter() - start) * 1000
+                self.stats['waited'] += 1
+                self.stats['wait_ms_total'] += waited_ms
+                self.stats['wait_ms_max'] = max(self.stats['wait_ms_max'], waited_ms)
+                logger.info("ASR admitted after %.0f ms in queue (queued=%d)", waited_ms, self.waiting)
+            self.active += 1
+            self.stats['admitted'] += 1
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._cond:
+                self.active -= 1
+                self.service_ewma = 0.8 * self.service_ewma + 0.2 * elapsed
+                self._cond.notify()
+
+    def report(self):
+        with self._cond:
+            report = dict(self.stats)
+            report.update({
+                'active': self.active,
+                'queued': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'service_ewma_ms': self.service_ewma * 1000,
+            })
+        report['wait_ms_mean'] = report['wait_ms_total'] / report['waited'] if report['waited'] else 0.0
+        return report
+
+
+_init_lock = threading.Lock()
+
+
+def get_governor(app=None):
+    """The app's AdmissionGovernor, created on first use from the ASR_* settings"""
+    app = app or current_app._get_current_object()
+    governor = app.extensions.get('asr_governor')
+    if governor is None:
+        with _init_lock:
+            governor = app.extensions.get('asr_governor')
+            if governor is None:
+                governor = AdmissionGovernor(
+                    app.config['ASR_MAX_CONCURRENT'], app.config['ASR_MAX_QUEUE'], app.config['ASR_MAX_WAIT_S'],
+                )
+                app.extensions['asr_governor'] = governor
+    return governor
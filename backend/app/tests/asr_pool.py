@@ -0,0 +1,99 @@
+"""
+Keep-alive connection pool for the Google speech endpoint.
+
+recognize_google (and recognize_google_http) open a new connection for
+every call, paying TCP and, for https endpoints, TLS setup each time.
+PooledSpeechClient posts through one urllib3 connection pool per worker
+process instead: up to ASR_HTTP_POOL_SIZE idle connections are kept and
+reused by any thread. Burst traffic above the pool size still gets a
+connection; the extra ones are closed after use.
+
+The payload, query string and response parsing are exactly those of
+recognize_google_http, and failures are raised as sr.RequestError with the
+same messages. urllib3 retries are off: hedging and the circuit breaker in
+resilience.py decide when to try again.
+
+New connections versus requests are counted for the admin metrics endpoint;
+a reuse ratio near 1 means handshakes are off the request path.
+"""
+import threading
+from urllib.parse import urlencode, urlsplit
+
+import urllib3
+from flask import current_app
+
+from app.tests.recognizers import GOOGLE_SPEECH_KEY, parse_google_response
+
+
+class PooledSpeechClient:
+    def __init__(self, url, pool_size=4, connect_timeout=3.0):
+        self.url = url
+        self.path = urlsplit(url).path or '/'
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self._pool = urllib3.connection_from_url(url, maxsize=pool_size, block=False, retries=False)
+        self._lock = threading.Lock()
+        self.errors = 0
+
+    def recognize(self, flac_data, sample_rate, key=None, language='fa-IR', timeout=None):
+        """recognize_google_http over a pooled connection; returns the show_all result"""
+        import speech_recognition as sr
+
+        query = urlencode({'client': 'chromium', 'lang': language, 'key': key or GOOGLE_SPEECH_KEY, 'pFilter': 0})
+        connect = min(self.connect_timeout, timeout) if timeout else self.connect_timeout
+        try:
+            response = self._pool.urlopen(
+                'POST', f"{self.path}?{query}", body=flac_data,
+                headers={'Content-Type': f'audio/x-flac; rate={sample_rate}'},
+                timeout=urllib3.Timeout(connect=connect, read=timeout),
+                redirect=False,
+            )
+        except urllib3.exceptions.HTTPError as e:
+            self._count_error()
+            raise sr.RequestError(f"recognition connection failed: {e}")
+        if response.status >= 300:
+            self._count_error()
+            raise sr.RequestError(f"recognition request failed: {response.reason}")
+        try:
+            return parse_google_response(response.data.decode('utf-8'))
+        except (ValueError, KeyError) as e:
+            self._count_error()
+            raise sr.RequestError(f"malformed recognition response: {e}")
+
+    def _count_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def report(self):
+        requests, opened = self._pool.num_requests, self._pool.num_connections
+        return {
+            'url': self.url,
+            'pool_size': self.pool_size,
+            'requests': requests,
+            'connections_opened': opened,
+            'idle_connections': self._pool.pool.qsize() if self._pool.pool else 0,
+            'reuse_ratio': 1 - opened / requests if requests else None,
+            'errors': self.errors,
+        }
+
+    def close(self):
+        self._pool.close()
+
+
+_init_lock = threading.Lock()
+
+
+def get_speech_client(app=None):
+    """The app's PooledSpeechClient for ASR_GOOGLE_URL, created on first use"""
+    app = app or current_app._get_current_object()
+    client = app.extensions.get('asr_http_pool')
+    if client is None:
+        with _init_lock:
+            client = app.extensions.get('asr_http_pool')
+            if client is None:
+                client = PooledSpeechClient(
+                    app.config['ASR_GOOGLE_URL'], app.config['ASR_HTTP_POOL_SIZE'],
+                    app.config['ASR_HTTP_CONNECT_TIMEOUT_S'],
+                )
+                app.extensions['asr_http_pool'] = client
+    return client
@@ -0,0 +1,128 @@
+"""
+ASR payload preparation.
+
+After decoding, every recording is 16 kHz mono 16-bit PCM. Before it is sent
+to the recognizer it is:
+
+- trimmed: leading and trailing frames quieter than the silence threshold
+  are cut, keeping ASR_PAYLOAD_PAD_MS around the speech. The threshold
+  follows the recording (SILENCE_RANGE_DB below its loudest frame) but never
+  drops below SILENCE_FLOOR_DBFS, so hiss in a quiet room counts as silence.
+- loudness-normalized: the RMS of the speech frames is brought to
+  ASR_PAYLOAD_TARGET_DBFS, with gain limited to ASR_PAYLOAD_MAX_GAIN_DB and
+  the peak kept under PEAK_CEILING so nothing clips.
+
+The Google backend then encodes the result as FLAC. Payload bytes after each
+stage (upload, pcm, trimmed, flac) are accumulated for the admin metrics
+endpoint.
+
+numpy is imported inside the functions: this module is loaded with the tests
+blueprint, and like pydub and speech_recognition numpy is only needed once a
+recording is processed, not at worker start.
+"""
+import threading
+
+FRAME_MS = 20
+SILENCE_RANGE_DB = 40
+SILENCE_FLOOR_DBFS = -50
+PEAK_CEILING = 0.95
+
+# Bytes per stage, read by the admin metrics endpoint
+payload_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record_stage(stage, nbytes):
+    with _stats_lock:
+        stats = payload_stats.setdefault(stage, {'count': 0, 'total_bytes': 0})
+        stats['count'] += 1
+        stats['total_bytes'] += nbytes
+
+
+def payload_report():
+    with _stats_lock:
+        report = {stage: dict(stats) for stage, stats in payload_stats.items()}
+    upload = report.get('upload', {}).get('total_bytes')
+    for stats in report.values():
+        stats['mean_bytes'] = stats['total_bytes'] / stats['count']
+        stats['ratio_to_upload'] = stats['total_bytes'] / upload if upload else None
+    return report
+
+
+def pcm_to_float(pcm):
+    """16-bit little-endian PCM bytes as float32 samples in [-1, 1)"""
+    import numpy as np
+
+    return np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32768
+
+
+def frame_rms_db(samples, rate, frame_ms=FRAME_MS):
+    """RMS level in dBFS of consecutive `frame_ms` frames of float samples in [-1, 1]"""
+    import numpy as np
+
+    frame = max(1, rate * frame_ms // 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return np.empty(0)
+    frames = samples[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def active_frames(levels, range_db=SILENCE_RANGE_DB, floor_dbfs=SILENCE_FLOOR_DBFS):
+    """Boolean mask of the frames above the silence threshold"""
+    import numpy as np
+
+    if len(levels) == 0:
+        return np.zeros(0, dtype=bool)
+    return levels > max(levels.max() - range_db, floor_dbfs)
+
+
+def speech_bounds(levels):
+    """(first, last + 1) frame index above the silence threshold, or None if every frame is silent"""
+    import numpy as np
+
+    active = np.flatnonzero(active_frames(levels))
+    if len(active) == 0:
+        return None
+    return int(active[0]), int(active[-1]) + 1
+
+
+def trim_and_normalize(pcm, rate, pad_ms, target_dbfs, max_gain_db):
+    """Trimmed, loudness-normalized copy of 16-bit mono `pcm` bytes"""
+    import numpy as np
+
+    samples = pcm_to_float(pcm)
+    levels = frame_rms_db(samples, rate)
+    bounds = speech_bounds(levels)
+    if bounds is None:
+        # nothing above the floor: leave it to the recognizer
+        return pcm
+
+    frame = rate * FRAME_MS // 1000
+    pad = rate * pad_ms // 1000
+    start = max(0, bounds[0] * frame - pad)
+    end = min(len(samples), bounds[1] * frame + pad)
+    samples = samples[start:end]
+
+    speech = levels[bounds[0]:bounds[1]]
+    speech_db = 10 * np.log10(np.mean(np.power(10, speech / 10)))  # energy mean over the speech frames
+    gain_db = min(target_dbfs - speech_db, max_gain_db)
+    peak = np.abs(samples).max()
+    if peak > 0:
+        gain_db = min(gain_db, 20 * np.log10(PEAK_CEILING / peak))
+    samples = samples * np.float32(10 ** (gain_db / 20))
+
+    return (np.clip(samples, -1, 32767 / 32768) * 32768).astype('<i2').tobytes()
+
+
+def prepare_payload(audio_data, config):
+    """Trimmed, normalized ``sr.AudioData`` for the recognizer; `audio_data` is 16 kHz mono 16-bit"""
+    import speech_recognition as sr
+
+    pcm = audio_data.get_raw_data()
+    record_stage('pcm', len(pcm))
+    pcm = trim_and_normalize(pcm, audio_data.sample_rate, config['ASR_PAYLOAD_PAD_MS'],
+                             config['ASR_PAYLOAD_TARGET_DBFS'], config['ASR_PAYLOAD_MAX_GAIN_DB'])
+    record_stage('trimmed', len(pcm))
+    return sr.AudioData(pcm, audio_data.sample_rate, audio_data.sample_width)
@@ -0,0 +1,166 @@
+"""
+Header sniffing for uploaded recordings.
+
+probe() reads the first bytes of an upload and identifies the real
+container and, where the header carries it cheaply, the codec, sample
+rate, channel count and sample width. The filename and mimetype sent by the
+browser are not trusted.
+
+decode_plan() then picks how recognize_audio gets 16 kHz mono PCM:
+
+- 'direct'  16 kHz mono 16-bit PCM WAV: read as is, nothing is decoded
+- 'native'  other PCM WAV (1-2 channels): downmixed and resampled in process
+            by speech_recognition (wave/audioop), no ffmpeg
+- 'flac'    FLAC (1-2 channels): decoded by the ``flac`` binary that
+            speech_recognition runs (bundled or on PATH), no ffmpeg. 16 kHz
+            mono FLAC is decoded too: the quality gate and the trimming before
+            the recognizer both work on PCM.
+- 'ffmpeg'  compressed formats (m4a, mp3, ogg, webm, float WAV, ...):
+            pydub/ffmpeg as before
+
+Uploads that match no known signature or carry an impossible header get
+None from probe() and are rejected before anything is spawned.
+"""
+import struct
+import threading
+from collections import namedtuple
+
+HEADER_BYTES = 4096
+TARGET_RATE = 16000
+
+ProbeResult = namedtuple('ProbeResult', 'container codec sample_rate channels sample_width extension')
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+# Decode time per plan, read by the admin metrics endpoint
+decode_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record_decode(plan, elapsed_ms):
+    with _stats_lock:
+        stats = decode_stats.setdefault(plan, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+
+def decode_report():
+    with _stats_lock:
+        report = {plan: dict(stats) for plan, stats in decode_stats.items()}
+    for stats in report.values():
+        stats['mean_ms'] = stats['total_ms'] / stats['count']
+    return report
+
+
+def _sane(sample_rate, channels):
+    return 4000 <= sample_rate <= 192000 and 1 <= channels <= 8
+
+
+def _probe_wav(header):
+    if len(header) < 12 or header[8:12] != b'WAVE':
+        return None
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk_id = header[offset:offset + 4]
+        (size,) = struct.unpack_from('<I', header, offset + 4)
+        if chunk_id == b'fmt ':
+            if size < 16 or offset + 24 > len(header):
+                return None
+            fmt_tag, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', header, offset + 8)
+            if fmt_tag == WAVE_FORMAT_EXTENSIBLE and size >= 40 and offset + 34 <= len(header):
+                (fmt_tag,) = struct.unpack_from('<H', header, offset + 32)  # first 2 bytes of the SubFormat GUID
+            if not _sane(sample_rate, channels) or bits == 0:
+                return None
+            codec = 'pcm' if fmt_tag == WAVE_FORMAT_PCM else f'wav-0x{fmt_tag:04x}'
+            return ProbeResult('wav', codec, sample_rate, channels, (bits + 7) // 8, 'wav')
+        offset += 8 + size + (size & 1)
+    return None
+
+
+def _probe_flac(header):
+    # 'fLaC', metadata block header (4 bytes), STREAMINFO must come first
+    if len(header) < 8 + 18 or header[4] & 0x7F != 0:
+        return None
+    info = int.from_bytes(header[18:26], 'big')
+    sample_rate = info >> 44
+    channels = ((info >> 41) & 0x7) + 1
+    bits = ((info >> 36) & 0x1F) + 1
+    if not _sane(sample_rate, channels):
+        return None
+    return ProbeResult('flac', 'flac', sample_rate, channels, (bits + 7) // 8, 'flac')
+
+
+def _probe_ogg(header):
+    # first page: 27-byte header + segment table, then the codec's identification packet
+    if len(header) < 28:
+        return None
+    packet = header[27 + header[26]:]
+    if packet.startswith(b'OpusHead') and len(packet) >= 16:
+        channels = packet[9]
+        (sample_rate,) = struct.unpack_from('<I', packet, 12)
+        return ProbeResult('ogg', 'opus', sample_rate or 48000, channels, None, 'ogg')
+    if packet.startswith(b'\x01vorbis') and len(packet) >= 16:
+        channels = packet[11]
+        (sample_rate,) = struct.unpack_from('<I', packet, 12)
+        return ProbeResult('ogg', 'vorbis', sample_rate, channels, None, 'ogg')
+    return None
+
+
+def _probe_mp3(header):
+    offset = 0
+    if header.startswith(b'ID3'):
+        if len(header) < 10:
+            return None
+        size = (header[6] & 0x7F) << 21 | (header[7] & 0x7F) << 14 | (header[8] & 0x7F) << 7 | (header[9] & 0x7F)
+        offset = 10 + size
+        if offset + 4 > len(header):
+            # tag larger than the sniffed window (cover art); trust the tag
+            return ProbeResult('mp3', 'mp3', None, None, None, 'mp3')
+    if offset + 4 > len(header) or header[offset] != 0xFF or header[offset + 1] & 0xE0 != 0xE0:
+        return None
+    version = (header[offset + 1] >> 3) & 0x3
+    rate_index = (header[offset + 2] >> 2) & 0x3
+    if version == 1 or rate_index == 3:
+        return None
+    channels = 1 if (header[offset + 3] >> 6) == 3 else 2
+    return ProbeResult('mp3', 'mp3', MP3_SAMPLE_RATES[version][rate_index], channels, None, 'mp3')
+
+
+def probe(stream):
+    """Identify the upload in `stream` (position restored); returns ProbeResult or None"""
+    position = stream.tell()
+    header = stream.read(HEADER_BYTES)
+    stream.seek(position)
+
+    if header.startswith(b'RIFF'):
+        return _probe_wav(header)
+    if header.startswith(b'fLaC'):
+        return _probe_flac(header)
+    if header.startswith(b'OggS'):
+        return _probe_ogg(header)
+    if header.startswith(b'\x1a\x45\xdf\xa3'):
+        return ProbeResult('webm', None, None, None, None, 'webm')
+    if header[4:8] == b'ftyp':
+        return ProbeResult('mp4', None, None, None, None, 'm4a')
+    if header.startswith(b'ID3') or header[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2', b'\xff\xfa'):
+        return _probe_mp3(header)
+    return None
+
+
+def probe_file(path):
+    with open(path, 'rb') as f:
+        return probe(f)
+
+
+def decode_plan(result):
+    if result.container == 'wav' and result.codec == 'pcm' and result.channels <= 2:
+        if result.sample_rate == TARGET_RATE and result.channels == 1 and result.sample_width == 2:
+            return 'direct'
+        return 'native'
+    if result.container == 'flac' and result.channels <= 2:
+        return 'flac'
+    return 'ffmpeg'
@@ -0,0 +1,280 @@
+"""
+Deadlines, hedging and a circuit breaker around recognizer calls.
+
+ASRResilience.call() runs a recognizer attempt on a small thread pool and
+waits for it with an overall deadline (ASR_TIMEOUT_S); the attempt also
+gets the remaining time as its socket timeout, so an abandoned call ends on
+its own instead of holding a thread forever.
+
+- Hedging: when the first attempt has not answered after the recent p95
+  attempt latency (at least ASR_HEDGE_MIN_DELAY_S), an identical second
+  attempt is sent and whichever answers first wins. At most
+  ASR_HEDGE_MAX_RATIO of the calls are hedged so a slow backend does not
+  get twice the traffic.
+- Circuit breaker: after ASR_BREAKER_FAILURES consecutive failures
+  (request errors or deadlines) the breaker opens and calls fail fast with
+  ASRUnavailable for ASR_BREAKER_RESET_S. Then a single trial call is let
+  through (half-open); its outcome closes or re-opens the breaker.
+- Fallback: if a fallback engine is configured (ASR_FALLBACK), it answers
+  instead of failing while the breaker is open or when the primary fails.
+
+Attempt latencies and call outcomes are kept for the admin metrics endpoint
+and drive the hedge delay.
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import current_app
+
+from app.tests.admission import ASRUnavailable
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class LatencyWindow:
+    """The last `size` latencies in seconds, with nearest-rank percentiles"""
+
+    def __init__(self, size=256):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, pct):
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary_ms(self):
+        summary = {'count': len(self)}
+        for pct in (50, 95, 99):
+            value = self.percentile(pct)
+            summary[f'p{pct}_ms'] = value * 1000 if value is not None else None
+        return summary
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+    def retry_after(self):
+        """Seconds until the breaker lets a trial call through, at least 1"""
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        return max(1, math.ceil(remaining))
+
+    def is_open(self):
+        """True while calls would be rejected; does not claim the half-open trial"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self.state == HALF_OPEN and self.trial_in_flight
+
+    def allow(self):
+        """Whether a call may go through now; in half-open state only one trial is let through"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("ASR circuit closed after a successful trial call")
+            self.state = CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                    logger.warning("ASR circuit opened after %d consecutive failures", self.failures)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+
+
+class ASRResilience:
+    def __init__(self, timeout, breaker, hedge_enabled=True, hedge_percentile=95, hedge_min_delay=0.5,
+                 hedge_min_samples=20, hedge_max_ratio=0.1, max_workers=8):
+        self.timeout = timeout
+        self.breaker = breaker
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_max_ratio = hedge_max_ratio
+        self.attempt_latency = LatencyWindow()
+        self.call_latency = LatencyWindow()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asr')
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0, 'succeeded': 0, 'failed': 0, 'timeouts': 0, 'hedged': 0, 'hedge_wins': 0,
+            'short_circuited': 0, 'fallbacks': 0,
+        }
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging this call, or None to not hedge it"""
+        if not self.hedge_enabled or len(self.attempt_latency) < self.hedge_min_samples:
+            return None
+        if self.breaker.state != CLOSED:
+            return None
+        with self._lock:
+            if self.stats['hedged'] >= self.hedge_max_ratio * max(1, self.stats['calls']):
+                return None
+        delay = max(self.hedge_min_delay, self.attempt_latency.percentile(self.hedge_percentile))
+        return delay if delay < self.timeout else None
+
+    def ensure_available(self, fallback=None):
+        """Raise ASRUnavailable right away, before queueing, if the breaker is open and there is no fallback"""
+        if fallback is None and self.breaker.is_open():
+            self._count('short_circuited')
+            raise ASRUnavailable('circuit_open', self.breaker.retry_after())
+
+    def _timed(self, attempt, deadline):
+        start = time.perf_counter()
+        result = attempt(max(0.1, deadline - start))
+        self.attempt_latency.add(time.perf_counter() - start)
+        return result
+
+    def _first_result(self, attempt, start, deadline):
+        """Result of the first successful attempt and whether it was the hedge"""
+        primary = self._executor.submit(self._timed, attempt, deadline)
+        pending = {primary}
+        delay = self.hedge_delay()
+        hedge_at = start + delay if delay is not None else None
+        error = None
+        while pending:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            until = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, pending = wait(pending, timeout=until - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return future.result(), future is not primary
+                error = future.exception()
+            if hedge_at is not None and pending and time.perf_counter() >= hedge_at:
+                pending.add(self._executor.submit(self._timed, attempt, deadline))
+                hedge_at = None
+                self._count('hedged')
+        if error is not None and not pending:
+            raise error
+        for future in pending:
+            future.cancel()
+        self._count('timeouts')
+        raise ASRUnavailable('timeout', max(1, math.ceil(self.timeout / 2)))
+
+    def _fallback(self, fallback, error):
+        if fallback is None:
+            raise error
+        self._count('fallbacks')
+        logger.warning("ASR primary unavailable (%s), answering with the fallback engine", error)
+        return fallback()
+
+    def call(self, attempt, fallback=None):
+        """
+        Run `attempt(timeout)` with deadline, hedging and the breaker; returns its result.
+
+        `fallback()` answers when the breaker rejects the call or the primary
+        fails. Without it the failure is raised: ASRUnavailable for an open
+        breaker or a missed deadline, the attempt's own exception otherwise.
+        """
+        self._count('calls')
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            return self._fallback(fallback, ASRUnavailable('circuit_open', self.breaker.retry_after()))
+
+        start = time.perf_counter()
+        try:
+            result, hedge_won = self._first_result(attempt, start, start + self.timeout)
+        except Exception as e:
+            self.breaker.record_failure()
+            self._count('failed')
+            return self._fallback(fallback, e)
+
+        self.breaker.record_success()
+        self.call_latency.add(time.perf_counter() - start)
+        self._count('succeeded')
+        if hedge_won:
+            self._count('hedge_wins')
+        return result
+
+    def report(self):
+        with self._lock:
+            report = dict(self.stats)
+        delay = self.hedge_delay()
+        report.update({
+            'breaker_state': self.breaker.state,
+            'breaker_times_opened': self.breaker.times_opened,
+            'consecutive_failures': self.breaker.failures,
+            'timeout_s': self.timeout,
+            'hedge_delay_ms': delay * 1000 if delay is not None else None,
+            'attempt_latency': self.attempt_latency.summary_ms(),
+            'call_latency': self.call_latency.summary_ms(),
+        })
+        return report
+
+
+_init_lock = threading.Lock()
+
+
+def get_resilience(app=None):
+    """The app's ASRResilience, created on first use from the ASR_* settings"""
+    app = app or current_app._get_current_object()
+    resilience = app.extensions.get('asr_resilience')
+    if resilience is None:
+        with _init_lock:
+            resilience = app.extensions.get('asr_resilience')
+            if resilience is None:
+                config = app.config
+                resilience = ASRResilience(
+                    config['ASR_TIMEOUT_S'],
+                    CircuitBreaker(config['ASR_BREAKER_FAILURES'], config['ASR_BREAKER_RESET_S']),
+                    hedge_enabled=config['ASR_HEDGE_ENABLED'],
+                    hedge_percentile=config['ASR_HEDGE_PERCENTILE'],
+                    hedge_min_delay=config['ASR_HEDGE_MIN_DELAY_S'],
+                    hedge_min_samples=config['ASR_HEDGE_MIN_SAMPLES'],
+                    hedge_max_ratio=config['ASR_HEDGE_MAX_RATIO'],
+                    # room for one hedge per admitted call
+                    max_workers=2 * config['ASR_MAX_CONCURRENT'],
+                )
+                app.extensions['asr_resilience'] = resilience
+    return resilience
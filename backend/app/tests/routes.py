@@ -1,46 +1,68 @@
 import os
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 from flask_login import current_user, login_required
 from datetime import datetime
 from app.models.score import Score
 from app.models.notification import Notification
-from app.tests.utils import save_and_keep_original, recognize_audio, calculate_score, allowed_upload
+from app.tests.utils import save_and_keep_original, save_pcm_recording, recognize_audio, calculate_score
+from app.tests.probe import probe
+from app.tests.admission import ASRUnavailable
+from app.tests.quality import PoorRecording, assess, check, score_columns
+from app.tests import streaming
 from app.tests import bp
 from app import db
+from app.sqlite_profile import retry_on_busy
+from app.data_version import GLOBAL, NOTIFICATIONS, bump, user_scope
+from app.db_utils import dialect_insert, insert_if_absent, supports_upsert
+from app.tracing import span, traced
+from app.idempotency import (IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, CLAIMED, IN_PROGRESS, MISMATCH, REPLAY,
+                             claim, record_response, release, request_fingerprint)
+from sqlalchemy import case, func, literal, select, true, update
 import logging
-import traceback
 
 MAX_FILE_SIZE_MB = 5
 BASE_VOICES_DIR = os.path.join(os.getcwd(), 'voices')  # مسیر مطلق برای ذخیره فایل‌ها
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 
 @bp.route('/submit-audio', methods=['POST'])
 @login_required
 def submit_audio():
+    idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+    claimed = False
+    completed = False
     try:
-        # بررسی فرم
-        try:
-            test_number = int(request.form.get('test_number'))
-            round_number = int(request.form.get('round_number'))
-        except (TypeError, ValueError):
-            return jsonify({"error": "شماره تست یا دور نامعتبر است"}), 400
+        # بررسی فرم (خواندن بدنه درخواست و فایل آپلودشده همین‌جا انجام می‌شود)
+        with span('upload', bytes=request.content_length):
+            test_number, round_number, error = _parse_round(request.form)
+            if error:
+                return jsonify({"error": error}), 400
 
-        if test_number not in [1, 2, 3, 4]:
-            return jsonify({"error": "شماره تست باید بین 1 تا 4 باشد"}), 400
-        if round_number not in [1, 2, 3, 4, 5]:
-            return jsonify({"error": "شماره دور باید بین 1 تا 5 باشد"}), 400
-
-        if 'audio' not in request.files:
-            return jsonify({"error": "هیچ فایل صوتی ارسال نشده است"}), 400
+            if 'audio' not in request.files:
+                return jsonify({"error": "هیچ فایل صوتی ارسال نشده است"}), 400
 
         audio_file = request.files['audio']
 
-        # چک فرمت
-        if not allowed_upload(getattr(audio_file, 'filename', ''), getattr(audio_file, 'mimetype', None)):
-            return jsonify({"error": "فرمت فایل پشتیبانی نمی‌شود. فرمت‌های مجاز: MP3, M4A, WAV, OGG, WebM"}), 400
+        # تکرار درخواست با همان Idempotency-Key: نتیجه ذخیره‌شده برگردانده می‌شود
+        if idempotency_key:
+            if len(idempotency_key) > MAX_KEY_LENGTH:
+                return jsonify({"error": "Idempotency-Key نامعتبر است"}), 400
+            fingerprint = request_fingerprint(test_number, round_number, stream=audio_file.stream)
+            state, record = claim(current_user.id, idempotency_key, fingerprint)
+            if state == REPLAY:
+                response = jsonify(record.response)
+                response.status_code = record.status_code
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if state == IN_PROGRESS:
+                response = jsonify({"error": "این درخواست در حال پردازش است. لطفاً کمی بعد دوباره تلاش کنید."})
+                response.status_code = 409
+                response.headers['Retry-After'] = '2'
+                return response
+            if state == MISMATCH:
+                return jsonify({"error": "این Idempotency-Key قبلاً برای درخواست دیگری استفاده شده است"}), 422
+            claimed = True
 
         # چک حجم
         audio_file.seek(0, os.SEEK_END)
@@ -51,85 +73,346 @@ def submit_audio():
         if file_size_mb == 0:
             return jsonify({"error": "فایل خالی است"}), 400
 
+        # چک فرمت از روی هدر فایل (نام فایل و mimetype قابل اعتماد نیستند)
+        with span('probe'):
+            probe_result = probe(audio_file.stream)
+        if probe_result is None:
+            return jsonify({"error": "فایل صوتی خراب است یا فرمت آن پشتیبانی نمی‌شود. فرمت‌های مجاز: MP3, M4A, WAV, OGG, WebM, FLAC"}), 400
+
         username = current_user.username
-        save_path, error = save_and_keep_original(audio_file, username, test_number, round_number)
+        save_path, error = save_and_keep_original(audio_file, username, test_number, round_number,
+                                                  ext=probe_result.extension)
         if error:
             return jsonify({"error": error}), 400
 
-        # تبدیل و تشخیص صدا
-        text = recognize_audio(save_path)
+        # تبدیل، بررسی کیفیت و تشخیص صدا
+        text, metrics = recognize_audio(save_path, probe_result)
         if not text or not text.strip():
             return jsonify({"error": "متن قابل تشخیصی در فایل صوتی یافت نشد. لطفاً مجدداً تلاش کنید."}), 400
 
         score, correct_words, incorrect_words = calculate_score(text, test_number)
+        payload = _round_payload(text, score, incorrect_words, round_number)
 
         # ذخیره نمره با مدیریت تلاش‌ها (attempt)
-        user_id = current_user.id
-
-        # آخرین شماره تلاش برای این تست را پیدا کن
-        max_attempt = db.session.query(db.func.max(Score.attempt_number)).filter_by(
-            user_id=user_id, test_number=test_number
-        ).scalar() or 0
-
-        if round_number == 1:
-            # شروع تلاش جدید
-            attempt_number = max_attempt + 1
-        else:
-            # ادامه آخرین تلاش موجود؛ اگر وجود ندارد، تلاش 1 را شروع کن
-            attempt_number = max_attempt if max_attempt > 0 else 1
-
-        # اگر همان دور در همان تلاش ارسال شود، رکورد را جایگزین کن
-        score_entry = Score.query.filter_by(
-            user_id=user_id,
-            test_number=test_number,
-            attempt_number=attempt_number,
-            round_number=round_number
-        ).first()
-
-        if score_entry:
-            score_entry.score = score
-            score_entry.correct_words = correct_words
-            score_entry.incorrect_words = incorrect_words
-            score_entry.test_time = datetime.now()
-        else:
-            score_entry = Score(
-                user_id=user_id,
-                test_number=test_number,
-                attempt_number=attempt_number,
-                round_number=round_number,
-                score=score,
-                correct_words=correct_words,
-                incorrect_words=incorrect_words,
-                test_time=datetime.now()
-            )
-            db.session.add(score_entry)
-
-        # Create notification when test is completed (round 5)
-        if round_number == 5:
-            # Create bilingual notification message
-            notification_message = f"🎯 {current_user.username} completed Test {test_number} (Attempt {attempt_number}) | کاربر {current_user.username} آزمون {test_number} را تکمیل کرد (تلاش {attempt_number})"
-            notification = Notification(
-                user_id=user_id,
-                test_number=test_number,
-                attempt_number=attempt_number,
-                message=notification_message
-            )
-            db.session.add(notification)
+        store_score(current_user.id, current_user.username, test_number, round_number,
+                    score, correct_words, incorrect_words, metrics,
+                    idempotent_response=(idempotency_key, payload) if claimed else None)
+        completed = True
 
-        db.session.commit()
+        return jsonify(payload)
+
+    except PoorRecording as e:
+        # ضبط بی‌صدا، مخدوش یا خیلی کوتاه: بدون ارسال به سرویس تشخیص گفتار رد می‌شود
+        logger.info("Rejected recording from %s (%s): %s", current_user.username, e.code, e.metrics)
+        return jsonify({"error": e.message, "quality": e.code}), 400
+
+    except ASRUnavailable as e:
+        db.session.rollback()
+        logger.warning("ASR unavailable for user %s: %s", current_user.username, e.reason)
+        response = jsonify({"error": "سرویس تشخیص گفتار در حال حاضر شلوغ است. لطفاً چند لحظه دیگر دوباره تلاش کنید."})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error processing audio for user %s: %s", current_user.username, e)
+        return jsonify({"error": "خطا در پردازش فایل صوتی. لطفاً مجدداً تلاش کنید."}), 500
+
+    finally:
+        if claimed and not completed:
+            release(current_user.id, idempotency_key)
+
+
+def _round_payload(text, score, incorrect_words, round_number):
+    tokens = text.split()
+    return {
+        "transcribed_words": tokens,
+        "total_words": len(tokens),
+        "correct_words": score,
+        "incorrect_words": incorrect_words,
+        "round_completed": round_number == 5,
+        "message": "فایل با موفقیت پردازش شد"
+    }
+
+
+def _parse_round(values):
+    """(test_number, round_number, error message)"""
+    try:
+        test_number = int(values.get('test_number'))
+        round_number = int(values.get('round_number'))
+    except (TypeError, ValueError):
+        return None, None, "شماره تست یا دور نامعتبر است"
+    if test_number not in [1, 2, 3, 4]:
+        return None, None, "شماره تست باید بین 1 تا 4 باشد"
+    if round_number not in [1, 2, 3, 4, 5]:
+        return None, None, "شماره دور باید بین 1 تا 5 باشد"
+    return test_number, round_number, None
+
+
+STREAM_ERRORS = {
+    streaming.NOT_FOUND: ("جلسه ضبط پیدا نشد یا منقضی شده است", 404),
+    streaming.OUT_OF_ORDER: ("ترتیب بخش‌های صوتی نامعتبر است", 409),
+    streaming.TOO_LONG: ("مدت ضبط از حد مجاز بیشتر است", 413),
+    streaming.FINISHED: ("این جلسه ضبط قبلاً به پایان رسیده است", 409),
+    streaming.MISALIGNED: ("طول بخش صوتی باید مضربی از ۲ بایت (نمونه‌های ۱۶ بیتی) باشد", 400),
+}
+
+
+def _stream_error(e):
+    message, status = STREAM_ERRORS[e.code]
+    return jsonify({"error": message, "code": e.code}), status
+
+
+@bp.route('/stream/start', methods=['POST'])
+@login_required
+def stream_start():
+    """Open a streaming submission; the client then posts 16 kHz mono 16-bit PCM chunks"""
+    test_number, round_number, error = _parse_round(request.get_json(silent=True) or request.form)
+    if error:
+        return jsonify({"error": error}), 400
+
+    directory = current_app.config['STREAM_DIR']
+    streaming.purge_stale(directory, current_app.config['STREAM_TTL'].total_seconds())
+    state = streaming.start(directory, current_user.id, test_number, round_number)
+    return jsonify({
+        "stream_id": state['id'],
+        "sample_rate": streaming.SAMPLE_RATE,
+        "format": "s16le",
+        "max_chunk_bytes": current_app.config['STREAM_MAX_CHUNK_BYTES'],
+    }), 201
+
+
+@bp.route('/stream/<stream_id>/chunk', methods=['POST'])
+@login_required
+def stream_chunk(stream_id):
+    """Append one PCM chunk (?seq=1, 2, ...); answers with the transcript and score so far"""
+    config = current_app.config
+    seq = request.args.get('seq', type=int)
+    if seq is None:
+        return jsonify({"error": "شماره بخش (seq) ارسال نشده است"}), 400
+    if request.content_length and request.content_length > config['STREAM_MAX_CHUNK_BYTES']:
+        return jsonify({"error": "حجم بخش صوتی بیش از حد مجاز است"}), 413
+    try:
+        directory = config['STREAM_DIR']
+        max_bytes = config['STREAM_MAX_SECONDS'] * streaming.SAMPLE_RATE * streaming.SAMPLE_WIDTH
+        with span('upload', bytes=request.content_length):
+            data = request.get_data(cache=False)
+        # درخواست‌های هم‌زمان یک جلسه به ترتیب اجرا می‌شوند
+        with streaming.locked(directory, stream_id):
+            state = streaming.load(directory, stream_id, current_user.id)
+            if streaming.append(directory, state, seq, data, max_bytes):
+                # بخش‌های کامل (تا آخرین مکث) همین حالا به سرویس تشخیص گفتار فرستاده می‌شوند
+                streaming.advance(directory, state, config)
+                streaming.save_state(directory, state)
+    except streaming.StreamError as e:
+        return _stream_error(e)
+
+    text = streaming.transcript(state)
+    score, _, incorrect_words = calculate_score(text, state['test_number'])
+    return jsonify({
+        "seq": state['seq'],
+        "transcribed_words": text.split(),
+        "correct_words": score,
+        "incorrect_words": incorrect_words,
+        "final": False,
+    })
 
-        tokens = text.split()
-        return jsonify({
-            "transcribed_words": tokens,
-            "total_words": len(tokens),
-            "correct_words": score,
-            "incorrect_words": incorrect_words,
-            "round_completed": round_number == 5,
-            "message": "فایل با موفقیت پردازش شد"
-        })
+
+@bp.route('/stream/<stream_id>/finish', methods=['POST'])
+@login_required
+def stream_finish(stream_id):
+    """
+    Transcribe the last segment, store the round's Score and return the same result as submit-audio.
+
+    The result is stored with the Score under the Idempotency-Key
+    ``stream:<id>`` in the same commit, so a retry after the commit (even if
+    saving the result to the stream state failed) replays it instead of
+    storing the round a second time.
+    """
+    config = current_app.config
+    directory = config['STREAM_DIR']
+    idempotency_key = f"stream:{stream_id}"
+    claimed = False
+    completed = False
+    try:
+        with streaming.locked(directory, stream_id):
+            state = streaming.load(directory, stream_id, current_user.id)
+            if state['result'] is not None:
+                response = jsonify(state['result'])
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            status, record = claim(current_user.id, idempotency_key, request_fingerprint(stream_id))
+            if status == REPLAY:
+                # امتیاز قبلاً ذخیره شده ولی نتیجه در وضعیت جلسه ثبت نشده بود
+                streaming.finish(directory, state, record.response)
+                response = jsonify(record.response)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if status != CLAIMED:
+                response = jsonify({"error": "این درخواست در حال پردازش است. لطفاً کمی بعد دوباره تلاش کنید."})
+                response.status_code = 409
+                response.headers['Retry-After'] = '2'
+                return response
+            claimed = True
+
+            pcm = streaming.read_pcm(directory, state)
+            with span('quality'):
+                metrics = assess(pcm, streaming.SAMPLE_RATE)
+                rejection = check(metrics, config)
+            if rejection:
+                raise PoorRecording(rejection, metrics)
+
+            streaming.advance(directory, state, config, final=True)
+            streaming.save_state(directory, state)
+            text = streaming.transcript(state)
+            if not text.strip():
+                return jsonify({"error": "متن قابل تشخیصی در فایل صوتی یافت نشد. لطفاً مجدداً تلاش کنید."}), 400
+
+            test_number, round_number = state['test_number'], state['round_number']
+            save_pcm_recording(pcm, current_user.username, test_number, round_number)
+            score, correct_words, incorrect_words = calculate_score(text, test_number)
+            payload = _round_payload(text, score, incorrect_words, round_number)
+            store_score(current_user.id, current_user.username, test_number, round_number,
+                        score, correct_words, incorrect_words, metrics,
+                        idempotent_response=(idempotency_key, payload))
+            completed = True
+            streaming.finish(directory, state, payload)
+            return jsonify(payload)
+
+    except streaming.StreamError as e:
+        return _stream_error(e)
+
+    except PoorRecording as e:
+        logger.info("Rejected streamed recording from %s (%s): %s", current_user.username, e.code, e.metrics)
+        return jsonify({"error": e.message, "quality": e.code}), 400
+
+    except ASRUnavailable as e:
+        db.session.rollback()
+        logger.warning("ASR unavailable for user %s: %s", current_user.username, e.reason)
+        response = jsonify({"error": "سرویس تشخیص گفتار در حال حاضر شلوغ است. لطفاً چند لحظه دیگر دوباره تلاش کنید."})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
 
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error processing audio for user {current_user.username}: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception("Error finishing stream %s for user %s: %s", stream_id, current_user.username, e)
         return jsonify({"error": "خطا در پردازش فایل صوتی. لطفاً مجدداً تلاش کنید."}), 500
+
+    finally:
+        if claimed and not completed:
+            release(current_user.id, idempotency_key)
+
+
+def _upsert_score(user_id, test_number, round_number, values):
+    """
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE for one round; returns the attempt number.
+
+    The attempt number is computed inside the statement: round 1 opens
+    MAX(attempt_number) + 1, later rounds continue the latest attempt (1 when
+    there is none). Allocation and write are one statement, so no other
+    writer can slip in between, and a round repeated within an attempt
+    updates its row instead of failing on uq_score_attempt_round. Databases
+    without ON CONFLICT take _store_round_portable.
+    """
+    table = Score.__table__
+    latest = (
+        select(func.coalesce(func.max(table.c.attempt_number), 0))
+        .where(table.c.user_id == user_id, table.c.test_number == test_number)
+        .scalar_subquery()
+    )
+    if not supports_upsert():
+        return _store_round_portable(table, latest, user_id, test_number, round_number, values)
+    if round_number == 1:
+        attempt = latest + 1
+    else:
+        attempt = case((latest == 0, 1), else_=latest)
+
+    columns = ['user_id', 'test_number', 'attempt_number', 'round_number', *values]
+    row = select(
+        literal(user_id), literal(test_number), attempt, literal(round_number),
+        *(literal(value, type_=table.c[name].type) for name, value in values.items()),
+    ).where(true())  # SQLite needs a WHERE to parse INSERT ... SELECT ... ON CONFLICT
+
+    stmt = dialect_insert(table).from_select(columns, row)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.test_number, table.c.attempt_number, table.c.round_number],
+        set_={name: stmt.excluded[name] for name in values},
+    ).returning(table.c.attempt_number)
+    return db.session.execute(stmt).scalar_one()
+
+
+def _store_round_portable(table, latest, user_id, test_number, round_number, values):
+    """
+    _upsert_score for databases without ON CONFLICT: SELECT the attempt, then UPDATE or INSERT.
+
+    The INSERT runs in a savepoint; if a concurrent request stored the same
+    round first (uq_score_attempt_round), the attempt is read again and the
+    round is written over that row instead.
+    """
+    for _ in range(3):
+        latest_attempt = db.session.execute(select(latest)).scalar_one()
+        attempt = latest_attempt + 1 if round_number == 1 else max(latest_attempt, 1)
+        updated = db.session.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.test_number == test_number,
+                   table.c.attempt_number == attempt, table.c.round_number == round_number)
+            .values(**values)
+        ).rowcount
+        if updated:
+            return attempt
+        row = dict(values, user_id=user_id, test_number=test_number, attempt_number=attempt,
+                   round_number=round_number)
+        if insert_if_absent(table, row):
+            return attempt
+    raise RuntimeError(f"Could not store round {round_number} of test {test_number} for user {user_id}")
+
+
+@traced('db.store')
+@retry_on_busy()
+def store_score(user_id, username, test_number, round_number, score, correct_words, incorrect_words,
+                metrics=None, idempotent_response=None):
+    """
+    Save one round's score (and the completion notification) in a single commit.
+
+    The whole unit of work lives here so retry_on_busy can replay it after
+    SQLITE_BUSY. `metrics` are the recording's QualityMetrics, stored on the
+    row. `idempotent_response` is an (Idempotency-Key, payload) pair stored in
+    the same commit. Returns the attempt number the round was
+    stored under.
+    """
+    values = {
+        'score': score,
+        'correct_words': correct_words,
+        'incorrect_words': incorrect_words,
+        'test_time': datetime.now(),
+    }
+    if metrics is not None:
+        values.update(score_columns(metrics))
+    attempt_number = _upsert_score(user_id, test_number, round_number, values)
+
+    changed = [GLOBAL, user_scope(user_id)]
+
+    # Create notification when test is completed (round 5)
+    if round_number == 5:
+        changed.append(NOTIFICATIONS)
+        # Create bilingual notification message
+        notification_message = f"🎯 {username} completed Test {test_number} (Attempt {attempt_number}) | کاربر {username} آزمون {test_number} را تکمیل کرد (تلاش {attempt_number})"
+        notification = Notification(
+            user_id=user_id,
+            test_number=test_number,
+            attempt_number=attempt_number,
+            message=notification_message
+        )
+        db.session.add(notification)
+
+    if idempotent_response:
+        key, payload = idempotent_response
+        record_response(user_id, key, 200, payload)
+
+    bump(*changed)
+    with span('db.commit'):
+        db.session.commit()
+    return attempt_number
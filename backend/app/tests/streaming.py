@@ -0,0 +1,247 @@
+"""
+Streaming submission of a round.
+
+Instead of uploading the whole recording when the student stops, the client
+opens a stream and posts raw 16 kHz mono 16-bit PCM chunks while recording:
+
+    POST /api/tests/stream/start                    {test_number, round_number} -> stream_id
+    POST /api/tests/stream/<id>/chunk?seq=N         PCM bytes -> partial transcript and score
+    POST /api/tests/stream/<id>/finish              -> final result, Score row stored
+
+Every chunk is appended to a spool file. A chunk must hold whole samples (an
+even number of bytes); anything else is rejected before it is stored.
+Whenever the audio not yet transcribed contains a pause of at least
+STREAM_SEGMENT_GAP_MS after some speech, everything up to the middle of the
+last such pause is sent to the recognizer as one segment (or after
+STREAM_MAX_SEGMENT_S without a pause). By the time the student stops, only
+the last phrase is left, so finish() costs one short recognizer call instead
+of decode + ASR of the whole round.
+
+Stream state is a small JSON file next to the spool, so any worker process
+can serve any request of a stream. The requests of one stream are
+serialized by locked(): a striped lock per process and an flock on
+``<id>.lock`` across processes, so concurrent chunks cannot overwrite each
+other's seq and transcription offset. Chunks must arrive in order: seq is the
+previous seq + 1, and re-sending the last seq (a client retry) is answered
+without appending twice. A finished stream keeps its result for retries of
+finish until it is purged after STREAM_TTL.
+"""
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; streams are then only serialized within a process
+    fcntl = None
+
+from app.tests.admission import ASRUnavailable
+from app.tests.payload import FRAME_MS, active_frames, frame_rms_db, pcm_to_float
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * SAMPLE_WIDTH
+
+_STREAM_ID = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+NOT_FOUND = 'not_found'
+OUT_OF_ORDER = 'out_of_order'
+TOO_LONG = 'too_long'
+FINISHED = 'finished'
+MISALIGNED = 'misaligned'  # chunk length not a whole number of samples
+
+# taken before the flock: two threads (or greenlets) of one process would
+# otherwise each open the lock file and the second one block the whole worker
+_stripes = [threading.Lock() for _ in range(64)]
+
+
+class StreamError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+def _path(directory, stream_id, suffix):
+    return os.path.join(directory, stream_id + suffix)
+
+
+def save_state(directory, state):
+    path = _path(directory, state['id'], '.json')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def start(directory, user_id, test_number, round_number):
+    """Open a stream; returns its state"""
+    os.makedirs(directory, exist_ok=True)
+    state = {
+        'id': secrets.token_urlsafe(16),
+        'user_id': user_id,
+        'test_number': test_number,
+        'round_number': round_number,
+        'seq': 0,
+        'cut': 0,  # spool bytes already transcribed
+        'segments': [],
+        'created_at': time.time(),
+        'result': None,
+    }
+    open(_path(directory, state['id'], '.pcm'), 'wb').close()
+    save_state(directory, state)
+    return state
+
+
+@contextmanager
+def locked(directory, stream_id):
+    """Hold the lock of `stream_id` across threads and worker processes"""
+    if not _STREAM_ID.match(stream_id) or not os.path.exists(_path(directory, stream_id, '.json')):
+        raise StreamError(NOT_FOUND)
+    with _stripes[hash(stream_id) % len(_stripes)]:
+        if fcntl is None:
+            yield
+            return
+        with open(_path(directory, stream_id, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load(directory, stream_id, user_id):
+    """State of `stream_id` if it belongs to `user_id`; StreamError(NOT_FOUND) otherwise"""
+    if not _STREAM_ID.match(stream_id):
+        raise StreamError(NOT_FOUND)
+    try:
+        with open(_path(directory, stream_id, '.json')) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        raise StreamError(NOT_FOUND)
+    if state['user_id'] != user_id:
+        raise StreamError(NOT_FOUND)
+    return state
+
+
+def append(directory, state, seq, data, max_bytes):
+    """Append chunk `seq`; returns False if it is a retry of the last chunk"""
+    if state['result'] is not None:
+        raise StreamError(FINISHED)
+    if len(data) % SAMPLE_WIDTH:
+        # a dropped half sample would shift every following sample by one byte
+        raise StreamError(MISALIGNED)
+    if seq == state['seq']:
+        return False
+    if seq != state['seq'] + 1:
+        raise StreamError(OUT_OF_ORDER)
+    path = _path(directory, state['id'], '.pcm')
+    if os.path.getsize(path) + len(data) > max_bytes:
+        raise StreamError(TOO_LONG)
+    with open(path, 'ab') as f:
+        f.write(data)
+    state['seq'] = seq
+    return True
+
+
+def read_pcm(directory, state, offset=0):
+    with open(_path(directory, state['id'], '.pcm'), 'rb') as f:
+        f.seek(offset)
+        return f.read()
+
+
+def next_cut(pcm, gap_ms, min_segment_ms, max_segment_ms):
+    """Bytes of `pcm` that form complete segments, cut in the middle of the last pause; 0 if none yet"""
+    import numpy as np
+
+    levels = frame_rms_db(pcm_to_float(pcm), SAMPLE_RATE)
+    if len(levels) == 0:
+        return 0
+    active = active_frames(levels)
+    # runs of silent frames: [starts[i], ends[i])
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], (~active).astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    gaps = (ends - starts >= gap_ms // FRAME_MS) & (starts >= min_segment_ms // FRAME_MS)
+    for gap_start, gap_end in zip(starts[gaps][::-1], ends[gaps][::-1]):
+        if active[:gap_start].any():
+            return int((gap_start + gap_end) // 2) * FRAME_BYTES
+    if len(levels) >= max_segment_ms // FRAME_MS:
+        return len(levels) * FRAME_BYTES
+    return 0
+
+
+def _transcribe_segment(pcm):
+    """Recognizer text of one segment; '' for a segment without speech"""
+    import speech_recognition as sr
+    from app.tests.utils import transcribe
+
+    if not active_frames(frame_rms_db(pcm_to_float(pcm), SAMPLE_RATE)).any():
+        return ''
+    return transcribe(sr.AudioData(pcm, SAMPLE_RATE, SAMPLE_WIDTH))
+
+
+def advance(directory, state, config, final=False):
+    """
+    Transcribe the complete segments not transcribed yet (everything when `final`).
+
+    While streaming, a recognizer outage leaves the audio pending for the
+    next chunk or for finish(); on `final` ASRUnavailable is raised.
+    """
+    pending = read_pcm(directory, state, state['cut'])
+    while pending:
+        if final:
+            cut = len(pending)
+        else:
+            cut = next_cut(pending, config['STREAM_SEGMENT_GAP_MS'], config['STREAM_MIN_SEGMENT_MS'],
+                           config['STREAM_MAX_SEGMENT_S'] * 1000)
+            if not cut:
+                break
+        try:
+            text = _transcribe_segment(pending[:cut])
+        except ASRUnavailable as e:
+            if final:
+                raise
+            logger.warning("Stream %s: segment left pending, recognizer unavailable (%s)", state['id'], e.reason)
+            break
+        if text.strip():
+            state['segments'].append(text)
+        state['cut'] += cut
+        pending = pending[cut:]
+
+
+def transcript(state):
+    return ' '.join(state['segments'])
+
+
+def finish(directory, state, result):
+    """Store the final `result` in the state and drop the spool"""
+    state['result'] = result
+    save_state(directory, state)
+    os.remove(_path(directory, state['id'], '.pcm'))
+
+
+def purge_stale(directory, ttl_seconds):
+    """Remove streams older than `ttl_seconds`; returns the number removed"""
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - ttl_seconds
+    removed = 0
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(directory, name)
+        if os.path.getmtime(path) >= cutoff:
+            continue
+        for suffix in ('.json', '.pcm', '.lock'):
+            try:
+                os.remove(_path(directory, name[:-5], suffix))
+            except FileNotFoundError:
+                pass
+        removed += 1
+    return removed
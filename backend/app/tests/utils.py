@@ -1,7 +1,18 @@
 import os
+import time
+import wave
 from datetime import datetime
-from pydub import AudioSegment
-import speech_recognition as sr
+from flask import current_app
+from app.recordings import round_directory
+from app.tests import quality
+from app.tests.admission import ASRUnavailable, get_governor
+from app.tests.payload import prepare_payload, record_stage
+from app.tests.probe import decode_plan, probe_file, record_decode
+from app.tests.resilience import get_resilience
+from app.tracing import span, traced
+
+# pydub and speech_recognition are imported inside recognize_audio so that
+# processes which never transcribe (CLI, admin-only workers) do not pay for them.
 
 TARGET_WORDS = {
     1: ['تراکتور', 'هویج', 'قناری', 'موکت', 'سیر', 'دوچرخه', 'یخچال', 'ببر', 'اتوبوس', 'میز', 'فلفل', 'گوریل',
@@ -14,21 +25,10 @@ TARGET_WORDS = {
         'سنجاب', 'کلم']
 }
 
-MAX_FILE_SIZE_MB = 5
-ALLOWED_EXTENSIONS = {'mp3', 'm4a', 'wav', 'ogg', 'webm'}
-
+# Common non-target words used by the stub recognizer and synthetic data as intrusions
+INTRUSION_WORDS = ['سلام', 'خانه', 'کتاب', 'درخت', 'آب', 'مداد', 'پنیر', 'دریا', 'سیب', 'کفش', 'ساعت', 'باران']
 
-def allowed_upload(filename, mimetype=None):
-    """Check if uploaded file has a valid extension or mimetype"""
-    if not filename:
-        return False
-    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
-    if ext in ALLOWED_EXTENSIONS:
-        return True
-    if mimetype:
-        if any(fmt in mimetype for fmt in ['wav', 'mpeg', 'ogg', 'webm', 'mp3']):
-            return True
-    return False
+MAX_FILE_SIZE_MB = 5
 
 
 def _infer_extension(filename, mimetype):
@@ -49,6 +49,7 @@ def _infer_extension(filename, mimetype):
     return 'wav'  # fallback default
 
 
+@traced('clean_old_files')
 def clean_old_files(folder_path, keep_last=3):
     """Keep only the last `keep_last` files in folder"""
     if not os.path.exists(folder_path):
@@ -61,10 +62,12 @@ def clean_old_files(folder_path, keep_last=3):
         os.remove(old_file)
 
 
-def save_and_keep_original(audio_file, username, test_number, round_number):
+@traced('save')
+def save_and_keep_original(audio_file, username, test_number, round_number, ext=None):
     """
-    Save uploaded audio exactly as sent (m4a, wav, mp3, ogg, webm).
-    Keep only last 2 files in each round.
+    Save uploaded audio exactly as sent (m4a, wav, mp3, ogg, webm, flac).
+    `ext` is the extension of the probed container; without it the
+    filename/mimetype is used. Keep only last 2 files in each round.
     """
     # check file size
     audio_file.seek(0, os.SEEK_END)
@@ -74,8 +77,9 @@ def save_and_keep_original(audio_file, username, test_number, round_number):
         return None, f"حجم فایل از {MAX_FILE_SIZE_MB} مگابایت بیشتر است"
 
     # determine extension
-    ext = _infer_extension(audio_file.filename, audio_file.mimetype)
-    save_directory = os.path.join('voices', username, f'test_{test_number}', f'round_{round_number}')
+    ext = ext or _infer_extension(audio_file.filename, audio_file.mimetype)
+    save_directory = os.path.join(current_app.config.get('RECORDINGS_DIR', 'voices'),
+                                  round_directory(username, test_number, round_number))
     os.makedirs(save_directory, exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -87,35 +91,144 @@ def save_and_keep_original(audio_file, username, test_number, round_number):
     return save_path, None
 
 
-def recognize_audio(file_path):
-    """Transcribe audio file to text (Farsi)"""
-    recognizer = sr.Recognizer()
-    text = ""
+@traced('save')
+def save_pcm_recording(pcm, username, test_number, round_number, sample_rate=16000):
+    """Store 16-bit mono `pcm` as a WAV next to the uploaded recordings (same naming and retention)"""
+    save_directory = os.path.join(current_app.config.get('RECORDINGS_DIR', 'voices'),
+                                  round_directory(username, test_number, round_number))
+    os.makedirs(save_directory, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    save_path = os.path.join(save_directory, f"{timestamp}.wav")
+    with wave.open(save_path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+
+    clean_old_files(save_directory, keep_last=2)
+    return save_path
+
+
+def _recognizer_calls(audio_content):
+    """
+    (attempt, fallback) for the configured backends.
+
+    attempt(timeout) posts `audio_content` and returns the show_all result
+    shape of recognize_google; fallback() is None unless ASR_FALLBACK is set.
+    Both run without an app context, so the config is read here.
+    """
+    from app.tests import recognizers
+
+    config = current_app.config
+    if config['ASR_BACKEND'] == 'stub':
+        raw_data = audio_content.get_raw_data()
+        latency_ms, latency_per_s_ms = config['ASR_STUB_LATENCY_MS'], config['ASR_STUB_LATENCY_PER_S_MS']
+
+        def attempt(timeout):
+            return recognizers.recognize_stub(raw_data, latency_ms, latency_per_s_ms)
+    else:
+        flac_data, sample_rate = recognizers.google_flac_payload(audio_content)
+        record_stage('flac', len(flac_data))
+        url, key = config['ASR_GOOGLE_URL'], config['ASR_GOOGLE_KEY']
+        if config['ASR_HTTP_POOL_SIZE']:
+            from app.tests.asr_pool import get_speech_client
+            client = get_speech_client()
+
+            def attempt(timeout):
+                return client.recognize(flac_data, sample_rate, key, "fa-IR", timeout)
+        else:
+            def attempt(timeout):
+                return recognizers.recognize_google_http(flac_data, sample_rate, url, key, "fa-IR", timeout)
+
+    fallback = None
+    if config['ASR_FALLBACK'] == 'sphinx':
+        language = config['ASR_SPHINX_LANGUAGE']
+
+        def fallback():
+            return recognizers.recognize_sphinx_offline(audio_content, language)
+    elif config['ASR_FALLBACK'] == 'stub':
+        def fallback():
+            return recognizers.recognize_stub(audio_content.get_raw_data())
+    return attempt, fallback
+
+
+@traced('decode')
+def decode_audio(file_path, probe_result=None):
+    """Decode a stored recording to 16 kHz mono 16-bit ``sr.AudioData``; `probe_result` is its probe() result if known"""
+    import speech_recognition as sr
+
+    if probe_result is None:
+        probe_result = probe_file(file_path)
+    plan = decode_plan(probe_result) if probe_result else 'ffmpeg'
+    start = time.perf_counter()
+    if plan == 'ffmpeg':
+        # compressed input: decode straight to 16 kHz mono 16-bit PCM
+        from pydub import AudioSegment
+        ext = probe_result.extension if probe_result else file_path.rsplit('.', 1)[-1].lower()
+        segment = AudioSegment.from_file(file_path, format=ext)
+        segment = segment.set_frame_rate(16000).set_channels(1).set_sample_width(2)
+        audio_content = sr.AudioData(segment.raw_data, 16000, 2)
+    else:
+        with sr.AudioFile(file_path) as source:
+            audio_content = sr.Recognizer().record(source)
+        if audio_content.sample_rate != 16000 or audio_content.sample_width != 2:
+            # 'native'/'flac' plan at another rate or width (AudioFile already downmixed to mono)
+            audio_content = sr.AudioData(audio_content.get_raw_data(convert_rate=16000, convert_width=2), 16000, 2)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    record_decode(plan, elapsed_ms)
+    current_app.logger.debug("Decoded %s via %s in %.1f ms", file_path, plan, elapsed_ms)
+    return audio_content
+
+
+def transcribe(audio_content):
+    """
+    Recognizer text for 16 kHz mono 16-bit `audio_content`, '' when nothing was recognized.
+
+    The payload is trimmed and normalized first; the call goes through
+    admission control and the resilience layer. Raises ASRUnavailable when
+    the recognizer cannot answer.
+    """
+    import speech_recognition as sr
+
+    with span('payload'):
+        audio_content = prepare_payload(audio_content, current_app.config)
     try:
-        # if not wav, convert temporarily
-        ext = file_path.rsplit('.', 1)[-1].lower()
-        wav_path = file_path
-        if ext != 'wav':
-            tmp_path = os.path.splitext(file_path)[0] + "_tmp.wav"
-            audio_content = AudioSegment.from_file(file_path, format=ext)
-            audio_content = audio_content.set_frame_rate(16000).set_channels(1)
-            audio_content.export(tmp_path, format='wav')
-            wav_path = tmp_path
-
-        with sr.AudioFile(wav_path) as source:
-            audio_content = recognizer.record(source)
-            results = recognizer.recognize_google(audio_content, language="fa-IR", show_all=True)
-            if len(results) > 0:
-                text = " ".join([alt["transcript"] for alt in results["alternative"]])
-
-        if wav_path != file_path and os.path.exists(wav_path):
-            os.remove(wav_path)
-
-    except sr.UnknownValueError:
-        return None
-    return text
+        attempt, fallback = _recognizer_calls(audio_content)
+        resilience = get_resilience()
+        resilience.ensure_available(fallback)
+        # asr minus asr.call is the time spent in the admission queue
+        with span('asr'), get_governor().admit(), span('asr.call', backend=current_app.config['ASR_BACKEND']):
+            results = resilience.call(attempt, fallback)
+    except sr.RequestError as e:
+        # quota exhausted, network or API errors: the client should retry later
+        raise ASRUnavailable(f"recognizer request failed: {e}", current_app.config['ASR_ERROR_RETRY_AFTER']) from e
+    if len(results) == 0:
+        return ""
+    return " ".join([alt["transcript"] for alt in results["alternative"]])
+
+
+def recognize_audio(file_path, probe_result=None):
+    """
+    Transcribe audio file to text (Farsi); `probe_result` is the upload's probe() result if already known.
+
+    Returns (text, QualityMetrics). Raises PoorRecording before any
+    recognizer call if the recording fails the quality gate.
+    """
+    audio_content = decode_audio(file_path, probe_result)
+
+    with span('quality'):
+        metrics = quality.assess(audio_content.get_raw_data(), audio_content.sample_rate)
+        rejection = quality.check(metrics, current_app.config)
+    if rejection:
+        raise quality.PoorRecording(rejection, metrics)
+
+    record_stage('upload', os.path.getsize(file_path))
+    return transcribe(audio_content), metrics
 
 
+@traced('score')
 def calculate_score(transcribed_words, test_number):
     """Compare words with target list and return score, correct, and incorrect words"""
     words_list = transcribed_words.split()
@@ -0,0 +1,352 @@
+"""
+Request tracing.
+
+With TRACING_ENABLED every request gets a trace (a W3C ``traceparent``
+header from the client is continued). Code marks its stages with
+
+    with span('decode', plan=plan):
+        ...
+
+or the @traced('save') decorator; outside a traced request both cost one
+ContextVar lookup. SQL statements of every engine are recorded as ``db``
+spans (statement verb as attribute) by cursor-execute listeners.
+
+At the end of the request:
+
+- the response carries ``Server-Timing`` with the summed duration per span
+  name, e.g. ``decode;dur=41.2, asr;dur=1013.0``: on every response with
+  TRACING_SERVER_TIMING = True, only for logged-in admins with 'admin'
+  (the production default, as the header reveals the request's internals)
+- requests slower than TRACING_SLOW_MS log a one-line span summary on the
+  ``app.tracing`` logger, with the spans as a structured field
+- with TRACING_EXPORT_FILE set, the trace is appended to that file as one
+  OTLP/JSON ExportTraceServiceRequest per line (what the OpenTelemetry
+  collector's otlpjsonfile receiver reads). Encoding and writing happen on
+  a background thread; the file rotates at TRACING_EXPORT_MAX_BYTES.
+"""
+import functools
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import current_app, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('trace', default=None)
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent_id', 'kind', 'start_ns', 'started', 'duration_ms', 'attrs')
+
+    def __init__(self, name, parent_id, kind=SPAN_KIND_INTERNAL, attrs=None):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self.attrs = attrs or {}
+
+    def end(self):
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+
+
+class Trace:
+    __slots__ = ('trace_id', 'root', 'spans', 'stack')
+
+    def __init__(self, name, trace_id=None, parent_id=None, attrs=None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.root = Span(name, parent_id, SPAN_KIND_SERVER, attrs)
+        self.spans = []
+        self.stack = [self.root]
+
+    def summary(self):
+        """{span name: (count, total ms)} in order of first start"""
+        totals = {}
+        for s in sorted(self.spans, key=lambda s: s.started):
+            count, total = totals.get(s.name, (0, 0.0))
+            totals[s.name] = (count + 1, total + (s.duration_ms or 0.0))
+        return totals
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _SpanContext:
+    __slots__ = ('trace', 'span')
+
+    def __init__(self, trace, name, kind, attrs):
+        self.trace = trace
+        self.span = Span(name, trace.stack[-1].span_id, kind, attrs)
+
+    def __enter__(self):
+        self.trace.stack.append(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end()
+        if exc_type is not None:
+            self.span.attrs['error'] = exc_type.__name__
+        self.trace.stack.pop()
+        self.trace.spans.append(self.span)
+        return False
+
+
+def span(name, kind=SPAN_KIND_INTERNAL, **attrs):
+    """Context manager recording `name` as a child of the current span; a no-op outside a trace"""
+    trace = _current.get()
+    if trace is None:
+        return _NO_SPAN
+    return _SpanContext(trace, name, kind, attrs)
+
+
+def traced(name):
+    """Decorator form of span()"""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return f(*args, **kwargs)
+            with _SpanContext(trace, name, SPAN_KIND_INTERNAL, {}):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_trace():
+    return _current.get()
+
+
+# ----------------------
+# DB statements
+# ----------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current.get()
+    if trace is not None:
+        conn.info.setdefault('trace_spans', []).append(
+            _SpanContext(trace, 'db', SPAN_KIND_CLIENT, {'db.operation': statement.split(None, 1)[0].upper()
+                                                         if statement else ''}).__enter__())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get('trace_spans')
+    trace = _current.get()
+    if spans and trace is not None:
+        s = spans.pop()
+        s.end()
+        if trace.stack and trace.stack[-1] is s:
+            trace.stack.pop()
+        trace.spans.append(s)
+
+
+def _handle_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get('trace_spans'):
+        _after_cursor_execute(conn, None, None, None, None, None)
+
+
+_db_listeners = False
+
+
+def _listen_db():
+    global _db_listeners
+    if _db_listeners:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    _db_listeners = True
+
+
+# ----------------------
+# OTLP/JSON file export
+# ----------------------
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_span(trace_id, s):
+    entry = {
+        'traceId': trace_id,
+        'spanId': s.span_id,
+        'name': s.name,
+        'kind': s.kind,
+        'startTimeUnixNano': str(s.start_ns),
+        'endTimeUnixNano': str(s.start_ns + int((s.duration_ms or 0) * 1e6)),
+        'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in s.attrs.items() if v is not None],
+    }
+    if s.parent_id:
+        entry['parentSpanId'] = s.parent_id
+    if 'error' in s.attrs:
+        entry['status'] = {'code': 2}
+    return entry
+
+
+def otlp_request(trace, service_name):
+    """The trace as an OTLP/JSON ExportTraceServiceRequest"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [
+            {'key': 'service.name', 'value': {'stringValue': service_name}},
+            {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}},
+        ]},
+        'scopeSpans': [{
+            'scope': {'name': __name__},
+            'spans': [_otlp_span(trace.trace_id, s) for s in [trace.root] + trace.spans],
+        }],
+    }]}
+
+
+class FileExporter:
+    """Appends finished traces to an OTLP/JSON lines file from a background thread"""
+
+    def __init__(self, path, service_name, max_bytes, backup_count, queue_size=1000):
+        from app.log_pipeline import MultiProcessRotatingFileHandler
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.handler = MultiProcessRotatingFileHandler(path, max_bytes, backup_count)
+        self.handler.setFormatter(logging.Formatter('%(message)s'))
+        self.service_name = service_name
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # started lazily and again in every forked worker
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self.handler.reopen()
+                    self._queue = queue.Queue(self.queue_size)
+                    threading.Thread(target=self._run, name='trace-export', daemon=True).start()
+                    self._pid = os.getpid()
+
+    def export(self, trace):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        q = self._queue
+        while True:
+            trace = q.get()
+            line = json.dumps(otlp_request(trace, self.service_name), separators=(',', ':'))
+            self.handler.handle(logging.makeLogRecord({'msg': line, 'args': None}))
+
+
+_init_lock = threading.Lock()
+
+
+def get_exporter(app=None):
+    """The app's FileExporter, created on first use from the TRACING_EXPORT_* settings"""
+    app = app or current_app._get_current_object()
+    exporter = app.extensions.get('trace_exporter')
+    if exporter is None:
+        with _init_lock:
+            exporter = app.extensions.get('trace_exporter')
+            if exporter is None:
+                exporter = FileExporter(
+                    app.config['TRACING_EXPORT_FILE'], app.config.get('APP_NAME', 'app'),
+                    app.config['TRACING_EXPORT_MAX_BYTES'], app.config['TRACING_EXPORT_BACKUP_COUNT'],
+                )
+                app.extensions['trace_exporter'] = exporter
+    return exporter
+
+
+# ----------------------
+# Request hooks
+# ----------------------
+def _start_trace():
+    trace_id = parent_id = None
+    match = _TRACEPARENT.match(request.headers.get('traceparent', ''))
+    if match:
+        trace_id, parent_id = match.groups()
+    rule = request.url_rule.rule if request.url_rule else request.path
+    trace = Trace(f"{request.method} {rule}", trace_id, parent_id,
+                  {'http.method': request.method, 'http.route': rule})
+    request.environ['app.trace_token'] = _current.set(trace)
+
+
+def _show_server_timing(setting):
+    if setting == 'admin':
+        return current_user.is_authenticated and current_user.is_admin()
+    return bool(setting)
+
+
+def _server_timing(response):
+    trace = _current.get()
+    if trace is None:
+        return response
+    trace.root.end()
+    trace.root.attrs['http.status_code'] = response.status_code
+    if _show_server_timing(current_app.config['TRACING_SERVER_TIMING']):
+        metrics = [f'{name};dur={total:.1f}' + (f';desc="{count}x"' if count > 1 else '')
+                   for name, (count, total) in trace.summary().items()]
+        metrics.append(f'total;dur={trace.root.duration_ms:.1f}')
+        response.headers['Server-Timing'] = ', '.join(metrics)
+    return response
+
+
+def _finish_trace(exc):
+    token = request.environ.pop('app.trace_token', None)
+    trace = _current.get()
+    if token is None or trace is None:
+        return
+    _current.reset(token)
+    if trace.root.duration_ms is None:
+        trace.root.end()
+    if exc is not None:
+        trace.root.attrs['error'] = type(exc).__name__
+
+    config = current_app.config
+    if trace.root.duration_ms >= config['TRACING_SLOW_MS']:
+        parts = ', '.join(f'{name} {total:.0f} ms' + (f' ({count}x)' if count > 1 else '')
+                          for name, (count, total) in trace.summary().items())
+        logger.warning("Slow request %s %.0f ms: %s", trace.root.name, trace.root.duration_ms, parts,
+                       extra={'trace_id': trace.trace_id,
+                              'spans': [{'name': s.name, 'ms': round(s.duration_ms, 1), **s.attrs}
+                                        for s in trace.spans]})
+    if config['TRACING_EXPORT_FILE']:
+        get_exporter().export(trace)
+
+
+def init_tracing(app):
+    """Register the request hooks and DB listeners if TRACING_ENABLED"""
+    if not app.config.get('TRACING_ENABLED'):
+        return
+    _listen_db()
+    app.before_request(_start_trace)
+    app.after_request(_server_timing)
+    app.teardown_request(_finish_trace)
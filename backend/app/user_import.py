@@ -0,0 +1,263 @@
+"""
+Bulk import of study cohorts.
+
+import_users() creates the users of a CSV (header row) or JSONL file with
+the fields username, email, age, sex and password, in four passes:
+
+1. every row is validated with the registration rules of create_user
+   (validate_new_user); rows that repeat a username or email of an earlier
+   row of the file are rejected. A row without a password gets a generated
+   one that satisfies the password policy.
+2. set-based queries (EXISTING_CHUNK names per query, under SQLite's
+   bound-parameter limit) find which of the usernames and emails already
+   exist (case-insensitive, like /api/auth/register); those rows are skipped
+3. the passwords are hashed on a process pool; pbkdf2 with 150k rounds is
+   the bulk of the work and is CPU-bound
+4. the users are inserted with Core executemany in transactions of
+   batch_size rows. If a batch hits a unique constraint (someone registered
+   meanwhile), it is rolled back and retried row by row, so only the
+   conflicting rows fail. The generated passwords of a batch are written
+   to the credentials file (mode 0600) as soon as the batch has committed,
+   so a run that dies halfway leaves no users whose password is unknown.
+
+Problems are reported per row (line number, username, message) instead of
+aborting the import. Runs from `flask import-users`.
+"""
+import csv
+import json
+import logging
+import os
+import secrets
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.auth.utils import PASSWORD_HASH_METHOD, validate_new_user
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('username', 'email', 'age', 'sex', 'password')
+GENERATED_PASSWORD_LENGTH = 16
+EXISTING_CHUNK = 400  # usernames and emails per existence query: 800 parameters
+_SPECIAL = '!@#$%^&*-_=+?'
+
+
+def generate_password(length=GENERATED_PASSWORD_LENGTH):
+    """Random password with at least one upper, lower, digit and special character"""
+    classes = [string.ascii_uppercase, string.ascii_lowercase, string.digits, _SPECIAL]
+    alphabet = ''.join(classes)
+    chars = [secrets.choice(c) for c in classes]
+    chars += [secrets.choice(alphabet) for _ in range(length - len(chars))]
+    secrets.SystemRandom().shuffle(chars)
+    return ''.join(chars)
+
+
+def read_rows(path, fmt=None):
+    """Yield (line number, dict or error message) for every record of a CSV or JSONL file"""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, f"Invalid JSON: {e}"
+                continue
+            yield line_no, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def _parse_row(raw):
+    """The row's fields, cleaned like the register endpoint; raises ValueError"""
+    values = {}
+    for field in FIELDS:
+        value = raw.get(field)
+        if field != 'age' and value is not None:
+            value = str(value)
+        if isinstance(value, str):
+            value = value.strip() or None
+        values[field] = value
+    age = values['age']
+    if age is not None:
+        try:
+            values['age'] = int(age)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid age format")
+    if values['username'] and len(values['username']) > 50 or values['email'] and len(values['email']) > 100:
+        raise ValueError("Username or email too long")
+    if values['email']:
+        values['email'] = values['email'].lower()
+    return values
+
+
+def _hash_password(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+def _existing(usernames, emails):
+    """Lower-cased usernames and emails among the given ones that are already taken"""
+    taken_usernames, taken_emails = set(), set()
+    for start in range(0, max(len(usernames), len(emails)), EXISTING_CHUNK):
+        rows = db.session.execute(
+            select(func.lower(User.username), func.lower(User.email)).where(or_(
+                func.lower(User.username).in_(usernames[start:start + EXISTING_CHUNK]),
+                func.lower(User.email).in_(emails[start:start + EXISTING_CHUNK]),
+            ))
+        ).all()
+        taken_usernames.update(username for username, _ in rows)
+        taken_emails.update(email for _, email in rows)
+    return taken_usernames, taken_emails
+
+
+def _insert(rows, errors):
+    """Insert one batch in a transaction, row by row if it violates a unique constraint; returns the rows inserted"""
+    table = User.__table__
+    try:
+        db.session.execute(insert(table), [values for _, values in rows])
+        db.session.commit()
+        return rows
+    except IntegrityError:
+        db.session.rollback()
+
+    inserted = []
+    for line_no, values in rows:
+        try:
+            db.session.execute(insert(table), [values])
+            db.session.commit()
+            inserted.append((line_no, values))
+        except IntegrityError:
+            db.session.rollback()
+            errors.append((line_no, values['username'], "User already exists"))
+    return inserted
+
+
+def import_users(path, fmt=None, workers=None, batch_size=500, dry_run=False, credentials_path=None):
+    """
+    Create the users of `path`; returns a summary with per-row errors.
+
+    summary['errors'] and summary['skipped'] are lists of (line, username,
+    message); summary['generated'] counts the rows that got a generated
+    password, written to `credentials_path` (default
+    ``<path>.credentials.csv``), which summary['credentials'] names.
+    """
+    started = time.perf_counter()
+    summary = {'rows': 0, 'imported': 0, 'skipped': [], 'errors': [], 'generated': 0, 'credentials': None}
+
+    valid = []
+    seen_usernames, seen_emails = {}, {}
+    for line_no, raw in read_rows(path, fmt):
+        summary['rows'] += 1
+        if isinstance(raw, str):
+            summary['errors'].append((line_no, None, raw))
+            continue
+        try:
+            values = _parse_row(raw)
+            generated = not values['password']
+            if generated:
+                values['password'] = generate_password()
+            validate_new_user(values['username'], values['email'], values['password'],
+                              values['age'], values['sex'])
+            username_key = values['username'].lower()
+            if username_key in seen_usernames:
+                raise ValueError(f"Duplicate username (line {seen_usernames[username_key]})")
+            if values['email'] in seen_emails:
+                raise ValueError(f"Duplicate email (line {seen_emails[values['email']]})")
+        except ValueError as e:
+            summary['errors'].append((line_no, raw.get('username'), str(e)))
+            continue
+        seen_usernames[username_key] = seen_emails[values['email']] = line_no
+        valid.append((line_no, values, generated))
+
+    if valid:
+        taken_usernames, taken_emails = _existing(list(seen_usernames), list(seen_emails))
+        new = []
+        for line_no, values, generated in valid:
+            if values['username'].lower() in taken_usernames or values['email'] in taken_emails:
+                summary['skipped'].append((line_no, values['username'], "User already exists"))
+            else:
+                new.append((line_no, values, generated))
+        valid = new
+    summary['to_import'] = len(valid)
+
+    if dry_run or not valid:
+        summary['elapsed_s'] = time.perf_counter() - started
+        return summary
+
+    passwords = [values['password'] for _, values, _ in valid]
+    if len(passwords) > 1 and workers != 1:
+        workers = min(workers or os.cpu_count() or 1, len(passwords))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            hashes = list(pool.map(_hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+    else:
+        hashes = [_hash_password(password) for password in passwords]
+
+    now = datetime.utcnow()
+    rows = []
+    generated_passwords = {}
+    for (line_no, values, generated), password_hash in zip(valid, hashes):
+        rows.append((line_no, {
+            'username': values['username'],
+            'email': values['email'],
+            'password_hash': password_hash,
+            'age': values['age'],
+            'sex': values['sex'],
+            'role': 'user',
+            'failed_login_attempts': 0,
+            'created_at': now,
+        }))
+        if generated:
+            generated_passwords[line_no] = values['password']
+
+    credentials = None
+    if generated_passwords:
+        summary['credentials'] = credentials_path or path + '.credentials.csv'
+        credentials = CredentialsFile(summary['credentials'])
+    try:
+        for start in range(0, len(rows), batch_size):
+            inserted = _insert(rows[start:start + batch_size], summary['errors'])
+            summary['imported'] += len(inserted)
+            batch_credentials = [(values['username'], values['email'], generated_passwords[line_no])
+                                 for line_no, values in inserted if line_no in generated_passwords]
+            if batch_credentials:
+                credentials.write(batch_credentials)
+                summary['generated'] += len(batch_credentials)
+    finally:
+        if credentials is not None:
+            credentials.close()
+
+    summary['errors'].sort(key=lambda error: error[0])
+    summary['elapsed_s'] = time.perf_counter() - started
+    logger.info("Imported %d of %d users from %s in %.1fs", summary['imported'], summary['rows'], path,
+                summary['elapsed_s'])
+    return summary
+
+
+class CredentialsFile:
+    """CSV of generated passwords, readable only by the owner and synced after every batch"""
+
+    def __init__(self, path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)  # O_CREAT's mode does not apply to an existing file
+        self.file = os.fdopen(fd, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['username', 'email', 'password'])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
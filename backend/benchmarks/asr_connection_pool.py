@@ -0,0 +1,84 @@
+"""
+Per-call connections versus the keep-alive pool for recognizer requests.
+
+Posts the same FLAC payload to benchmarks/fake_asr_server.py with
+recognize_google_http (a new connection per call, like recognize_google)
+and with PooledSpeechClient, from --concurrency threads. The fake server
+delays every new connection by --connect-ms to stand in for the TCP + TLS
+handshake to the real endpoint.
+
+Usage (from backend/):
+    python benchmarks/asr_connection_pool.py --calls 400 --connect-ms 150 --json results/asr_pool.json
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_asr_server
+from common import summarize, write_json
+from http_load_test import fixture_audio
+
+
+def flac_payload():
+    import speech_recognition as sr
+
+    wav = fixture_audio(1)
+    audio = sr.AudioData(wav[44:], 16000, 2)
+    return audio.get_flac_data(convert_width=2)
+
+
+def run(name, recognize, calls, concurrency, server):
+    start_connections = server.connections
+
+    def one(_):
+        start = time.perf_counter()
+        result = recognize()
+        assert result['alternative'], result
+        return (time.perf_counter() - start) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - started
+    summary = {
+        **summarize(latencies),
+        'throughput_rps': calls / elapsed,
+        'connections_opened': server.connections - start_connections,
+    }
+    print(f"{name:<10} p50={summary['p50_ms']:7.1f} ms  p99={summary['p99_ms']:7.1f} ms  "
+          f"{summary['throughput_rps']:7.1f} req/s  connections={summary['connections_opened']}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=30)
+    parser.add_argument('--connect-ms', type=float, default=150)
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    from app.tests.asr_pool import PooledSpeechClient
+    from app.tests.recognizers import recognize_google_http
+
+    flac_data = flac_payload()
+    server, url = fake_asr_server.start(latency_ms=args.latency_ms, connect_ms=args.connect_ms)
+    try:
+        client = PooledSpeechClient(url, args.pool_size)
+        results = {
+            'per_call': run('per-call', lambda: recognize_google_http(flac_data, 16000, url, timeout=10),
+                            args.calls, args.concurrency, server),
+            'pooled': run('pooled', lambda: client.recognize(flac_data, 16000, timeout=10),
+                          args.calls, args.concurrency, server),
+        }
+        results['pooled']['client'] = client.report()
+        client.close()
+    finally:
+        server.shutdown()
+    write_json(args.json_path, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Recognizer resilience against a local fake ASR server.
+
+Runs recognize_audio on a generated WAV through the real Google backend code
+(recognize_google_http) pointed at benchmarks/fake_asr_server.py:
+
+- tail    2% of requests take --tail-ms; call latency with hedging off and on
+- outage  every request fails; the breaker opens and later calls fail fast
+- hang    the server never answers in time; calls end at ASR_TIMEOUT_S
+
+Usage (from backend/):
+    python benchmarks/asr_resilience.py --calls 200 --json results/asr_resilience.json
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_asr_server
+from common import make_app, summarize, write_json
+from http_load_test import fixture_audio
+
+
+def run_calls(app, wav_path, calls, concurrency):
+    """recognize_audio `calls` times; returns (latencies_ms, outcome counts, resilience report)"""
+    from app.tests.admission import ASRUnavailable
+    from app.tests.resilience import get_resilience
+    from app.tests.utils import recognize_audio
+
+    def one(_):
+        with app.app_context():
+            start = time.perf_counter()
+            try:
+                recognize_audio(wav_path)
+                outcome = 'ok'
+            except ASRUnavailable as e:
+                outcome = e.reason
+            return (time.perf_counter() - start) * 1000, outcome
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(calls)))
+    outcomes = {}
+    for _, outcome in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    with app.app_context():
+        report = get_resilience().report()
+    return [ms for ms, _ in results], outcomes, report
+
+
+def scenario(name, wav_path, calls, concurrency, behaviour, **overrides):
+    server, url = fake_asr_server.start(**behaviour)
+    try:
+        app = make_app(None, ASR_BACKEND='google', ASR_GOOGLE_URL=url, ASR_MAX_CONCURRENT=concurrency, **overrides)
+        latencies, outcomes, report = run_calls(app, wav_path, calls, concurrency)
+    finally:
+        server.shutdown()
+    summary = {'latency': summarize(latencies), 'outcomes': outcomes, 'server_requests': server.requests,
+               'resilience': report}
+    lat = summary['latency']
+    print(f"{name:<12} p50={lat['p50_ms']:8.1f} ms  p99={lat['p99_ms']:8.1f} ms  max={lat['max_ms']:8.1f} ms  "
+          f"outcomes={outcomes}  server_requests={server.requests}  hedged={report['hedged']}  "
+          f"breaker={report['breaker_state']}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--tail-ms', type=float, default=1500)
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_path = os.path.join(tmp, 'fixture.wav')
+        with open(wav_path, 'wb') as f:
+            f.write(fixture_audio(1))
+
+        tail = {'latency_ms': args.latency_ms, 'tail_ms': args.tail_ms, 'tail_ratio': 0.02}
+        results = {
+            'tail_no_hedge': scenario('tail/off', wav_path, args.calls, args.concurrency, tail,
+                                      ASR_HEDGE_ENABLED=False),
+            'tail_hedged': scenario('tail/hedged', wav_path, args.calls, args.concurrency, tail,
+                                    ASR_HEDGE_ENABLED=True, ASR_HEDGE_MIN_DELAY_S=0.05, ASR_HEDGE_MIN_SAMPLES=10),
+            'outage': scenario('outage', wav_path, 40, args.concurrency,
+                               {'latency_ms': args.latency_ms, 'error_ratio': 1.0}),
+            'hang': scenario('hang', wav_path, 8, args.concurrency, {'hang_s': 5},
+                             ASR_TIMEOUT_S=1.0, ASR_BREAKER_FAILURES=100),
+        }
+    write_json(args.json_path, results)
+
+
+if __name__ == '__main__':
+    main()
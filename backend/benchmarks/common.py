@@ -0,0 +1,67 @@
+"""Shared helpers for the benchmark scripts (run from backend/)."""
+import json
+import os
+import statistics
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def make_app(database_path=None, **overrides):
+    """
+    Build the app against `database_path` (in-memory when None) with config overrides.
+
+    A throwaway config class is registered under the name 'benchmark' so the
+    regular create_app factory is used unchanged.
+    """
+    import config as config_module
+    from app import create_app
+
+    attrs = {
+        'TESTING': True,
+        'DEBUG': False,
+        'LOG_LEVEL': 'WARNING',
+        'WTF_CSRF_ENABLED': False,
+        'RATELIMIT_ENABLED': False,
+        'SESSION_COOKIE_SECURE': False,
+        'SQLALCHEMY_DATABASE_URI': (
+            'sqlite:///' + os.path.abspath(database_path) if database_path else 'sqlite:///:memory:'
+        ),
+    }
+    attrs.update(overrides)
+    config_module.config['benchmark'] = type('BenchmarkConfig', (config_module.Config,), attrs)
+    return create_app('benchmark')
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of `samples` (pct in 0..100)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    """p50/p95/p99/mean/max summary of a list of millisecond samples"""
+    if not samples_ms:
+        return {'count': 0}
+    return {
+        'count': len(samples_ms),
+        'mean_ms': statistics.fmean(samples_ms),
+        'p50_ms': percentile(samples_ms, 50),
+        'p95_ms': percentile(samples_ms, 95),
+        'p99_ms': percentile(samples_ms, 99),
+        'max_ms': max(samples_ms),
+    }
+
+
+def write_json(path, payload):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {path}")
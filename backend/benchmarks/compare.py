@@ -0,0 +1,74 @@
+"""
+Compare two microbench.py result files and fail on regressions.
+
+A benchmark regresses when candidate/baseline of the chosen statistic exceeds
+1 + threshold. Benchmarks present in only one file are listed but never fail
+the comparison. Exit status is 1 when anything regressed, so this can gate CI.
+
+Usage (from backend/):
+    python benchmarks/compare.py results/base.json results/new.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)['benchmarks']
+
+
+def sort_key(name):
+    """Order 'bench[size]' keys by benchmark name, then numeric size"""
+    bench, _, size = name.rstrip(']').partition('[')
+    return bench, int(size) if size.isdigit() else 0
+
+
+def compare(baseline, candidate, threshold, metric):
+    """Return (rows, regressions); rows are (name, base, new, ratio, status)"""
+    rows = []
+    regressions = []
+    for name in sorted(set(baseline) | set(candidate), key=sort_key):
+        if name not in baseline or name not in candidate:
+            rows.append((name, baseline.get(name, {}).get(metric), candidate.get(name, {}).get(metric), None,
+                         'only in baseline' if name in baseline else 'new'))
+            continue
+        base = baseline[name][metric]
+        new = candidate[name][metric]
+        ratio = new / base if base else float('inf')
+        if ratio > 1 + threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            status = 'faster'
+        else:
+            status = 'same'
+        rows.append((name, base, new, ratio, status))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown ratio (0.10 = 10%%)')
+    parser.add_argument('--metric', default='median_s', choices=['median_s', 'mean_s', 'min_s'])
+    args = parser.parse_args()
+
+    rows, regressions = compare(load(args.baseline), load(args.candidate), args.threshold, args.metric)
+
+    print(f"{'benchmark':<40} {'baseline ms':>12} {'candidate ms':>13} {'ratio':>7}  status")
+    for name, base, new, ratio, status in rows:
+        base_ms = f"{base * 1000:12.3f}" if base is not None else f"{'-':>12}"
+        new_ms = f"{new * 1000:13.3f}" if new is not None else f"{'-':>13}"
+        ratio_str = f"{ratio:7.3f}" if ratio is not None else f"{'-':>7}"
+        print(f"{name:<40} {base_ms} {new_ms} {ratio_str}  {status}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == '__main__':
+    main()
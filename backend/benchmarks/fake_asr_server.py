@@ -0,0 +1,116 @@
+"""
+Local stand-in for Google's speech-api/v2 endpoint.
+
+Accepts the FLAC POSTs made by recognize_google_http and answers in the same
+line-delimited JSON format, with a transcript derived from the body like the
+stub recognizer. Latency and failures are configurable so deadlines,
+hedging and the circuit breaker can be exercised without the real service:
+
+- latency_ms / tail_ms / tail_ratio  base delay, and a slow tail for a share of requests
+- error_ratio                        share of requests answered with HTTP 500
+- hang_s                             when set, every request sleeps this long before answering
+- connect_ms                         delay on every new connection, standing in for TCP/TLS setup
+
+The behaviour dict of a running server can be changed on the fly
+(server.behaviour['error_ratio'] = 1.0) to simulate an outage.
+
+Usage (from backend/):
+    python benchmarks/fake_asr_server.py --port 8765 --latency-ms 80 --tail-ms 2000 --tail-ratio 0.05
+    ASR_GOOGLE_URL=http://127.0.0.1:8765/speech-api/v2/recognize python run.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from app.tests.recognizers import recognize_stub
+
+DEFAULT_BEHAVIOUR = {
+    'latency_ms': 50, 'tail_ms': 0, 'tail_ratio': 0.0, 'error_ratio': 0.0, 'hang_s': 0, 'connect_ms': 0,
+}
+
+
+class FakeASRHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        if self.server.behaviour['connect_ms']:
+            time.sleep(self.server.behaviour['connect_ms'] / 1000)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        behaviour = self.server.behaviour
+        with self.server.lock:
+            self.server.requests += 1
+            rng_value = self.server.rng.random()
+        if behaviour['hang_s']:
+            time.sleep(behaviour['hang_s'])
+        delay_ms = behaviour['latency_ms']
+        if rng_value < behaviour['tail_ratio']:
+            delay_ms = behaviour['tail_ms']
+        time.sleep(delay_ms / 1000)
+
+        if self.server.rng.random() < behaviour['error_ratio']:
+            self._send(500, b'backend error\n', 'text/plain')
+            return
+        result = recognize_stub(body)
+        lines = [{'result': []}, {'result': [result], 'result_index': 0}]
+        payload = ''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines).encode('utf-8')
+        self._send(200, payload, 'application/json; charset=utf-8')
+
+    def _send(self, status, payload, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(host='127.0.0.1', port=0, seed=0, **behaviour):
+    """Serve in a daemon thread; returns (server, recognize URL)"""
+    server = ThreadingHTTPServer((host, port), FakeASRHandler)
+    server.daemon_threads = True
+    server.behaviour = {**DEFAULT_BEHAVIOUR, **behaviour}
+    server.lock = threading.Lock()
+    server.rng = random.Random(seed)
+    server.requests = 0
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/speech-api/v2/recognize"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_BEHAVIOUR['latency_ms'])
+    parser.add_argument('--tail-ms', type=float, default=0)
+    parser.add_argument('--tail-ratio', type=float, default=0.0)
+    parser.add_argument('--error-ratio', type=float, default=0.0)
+    parser.add_argument('--hang-s', type=float, default=0)
+    parser.add_argument('--connect-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    server, url = start(args.host, args.port, latency_ms=args.latency_ms, tail_ms=args.tail_ms,
+                        tail_ratio=args.tail_ratio, error_ratio=args.error_ratio, hang_s=args.hang_s,
+                        connect_ms=args.connect_ms)
+    print(f"Fake ASR listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
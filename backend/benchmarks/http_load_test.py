@@ -0,0 +1,291 @@
+"""
+HTTP load test for the full API.
+
+Virtual users run locust-style scenarios against a live server:
+
+- StudentScenario: logs in, uploads a fixture recording to
+  /api/tests/submit-audio for rounds 1-5 of a random test and polls
+  /api/user-profile after every round
+- AdminScenario: logs in as admin and queries /api/admin/user-results and
+  the notification endpoints
+
+By default the app is started in-process on a temporary SQLite database with
+ASR_BACKEND='stub', so the numbers measure this server rather than the
+recognizer (use --asr-latency-ms to emulate the recognizer's network wait).
+Use --base-url to target an already running server instead; start it with
+ASR_BACKEND=stub in its environment and pass the admin credentials.
+
+Throughput and p50/p95/p99 per endpoint are printed and written to --json.
+
+Usage (from backend/):
+    python benchmarks/http_load_test.py --students 50 --admins 2 --duration 60 --json results/load.json
+    python benchmarks/http_load_test.py --base-url http://127.0.0.1:5000 --admin-password '...'
+"""
+import argparse
+import io
+import logging
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import wave
+from collections import Counter, defaultdict
+
+import requests
+
+from common import make_app, summarize, write_json
+
+STUDENT_PASSWORD = 'LoadTest#2024'
+ADMIN_PASSWORD = 'LoadAdmin#2024'
+
+
+def fixture_audio(seed, seconds=2.0, rate=16000):
+    """Deterministic 16 kHz mono WAV; different seeds give different stub transcripts"""
+    rng = random.Random(seed)
+    freq = 180 + rng.random() * 220
+    frames = bytearray()
+    for n in range(int(seconds * rate)):
+        sample = 0.3 * math.sin(2 * math.pi * freq * n / rate) + 0.05 * (rng.random() - 0.5)
+        frames += int(sample * 32767).to_bytes(2, 'little', signed=True)
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(bytes(frames))
+    return buf.getvalue()
+
+
+class Stats:
+    """Thread-safe per-endpoint latency and status collector"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, name, elapsed_ms, status):
+        with self.lock:
+            self.samples[name].append(elapsed_ms)
+            self.statuses[name][str(status)] += 1
+
+    def report(self, elapsed_s):
+        endpoints = {}
+        for name, samples in sorted(self.samples.items()):
+            statuses = dict(self.statuses[name])
+            failures = sum(c for s, c in statuses.items() if not s.startswith(('2', '3')))
+            endpoints[name] = {
+                **summarize(samples),
+                'rps': len(samples) / elapsed_s if elapsed_s else None,
+                'error_rate': failures / len(samples),
+                'statuses': statuses,
+            }
+        total = sum(len(s) for s in self.samples.values())
+        return {
+            'elapsed_s': elapsed_s,
+            'total_requests': total,
+            'throughput_rps': total / elapsed_s if elapsed_s else None,
+            'endpoints': endpoints,
+        }
+
+
+class VirtualUser:
+    def __init__(self, base_url, stats, username, password, think_time):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.username = username
+        self.password = password
+        self.think_time = think_time
+        self.http = requests.Session()
+
+    def request(self, name, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = self.http.request(method, self.base_url + path, timeout=120, **kwargs)
+        except requests.RequestException as e:
+            self.stats.record(name, (time.perf_counter() - start) * 1000, f"error:{type(e).__name__}")
+            return None
+        self.stats.record(name, (time.perf_counter() - start) * 1000, resp.status_code)
+        return resp
+
+    def login(self):
+        resp = self.request('POST /api/auth/login', 'POST', '/api/auth/login',
+                            json={'username': self.username, 'password': self.password})
+        return resp is not None and resp.status_code == 200
+
+    def think(self, rng):
+        if self.think_time:
+            time.sleep(rng.uniform(0, self.think_time))
+
+
+class StudentScenario(VirtualUser):
+    def __init__(self, *args, recordings, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recordings = recordings
+
+    def run_iteration(self, rng):
+        test_number = rng.randint(1, 4)
+        for round_number in range(1, 6):
+            audio = self.recordings[(test_number * 5 + round_number) % len(self.recordings)]
+            self.request(
+                'POST /api/tests/submit-audio', 'POST', '/api/tests/submit-audio',
+                data={'test_number': test_number, 'round_number': round_number},
+                files={'audio': ('round.wav', audio, 'audio/wav')},
+            )
+            self.request('GET /api/user-profile', 'GET', '/api/user-profile')
+            self.think(rng)
+
+
+class AdminScenario(VirtualUser):
+    def run_iteration(self, rng):
+        self.request('GET /api/admin/user-results', 'GET', '/api/admin/user-results')
+        self.request('GET /api/admin/user-results?approved=Yes', 'GET', '/api/admin/user-results',
+                     params={'approved': 'Yes', 'test_number': rng.randint(1, 4)})
+        self.request('GET /api/admin/notifications', 'GET', '/api/admin/notifications', params={'limit': 20})
+        self.request('GET /api/admin/notifications/count', 'GET', '/api/admin/notifications/count')
+        self.think(rng)
+
+
+def register_students(base_url, count, prefix):
+    """Create the synthetic students through the public register endpoint"""
+    http = requests.Session()
+    usernames = []
+    for i in range(count):
+        username = f"{prefix}_{i}"
+        resp = http.post(f"{base_url}/api/auth/register", json={
+            'username': username, 'email': f"{username}@loadtest.example.com",
+            'password': STUDENT_PASSWORD, 'age': 20 + i % 50, 'sex': 'female' if i % 2 else 'male',
+        })
+        if resp.status_code not in (201, 400):
+            raise RuntimeError(f"Registering {username} failed: {resp.status_code} {resp.text}")
+        usernames.append(username)
+    return usernames
+
+
+def start_local_server(workdir, asr_latency_ms):
+    """Serve the app (stub ASR, temp SQLite file) on a free local port; return (base URL, server)"""
+    from werkzeug.security import generate_password_hash
+    from werkzeug.serving import make_server
+    from app import db
+    from app.models.user import User
+
+    app = make_app(
+        os.path.join(workdir, 'loadtest.db'),
+        ASR_BACKEND='stub',
+        ASR_STUB_LATENCY_MS=asr_latency_ms,
+        UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+    )
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='admin', email='admin@loadtest.example.com', role='admin',
+                            password_hash=generate_password_hash(ADMIN_PASSWORD)))
+        db.session.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def run_load(users, duration, iterations, ramp_up):
+    """Run every virtual user in its own thread until the deadline or iteration budget"""
+    deadline = time.monotonic() + duration
+
+    def loop(index, user):
+        rng = random.Random(index)
+        if not user.login():
+            return
+        done = 0
+        while time.monotonic() < deadline and (not iterations or done < iterations):
+            user.run_iteration(rng)
+            done += 1
+
+    threads = []
+    start = time.perf_counter()
+    for index, user in enumerate(users):
+        t = threading.Thread(target=loop, args=(index, user), daemon=True)
+        t.start()
+        threads.append(t)
+        if ramp_up:
+            time.sleep(ramp_up / len(users))
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+
+def print_report(report):
+    print(f"{'endpoint':<48} {'count':>7} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6}")
+    for name, row in report['endpoints'].items():
+        print(f"{name:<48} {row['count']:>7} {row['rps']:>7.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['error_rate'] * 100:>6.1f}")
+    print(f"total: {report['total_requests']} requests in {report['elapsed_s']:.1f}s "
+          f"({report['throughput_rps']:.1f} req/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', help='target an already running server instead of an in-process one')
+    parser.add_argument('--students', type=int, default=20)
+    parser.add_argument('--admins', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--iterations', type=int, default=0, help='stop each user after N iterations (0 = duration only)')
+    parser.add_argument('--ramp-up', type=float, default=2, help='seconds over which users are started')
+    parser.add_argument('--think-time', type=float, default=0.5, help='max random pause between steps (s)')
+    parser.add_argument('--asr-latency-ms', type=int, default=0, help='stub recognizer delay (in-process server only)')
+    parser.add_argument('--audio', help='upload this file instead of generated WAV fixtures')
+    parser.add_argument('--user-prefix', default='load')
+    parser.add_argument('--admin-username', default='admin')
+    parser.add_argument('--admin-password', default=ADMIN_PASSWORD)
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    # per-request INFO logs of the in-process server would drown the report
+    logging.disable(logging.INFO)
+
+    if args.audio:
+        with open(args.audio, 'rb') as f:
+            recordings = [f.read()]
+    else:
+        recordings = [fixture_audio(seed) for seed in range(8)]
+
+    workdir = tempfile.TemporaryDirectory()
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        # submit_audio stores recordings under ./voices, keep them out of the tree
+        os.chdir(workdir.name)
+        base_url, server = start_local_server(workdir.name, args.asr_latency_ms)
+
+    try:
+        students = register_students(base_url, args.students, args.user_prefix)
+        stats = Stats()
+        users = [
+            StudentScenario(base_url, stats, name, STUDENT_PASSWORD, args.think_time, recordings=recordings)
+            for name in students
+        ] + [
+            AdminScenario(base_url, stats, args.admin_username, args.admin_password, args.think_time)
+            for _ in range(args.admins)
+        ]
+        elapsed = run_load(users, args.duration, args.iterations, args.ramp_up)
+    finally:
+        if server:
+            server.shutdown()
+
+    report = stats.report(elapsed)
+    report['config'] = {
+        'base_url': args.base_url or 'in-process (stub ASR)',
+        'students': args.students,
+        'admins': args.admins,
+        'duration_s': args.duration,
+        'iterations': args.iterations,
+        'think_time_s': args.think_time,
+        'asr_latency_ms': args.asr_latency_ms,
+    }
+    print_report(report)
+    write_json(args.json_path, report)
+    workdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+JSON serialization benchmark on the /api/admin/user-results payload.
+
+Serializes the rows returned by build_user_result_rows() (generated score
+data, see microbench.py) as a full response with each provider:
+
+- flask-default   flask.json.provider.DefaultJSONProvider (stdlib json, sorted keys)
+- fast-stdlib     app.json_provider.FastJSONProvider with orjson disabled
+- fast-orjson     app.json_provider.FastJSONProvider (skipped if orjson is missing)
+
+Median time per response and body size are reported per size.
+
+Usage (from backend/):
+    python benchmarks/json_serialization.py --sizes 1000,10000,100000 --json results/json.json
+"""
+import argparse
+import random
+import statistics
+
+from flask.json.provider import DefaultJSONProvider
+
+from common import make_app, write_json
+from microbench import generate_score_rows, time_runs
+
+
+def providers(app):
+    from app import json_provider
+    from app.json_provider import FastJSONProvider
+
+    yield 'flask-default', DefaultJSONProvider(app), None
+    yield 'fast-stdlib', FastJSONProvider(app), None  # orjson switched off while timing, see below
+    if json_provider.orjson is not None:
+        yield 'fast-orjson', FastJSONProvider(app), json_provider.orjson
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma-separated score row counts')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per timed run')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    from app import json_provider
+    from app.admin.routes import build_user_result_rows
+
+    app = make_app()
+    installed_orjson = json_provider.orjson
+    results = {}
+    for size in [int(s) for s in args.sizes.split(',') if s]:
+        rows = build_user_result_rows(generate_score_rows(size, random.Random(args.seed)))
+        for name, provider, backend in providers(app):
+            json_provider.orjson = backend
+
+            def run():
+                with app.app_context():
+                    return provider.response(rows).get_data()
+            try:
+                body_bytes = len(run())
+                values, loops = time_runs(run, args.repeat, args.min_time)
+            finally:
+                json_provider.orjson = installed_orjson
+
+            median = statistics.median(values)
+            results[f"{name}[{size}]"] = {
+                'benchmark': name,
+                'size': size,
+                'result_rows': len(rows),
+                'loops': loops,
+                'values_s': values,
+                'median_s': median,
+                'mean_s': statistics.fmean(values),
+                'stdev_s': statistics.stdev(values) if len(values) > 1 else 0.0,
+                'min_s': min(values),
+                'body_bytes': body_bytes,
+            }
+            print(f"{name + f'[{size}]':<28} median {median * 1000:10.2f} ms  body {body_bytes / 1024:10.1f} KiB")
+
+    write_json(args.json_path, {'benchmarks': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Microbenchmarks for the CPU-bound pure-Python hot paths.
+
+Benchmarks (each on generated data of increasing size, in score rows):
+
+- calculate_score            scoring one transcript per row
+- build_profile_rows         /api/user-profile attempt grouping
+- build_user_result_rows     /api/admin/user-results attempt grouping + word details
+- notification_to_dict       Notification.to_dict (one notification per 5 rows)
+- jsonify_user_results       jsonify() of the admin result list built from the rows
+
+The runner is pyperf-style: one warmup, loops calibrated so a run lasts at
+least --min-time, then --repeat timed runs. Results (median/mean/stdev/min
+per call and per row) are saved as JSON for benchmarks/compare.py.
+
+Usage (from backend/):
+    python benchmarks/microbench.py --json results/bench.json
+    python benchmarks/microbench.py --sizes 1000,10000 --only build_user_result_rows
+"""
+import argparse
+import datetime
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from common import BACKEND_DIR, make_app, write_json
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+class FakeUser:
+    __slots__ = ('id', 'username', 'age', 'sex')
+
+    def __init__(self, id, username, age, sex):
+        self.id = id
+        self.username = username
+        self.age = age
+        self.sex = sex
+
+
+class FakeScore:
+    """Attribute-compatible stand-in for a loaded Score row (ORM overhead excluded)"""
+    __slots__ = ('user_id', 'user', 'test_number', 'attempt_number', 'round_number',
+                 'score', 'correct_words', 'incorrect_words', 'test_time')
+
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+# ----------------------
+# Data generation
+# ----------------------
+def generate_transcripts(n, rng):
+    from app.tests.utils import TARGET_WORDS, INTRUSION_WORDS
+    transcripts = []
+    for _ in range(n):
+        test_number = rng.randint(1, 4)
+        words = rng.sample(TARGET_WORDS[test_number], rng.randint(3, 12)) + rng.sample(INTRUSION_WORDS, rng.randint(0, 4))
+        rng.shuffle(words)
+        transcripts.append((' '.join(words), test_number))
+    return transcripts
+
+
+def generate_score_rows(n, rng):
+    """`n` score rows: attempts of 5 rounds (~10% incomplete) spread over n/100 users"""
+    from app.tests.utils import TARGET_WORDS, INTRUSION_WORDS
+
+    # A small pool of word lists shared between rows keeps 1M rows affordable in memory
+    word_pool = {
+        t: [(rng.sample(words, rng.randint(2, 10)), rng.sample(INTRUSION_WORDS, rng.randint(0, 3))) for _ in range(64)]
+        for t, words in TARGET_WORDS.items()
+    }
+    users = [FakeUser(i, f"user_{i}", rng.randint(18, 80), rng.choice(['male', 'female'])) for i in range(max(1, n // 100))]
+    start = datetime.datetime(2025, 1, 1)
+    attempts = {}
+    rows = []
+    while len(rows) < n:
+        user = rng.choice(users)
+        test_number = rng.randint(1, 4)
+        attempt_number = attempts.get((user.id, test_number), 0) + 1
+        attempts[(user.id, test_number)] = attempt_number
+        rounds = 5 if rng.random() > 0.1 else rng.randint(1, 4)
+        t0 = start + datetime.timedelta(minutes=rng.randint(0, 500_000))
+        for round_number in range(1, rounds + 1):
+            correct, incorrect = rng.choice(word_pool[test_number])
+            rows.append(FakeScore(
+                user_id=user.id, user=user, test_number=test_number, attempt_number=attempt_number,
+                round_number=round_number, score=len(set(correct)), correct_words=correct,
+                incorrect_words=incorrect, test_time=t0 + datetime.timedelta(minutes=round_number),
+            ))
+    del rows[n:]
+    rng.shuffle(rows)
+    return rows
+
+
+def generate_notifications(n, rng):
+    from app.models.notification import Notification
+    from app.models.user import User
+
+    users = [User(id=i, username=f"user_{i}", email=f"user_{i}@example.com") for i in range(max(1, n // 20))]
+    start = datetime.datetime(2025, 1, 1)
+    notifications = []
+    for i in range(n):
+        user = rng.choice(users)
+        notifications.append(Notification(
+            id=i, user_id=user.id, user=user, test_number=rng.randint(1, 4), attempt_number=rng.randint(1, 5),
+            message=f"🎯 {user.username} completed Test 1 (Attempt 1) | کاربر {user.username} آزمون 1 را تکمیل کرد",
+            is_read=bool(i % 3), created_at=start + datetime.timedelta(seconds=i),
+        ))
+    return notifications
+
+
+# ----------------------
+# Benchmarks: name -> setup(size, rng) returning a zero-argument callable
+# ----------------------
+def setup_calculate_score(size, rng, app):
+    from app.tests.utils import calculate_score
+    transcripts = generate_transcripts(size, rng)
+    return lambda: [calculate_score(text, test_number) for text, test_number in transcripts]
+
+
+def setup_build_profile_rows(size, rng, app):
+    from app.main.routes import build_profile_rows
+    rows = generate_score_rows(size, rng)
+    return lambda: build_profile_rows(rows)
+
+
+def setup_build_user_result_rows(size, rng, app):
+    from app.admin.routes import build_user_result_rows
+    rows = generate_score_rows(size, rng)
+    return lambda: build_user_result_rows(rows)
+
+
+def setup_notification_to_dict(size, rng, app):
+    notifications = generate_notifications(max(1, size // 5), rng)
+    return lambda: [n.to_dict() for n in notifications]
+
+
+def setup_jsonify_user_results(size, rng, app):
+    from flask import jsonify
+    from app.admin.routes import build_user_result_rows
+    result = build_user_result_rows(generate_score_rows(size, rng))
+
+    def run():
+        with app.app_context():
+            return jsonify(result).get_data()
+    return run
+
+
+BENCHMARKS = {
+    'calculate_score': setup_calculate_score,
+    'build_profile_rows': setup_build_profile_rows,
+    'build_user_result_rows': setup_build_user_result_rows,
+    'notification_to_dict': setup_notification_to_dict,
+    'jsonify_user_results': setup_jsonify_user_results,
+}
+
+
+# ----------------------
+# Runner
+# ----------------------
+def time_runs(fn, repeat, min_time):
+    """Warm up, calibrate loops to last >= min_time, then time `repeat` runs; returns (seconds per call list, loops)"""
+    fn()
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    values = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        values.append((time.perf_counter() - start) / loops)
+    return values, loops
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES), help='comma-separated row counts')
+    parser.add_argument('--only', help='comma-separated benchmark names')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per timed run')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    app = make_app()
+
+    results = {}
+    for name in names:
+        for size in sizes:
+            fn = BENCHMARKS[name](size, random.Random(args.seed), app)
+            values, loops = time_runs(fn, args.repeat, args.min_time)
+            median = statistics.median(values)
+            results[f"{name}[{size}]"] = {
+                'benchmark': name,
+                'size': size,
+                'loops': loops,
+                'values_s': values,
+                'median_s': median,
+                'mean_s': statistics.fmean(values),
+                'stdev_s': statistics.stdev(values) if len(values) > 1 else 0.0,
+                'min_s': min(values),
+                'per_row_ns': median / size * 1e9,
+            }
+            print(f"{name + f'[{size}]':<40} median {median * 1000:10.2f} ms  "
+                  f"({median / size * 1e9:8.1f} ns/row, ±{results[f'{name}[{size}]']['stdev_s'] / median * 100:4.1f}%)")
+            del fn
+
+    write_json(args.json_path, {
+        'meta': {
+            'python': sys.version.split()[0],
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'revision': git_revision(),
+            'seed': args.seed,
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+        },
+        'benchmarks': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Write-concurrency benchmark for the SQLite engine profile.
+
+Simulates many students finishing rounds at the same time: every worker
+thread (optionally in several processes, like gunicorn workers) runs the
+same `store_score` unit of work that `submit_audio` commits, against one
+SQLite file. Reports commit throughput, latency percentiles and SQLITE_BUSY
+retries, with the profile enabled or disabled (--baseline).
+
+Usage (from backend/):
+    python benchmarks/sqlite_write_concurrency.py --threads 16 --commits 200
+    python benchmarks/sqlite_write_concurrency.py --baseline --processes 4
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from common import make_app, summarize, write_json
+
+TARGET_WORDS_SAMPLE = ['تراکتور', 'هویج', 'قناری', 'موکت', 'سیر']
+
+
+def prepare_database(path, users, profile):
+    from app import db
+    from app.models.user import User
+
+    app = make_app(path, SQLITE_ENGINE_PROFILE=profile)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            User(username=f"bench_{i}", email=f"bench_{i}@example.com", password_hash='x')
+            for i in range(users)
+        ])
+        db.session.commit()
+
+
+def run_worker(path, profile, worker_index, threads, commits, users):
+    """Run `threads` writer threads in this process; return latencies, errors, busy counters, elapsed"""
+    from app.models.user import User
+    from app.sqlite_profile import busy_stats
+    from app.tests.routes import store_score
+
+    app = make_app(path, SQLITE_ENGINE_PROFILE=profile)
+    with app.app_context():
+        user_rows = [(u.id, u.username) for u in User.query.order_by(User.id).all()]
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def writer(thread_index):
+        slot = worker_index * threads + thread_index
+        local = []
+        for n in range(commits):
+            user_id, username = user_rows[(slot + n * threads) % users]
+            round_number = n % 5 + 1
+            start = time.perf_counter()
+            try:
+                with app.app_context():
+                    store_score(user_id, username, n % 4 + 1, round_number, 3,
+                                TARGET_WORDS_SAMPLE[:3], ['اضافه'])
+                local.append((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, errors, dict(busy_stats), time.perf_counter() - start
+
+
+def _worker_entry(args):
+    return run_worker(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16, help='writer threads per process')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes (gunicorn workers)')
+    parser.add_argument('--commits', type=int, default=100, help='commits per thread')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--baseline', action='store_true', help='disable the SQLite engine profile')
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    profile = not args.baseline
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        prepare_database(path, args.users, profile)
+
+        jobs = [(path, profile, w, args.threads, args.commits, args.users) for w in range(args.processes)]
+        if args.processes == 1:
+            results = [run_worker(*jobs[0])]
+        else:
+            with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+                results = pool.map(_worker_entry, jobs)
+        # writer phase only; process spawn and app boot are excluded
+        elapsed = max(r[3] for r in results)
+
+    latencies = [ms for r in results for ms in r[0]]
+    errors = [e for r in results for e in r[1]]
+    report = {
+        'profile': 'tuned' if profile else 'baseline',
+        'processes': args.processes,
+        'threads_per_process': args.threads,
+        'commits_ok': len(latencies),
+        'commits_failed': len(errors),
+        'elapsed_s': elapsed,
+        'commits_per_s': len(latencies) / elapsed if elapsed else None,
+        'latency': summarize(latencies),
+        'busy_retries': sum(r[2]['retries'] for r in results),
+        'busy_gave_up': sum(r[2]['gave_up'] for r in results),
+        'sample_errors': sorted(set(errors))[:5],
+    }
+
+    lat = report['latency']
+    print(f"profile={report['profile']} processes={args.processes} threads={args.threads}")
+    print(f"commits ok/failed : {report['commits_ok']}/{report['commits_failed']}")
+    print(f"throughput        : {report['commits_per_s']:.1f} commits/s")
+    if lat['count']:
+        print(f"latency p50/p95/p99: {lat['p50_ms']:.1f} / {lat['p95_ms']:.1f} / {lat['p99_ms']:.1f} ms")
+    print(f"busy retries/gave up: {report['busy_retries']}/{report['busy_gave_up']}")
+    write_json(args.json_path, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Startup-time report for the backend.
+
+Boots the app in a fresh interpreter under ``python -X importtime`` (the same
+work a gunicorn worker does on start or restart) and prints:
+
+- wall time for ``import app``, ``create_app()`` and the schema check
+- cumulative import cost per blueprint package (``app.main``, ``app.auth``, ...)
+- the third-party packages with the largest self import time
+
+It exits with status 1 if create_app() imported any of HEAVY_MODULES: those
+are only needed to process a recording or a photo and are imported on first
+use, so workers start without them.
+
+Note that ``-X importtime`` charges a module to whoever imports it first, so a
+dependency shared by two blueprints shows up under the one registered first.
+
+Usage (from backend/):
+    python benchmarks/startup_report.py [--config testing] [--top 15] [--json out.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BLUEPRINT_PACKAGES = ['app.models', 'app.main', 'app.auth', 'app.tests', 'app.admin', 'app.startup']
+
+HEAVY_MODULES = ['numpy', 'PIL', 'pydub', 'speech_recognition']
+
+CHILD_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {backend!r})
+t0 = time.perf_counter()
+import app as app_pkg
+t1 = time.perf_counter()
+application = app_pkg.create_app({config!r})
+t2 = time.perf_counter()
+heavy = [name for name in {heavy!r} if name in sys.modules]
+status = None
+if {check_schema!r}:
+    from app.startup import check_schema
+    status = check_schema(application)
+t3 = time.perf_counter()
+print(json.dumps({{
+    'import_app_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'check_schema_ms': (t3 - t2) * 1000,
+    'schema_status': status,
+    'blueprints': sorted(application.blueprints),
+    'heavy_modules': heavy,
+}}))
+"""
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def parse_importtime(stderr):
+    """Parse ``-X importtime`` output into (module, self_us, cumulative_us) tuples"""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            entries.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return entries
+
+
+def build_report(entries, timings, top):
+    per_blueprint = {}
+    for module, _self_us, cumulative_us in entries:
+        if module in BLUEPRINT_PACKAGES:
+            per_blueprint[module] = cumulative_us / 1000
+
+    per_package = defaultdict(int)
+    for module, self_us, _cumulative_us in entries:
+        root = module.split('.')[0]
+        if root not in ('app', 'config'):
+            per_package[root] += self_us
+    top_packages = sorted(per_package.items(), key=lambda kv: kv[1], reverse=True)[:top]
+
+    return {
+        'timings_ms': timings,
+        'total_import_ms': sum(self_us for _m, self_us, _c in entries) / 1000,
+        'blueprints_ms': per_blueprint,
+        'top_packages_self_ms': {name: us / 1000 for name, us in top_packages},
+    }
+
+
+def print_report(report):
+    timings = report['timings_ms']
+    print(f"import app      : {timings['import_app_ms']:8.1f} ms")
+    print(f"create_app()    : {timings['create_app_ms']:8.1f} ms")
+    print(f"check_schema()  : {timings['check_schema_ms']:8.1f} ms  ({timings['schema_status']})")
+    print(f"all imports     : {report['total_import_ms']:8.1f} ms")
+    heavy = timings['heavy_modules']
+    print(f"heavy modules   : {', '.join(heavy) if heavy else 'none'}")
+    print("-" * 50)
+    print("Cumulative import time per blueprint:")
+    for name in BLUEPRINT_PACKAGES:
+        if name in report['blueprints_ms']:
+            print(f"  {name:<20} {report['blueprints_ms'][name]:8.1f} ms")
+    print("-" * 50)
+    print("Top third-party packages (self time):")
+    for name, ms in report['top_packages_self_ms'].items():
+        print(f"  {name:<20} {ms:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='testing', help='config name passed to create_app')
+    parser.add_argument('--top', type=int, default=15, help='number of third-party packages to list')
+    parser.add_argument('--skip-schema-check', action='store_true', help='do not run app.startup.check_schema')
+    parser.add_argument('--json', dest='json_path', help='also write the report to this JSON file')
+    args = parser.parse_args()
+
+    script = CHILD_SCRIPT.format(backend=BACKEND_DIR, config=args.config, check_schema=not args.skip_schema_check,
+                                 heavy=HEAVY_MODULES)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        sys.exit(proc.returncode)
+
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    report = build_report(parse_importtime(proc.stderr), timings, args.top)
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if timings['heavy_modules']:
+        sys.stderr.write(f"create_app() imported {', '.join(timings['heavy_modules'])}; "
+                         f"import them on first use instead\n")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Result latency of streaming versus one-shot submission.
+
+A round is emulated as --words one-second "words" separated by pauses. For
+each round the script measures the time from the end of recording to the
+result:
+
+- upload   POST /api/tests/submit-audio with the whole WAV
+- stream   chunks of --chunk-ms posted to /api/tests/stream/<id>/chunk while
+           "recording", then /finish; only finish is on the clock
+
+The app runs in-process on a temporary database with the stub recognizer,
+whose latency is --asr-latency-ms plus --asr-per-second-ms per second of
+audio, like a real engine. With --realtime chunks are paced at the speed of
+speech; otherwise they are sent back to back, which only shortens the run.
+
+Usage (from backend/):
+    python benchmarks/streaming_submit.py --rounds 5 --json results/streaming.json
+"""
+import argparse
+import io
+import logging
+import os
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from common import make_app, summarize, write_json
+
+PASSWORD = 'Stream#2024'
+RATE = 16000
+
+
+def round_pcm(words, seed, word_s=1.0, pause_s=0.6):
+    """Tone bursts separated by low noise, as 16-bit PCM bytes"""
+    rng = np.random.default_rng(seed)
+    parts = [rng.normal(0, 0.001, int(0.5 * RATE))]
+    t = np.arange(int(word_s * RATE)) / RATE
+    for _ in range(words):
+        freq = 150 + rng.random() * 250
+        parts.append(0.3 * np.sin(2 * np.pi * freq * t) * np.hanning(len(t)))
+        parts.append(rng.normal(0, 0.001, int(pause_s * RATE)))
+    return (np.concatenate(parts) * 32767).astype('<i2').tobytes()
+
+
+def to_wav(pcm):
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+def upload(client, pcm, test_number, round_number):
+    wav = to_wav(pcm)
+    start = time.perf_counter()
+    response = client.post('/api/tests/submit-audio', data={
+        'test_number': test_number, 'round_number': round_number, 'audio': (io.BytesIO(wav), 'round.wav'),
+    })
+    assert response.status_code == 200, response.json
+    return (time.perf_counter() - start) * 1000
+
+
+def stream(client, pcm, test_number, round_number, chunk_ms, realtime):
+    stream_id = client.post('/api/tests/stream/start', json={
+        'test_number': test_number, 'round_number': round_number,
+    }).json['stream_id']
+    chunk_bytes = RATE * 2 * chunk_ms // 1000
+    began = time.perf_counter()
+    for seq, offset in enumerate(range(0, len(pcm), chunk_bytes), start=1):
+        if realtime:
+            time.sleep(max(0.0, began + offset / (RATE * 2) - time.perf_counter()))
+        response = client.post(f'/api/tests/stream/{stream_id}/chunk?seq={seq}',
+                               data=pcm[offset:offset + chunk_bytes],
+                               content_type='application/octet-stream')
+        assert response.status_code == 200, response.json
+    start = time.perf_counter()
+    response = client.post(f'/api/tests/stream/{stream_id}/finish')
+    assert response.status_code == 200, response.json
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--words', type=int, default=16)
+    parser.add_argument('--chunk-ms', type=int, default=500)
+    parser.add_argument('--asr-latency-ms', type=int, default=300)
+    parser.add_argument('--asr-per-second-ms', type=int, default=100)
+    parser.add_argument('--realtime', action='store_true')
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'), ASR_BACKEND='stub',
+                       ASR_STUB_LATENCY_MS=args.asr_latency_ms, ASR_STUB_LATENCY_PER_S_MS=args.asr_per_second_ms,
+                       RECORDINGS_DIR=os.path.join(tmp, 'voices'), STREAM_DIR=os.path.join(tmp, 'streams'))
+        from app import db
+        from app.auth.utils import create_user
+        with app.app_context():
+            db.create_all()
+            create_user('streamer', 'streamer@example.com', PASSWORD)
+        client = app.test_client()
+        client.post('/api/auth/login', json={'username': 'streamer', 'password': PASSWORD})
+
+        results = {'upload': [], 'stream': []}
+        for n in range(args.rounds):
+            pcm = round_pcm(args.words, seed=n)
+            round_number = n % 5 + 1
+            results['upload'].append(upload(client, pcm, 1, round_number))
+            results['stream'].append(stream(client, pcm, 2, round_number, args.chunk_ms, args.realtime))
+
+    summary = {mode: summarize(samples) for mode, samples in results.items()}
+    for mode, stats in summary.items():
+        print(f"{mode:<7} time to result after recording: p50={stats['p50_ms']:7.1f} ms  max={stats['max_ms']:7.1f} ms")
+    write_json(args.json_path, {'args': vars(args), 'summary': summary})
+
+
+if __name__ == '__main__':
+    main()
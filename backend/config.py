@@ -13,13 +13,72 @@ class Config:
     APP_VERSION = "1.0.0"
     
     # Database config (default SQLite, override for prod)
-    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(basedir, "db", "app.db")
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or "sqlite:///" + os.path.join(basedir, "db", "app.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    MIGRATIONS_DIR = os.path.join(basedir, 'migrations')
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
         'connect_args': {'check_same_thread': False}
     }
+
+    # SQLite engine profile (app/sqlite_profile.py): PRAGMAs applied to every
+    # pooled connection, pool sizing for file databases and SQLITE_BUSY retries
+    SQLITE_ENGINE_PROFILE = True
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -32000,      # KiB (negative = size, not pages)
+        'mmap_size': 134217728,    # 128 MB
+        'temp_store': 'MEMORY',
+    }
+    SQLITE_POOL_SIZE = 8
+    SQLITE_POOL_OVERFLOW = 8
+    SQLITE_POOL_TIMEOUT = 30
+    SQLITE_BUSY_RETRIES = 5
+    SQLITE_BUSY_BACKOFF = 0.05
+    SQLITE_BUSY_BACKOFF_MAX = 1.0
+
+    # Response compression (app.compression); brotli is used when installed
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BR_QUALITY = 5
+    COMPRESS_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html', 'text/csv')
+
+    # File delivery (app.delivery): None, 'x-sendfile' (Apache/lighttpd) or 'x-accel' (nginx)
+    SENDFILE_BACKEND = os.environ.get('SENDFILE_BACKEND') or None
+    SENDFILE_ACCEL_PREFIX = os.environ.get('SENDFILE_ACCEL_PREFIX', '/_protected')
+
+    # Reverse proxies in front of gunicorn (wsgi.py): trusted X-Forwarded-For /
+    # X-Forwarded-Proto hops, so remote_addr is the client and not the proxy
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
+
+    # Prompt audio (app.prompt_audio); variants are built by `flask build-audio-variants`
+    PROMPT_AUDIO_DIR = os.path.join(basedir, 'app', 'static', 'audio')
+    PROMPT_AUDIO_MAX_AGE = 86400
+    PROMPT_AUDIO_VARIANTS = {
+        'low': {'bitrate': '48k', 'channels': 1, 'frame_rate': 22050},
+    }
+
+    # Student recordings (app.recordings); relative paths are relative to the working directory
+    RECORDINGS_DIR = os.environ.get('RECORDINGS_DIR', 'voices')
+    RECORDINGS_CACHE_DIR = os.environ.get('RECORDINGS_CACHE_DIR', 'voices_cache')
+    RECORDINGS_OPUS_BITRATE = '24k'
+    # flask archive-recordings: originals older than this are replaced by Opus at RECORDINGS_OPUS_BITRATE
+    RECORDINGS_ARCHIVE_MIN_AGE = timedelta(days=7)
+    RECORDINGS_ARCHIVE_WORKERS = None  # None: one process per CPU
+
+    # Idempotency-Key handling for submit_audio (app.idempotency)
+    IDEMPOTENCY_TTL = timedelta(hours=24)
+    IDEMPOTENCY_LOCK_TIMEOUT = timedelta(minutes=2)
+
+    # Profile photo thumbnails (app.images)
+    PROFILE_PHOTO_SIZES = (64, 256)
+    PROFILE_PHOTO_DEFAULT_SIZE = 256
+    PROFILE_PHOTO_QUALITY = 82
+    PROFILE_PHOTO_MAX_PIXELS = 40_000_000
     
     # Session security
     SESSION_COOKIE_SECURE = True
@@ -86,13 +145,66 @@ class Config:
     ALLOWED_EXTENSIONS = {"wav", "mp3", "m4a", "flac", "ogg"}
     UPLOAD_SCAN_ENABLED = False
     UPLOAD_QUARANTINE_FOLDER = os.path.join(basedir, 'quarantine')
+
+    # Speech recognition: 'google' (speech_recognition) or 'stub' (deterministic, for load tests)
+    ASR_BACKEND = os.environ.get('ASR_BACKEND', 'google')
+    ASR_STUB_LATENCY_MS = int(os.environ.get('ASR_STUB_LATENCY_MS', 0))
+    ASR_STUB_LATENCY_PER_S_MS = int(os.environ.get('ASR_STUB_LATENCY_PER_S_MS', 0))
+    # Admission control per worker process (app/tests/admission.py)
+    ASR_MAX_CONCURRENT = int(os.environ.get('ASR_MAX_CONCURRENT', 4))
+    ASR_MAX_QUEUE = int(os.environ.get('ASR_MAX_QUEUE', 16))
+    ASR_MAX_WAIT_S = float(os.environ.get('ASR_MAX_WAIT_S', 10))
+    ASR_ERROR_RETRY_AFTER = 10
+    # speech-api/v2 endpoint; point at a local fake server for tests (benchmarks/fake_asr_server.py)
+    ASR_GOOGLE_URL = os.environ.get('ASR_GOOGLE_URL', 'http://www.google.com/speech-api/v2/recognize')
+    ASR_GOOGLE_KEY = os.environ.get('ASR_GOOGLE_KEY')  # None: speech_recognition's shared key
+    # Idle keep-alive connections kept to ASR_GOOGLE_URL per worker (app/tests/asr_pool.py); 0 = new connection per call
+    ASR_HTTP_POOL_SIZE = int(os.environ.get('ASR_HTTP_POOL_SIZE', 8))
+    ASR_HTTP_CONNECT_TIMEOUT_S = 3.0
+    # Deadline, hedging and circuit breaker (app/tests/resilience.py)
+    ASR_TIMEOUT_S = float(os.environ.get('ASR_TIMEOUT_S', 15))
+    ASR_HEDGE_ENABLED = os.environ.get('ASR_HEDGE_ENABLED', 'true').lower() == 'true'
+    ASR_HEDGE_PERCENTILE = 95
+    ASR_HEDGE_MIN_DELAY_S = 0.5
+    ASR_HEDGE_MIN_SAMPLES = 20
+    ASR_HEDGE_MAX_RATIO = 0.1
+    ASR_BREAKER_FAILURES = 5
+    ASR_BREAKER_RESET_S = 30
+    # Engine answering while Google is unavailable: None, 'sphinx' (needs pocketsphinx) or 'stub' (load tests only)
+    ASR_FALLBACK = os.environ.get('ASR_FALLBACK') or None
+    ASR_SPHINX_LANGUAGE = os.environ.get('ASR_SPHINX_LANGUAGE', 'fa-IR')
+    # Payload sent to the recognizer: silence trimmed, loudness normalized (app/tests/payload.py)
+    ASR_PAYLOAD_PAD_MS = 200
+    ASR_PAYLOAD_TARGET_DBFS = -20
+    ASR_PAYLOAD_MAX_GAIN_DB = 20
+    # Recording quality gate, checked before any recognizer call (app/tests/quality.py)
+    QUALITY_MIN_DURATION_S = 1.5
+    QUALITY_MIN_PEAK_DBFS = -40
+    QUALITY_MAX_CLIPPING_RATIO = 0.01
+    QUALITY_MIN_SPEECH_RATIO = 0.1
+    # Streaming submission (app/tests/streaming.py)
+    STREAM_DIR = os.environ.get('STREAM_DIR', 'voices_streams')
+    STREAM_SEGMENT_GAP_MS = 400
+    STREAM_MIN_SEGMENT_MS = 1000
+    STREAM_MAX_SEGMENT_S = 15
+    STREAM_MAX_SECONDS = 300
+    STREAM_MAX_CHUNK_BYTES = 262144  # 8 s of 16 kHz mono 16-bit PCM
+    STREAM_TTL = timedelta(hours=1)
     
-    # Logging configuration
+    # Logging configuration (app/log_pipeline.py): records go through a queue,
+    # a listener thread formats and writes them
     LOG_TO_STDOUT = True
     LOG_LEVEL = "INFO"
+    LOG_FORMAT = 'json'  # stdout format, 'json' or 'text'; the file is always JSON lines
     LOG_FILE = os.path.join(basedir, 'logs', 'app.log')
     LOG_MAX_BYTES = 10485760
     LOG_BACKUP_COUNT = 5
+    LOG_SYSLOG = False
+    LOG_QUEUE_SIZE = 10000  # records beyond this are dropped, never block a request
+    # keep 1 in N records below WARNING of these high-volume loggers
+    LOG_SAMPLING = {
+        'app.tests.admission': 10,
+    }
     
     # Security headers
     SECURITY_HEADERS = {
@@ -115,6 +227,25 @@ class Config:
     
     # Performance settings
     SLOW_QUERY_THRESHOLD = 1.0
+
+    # Request tracing (app/tracing.py)
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'true').lower() == 'true'
+    TRACING_SERVER_TIMING = True  # True: every response, 'admin': admin sessions only, False: never
+    TRACING_SLOW_MS = int(os.environ.get('TRACING_SLOW_MS', 5000))  # log the span summary above this
+    TRACING_EXPORT_FILE = os.environ.get('TRACING_EXPORT_FILE') or None  # OTLP/JSON lines
+    TRACING_EXPORT_MAX_BYTES = 52428800
+    TRACING_EXPORT_BACKUP_COUNT = 3
+
+    # On-demand profiling (app/profiling.py): requests with an X-Profile header
+    # from an admin session or carrying PROFILING_TOKEN; no hooks at all when disabled
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN') or None
+    PROFILING_MODE = os.environ.get('PROFILING_MODE', 'sample')  # 'sample' (folded stacks) or 'cprofile'
+    PROFILING_SAMPLE_INTERVAL_MS = 5
+    PROFILING_TRACEMALLOC_FRAMES = 1
+    PROFILING_TOP_ALLOCATIONS = 25
+    PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(basedir, 'profiles'))
+    PROFILING_MAX_CAPTURES = 50
     
     # Monitoring
     SENTRY_DSN = None
@@ -136,6 +267,7 @@ class DevelopmentConfig(Config):
     MAIL_SUPPRESS_SEND = False 
     TEMPLATES_AUTO_RELOAD = True
     LOG_TO_STDOUT = True
+    LOG_FORMAT = 'text'
     RATELIMIT_DEFAULT = "1000 per hour"
     MAX_LOGIN_ATTEMPTS = 4
 
@@ -148,6 +280,7 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+    # Server-database pool settings; replaced by the SQLite profile when the URI is a SQLite file
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
@@ -159,6 +292,9 @@ class ProductionConfig(Config):
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_SAMESITE = 'Strict'
     LOG_TO_STDOUT = True
+    LOG_SYSLOG = True
+    # per-stage timings and DB statement counts are not for anonymous clients
+    TRACING_SERVER_TIMING = 'admin'
     RATELIMIT_DEFAULT = "100 per hour"
     WTF_CSRF_ENABLED = True
     MAIL_SUPPRESS_SEND = False
@@ -166,29 +302,7 @@ class ProductionConfig(Config):
     @staticmethod
     def init_app(app):
         Config.init_app(app)
-        import logging
-        from logging.handlers import RotatingFileHandler, SysLogHandler
-
-        if not app.config['LOG_TO_STDOUT']:
-            if not os.path.exists('logs'):
-                os.mkdir('logs')
-            file_handler = RotatingFileHandler(
-                app.config['LOG_FILE'],
-                maxBytes=app.config['LOG_MAX_BYTES'],
-                backupCount=app.config['LOG_BACKUP_COUNT']
-            )
-            file_handler.setFormatter(logging.Formatter(
-                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-            ))
-            file_handler.setLevel(logging.INFO)
-            app.logger.addHandler(file_handler)
-
-        if os.path.exists('/dev/log'):
-            syslog_handler = SysLogHandler()
-            syslog_handler.setLevel(logging.WARNING)
-            app.logger.addHandler(syslog_handler)
-
-        app.logger.setLevel(logging.INFO)
+        # handlers are set up by app.startup.init_logging (queue + listener)
         app.logger.info('Application startup')
 
 
@@ -202,6 +316,7 @@ class TestingConfig(Config):
     RATELIMIT_ENABLED = False
     LOG_TO_STDOUT = True
     LOG_LEVEL = 'DEBUG'
+    LOG_FORMAT = 'text'
     PASSWORD_MIN_LENGTH = 4
     MAX_LOGIN_ATTEMPTS = 10
     UPLOAD_FOLDER = '/tmp/test_uploads'
@@ -219,18 +334,10 @@ class TestingConfig(Config):
 
 
 class DockerConfig(ProductionConfig):
+    # JSON lines on stdout (LOG_TO_STDOUT) for the container runtime
     @staticmethod
     def init_app(app):
         ProductionConfig.init_app(app)
-        import logging
-        from logging import StreamHandler
-        handler = StreamHandler()
-        handler.setLevel(logging.INFO)
-        handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s'
-        ))
-        app.logger.addHandler(handler)
-        app.logger.setLevel(logging.INFO)
 
 
 config = {
@@ -0,0 +1,95 @@
+"""
+Gunicorn profile for the production server (run from backend/):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Everything can be overridden with GUNICORN_* environment variables.
+
+Worker class
+    A round submission spends most of its time waiting on the recognizer
+    (up to ASR_TIMEOUT_S plus ASR_MAX_WAIT_S in the admission queue), so a
+    sync worker is tied up for seconds per request. The default is gthread:
+    each worker serves GUNICORN_THREADS requests at once and the ASR client,
+    connection pool and hedging executor are plain threads. GUNICORN_WORKER_CLASS
+    =gevent (pip install gevent) serves many more waiting requests per worker;
+    the stdlib is then monkey-patched below, before the app is preloaded, so
+    the locks and sockets created at import time are cooperative too.
+    benchmarks/worker_classes.py compares the classes under the audio workload.
+
+    ASR_MAX_CONCURRENT and ASR_HTTP_POOL_SIZE are per worker process.
+
+Preloading
+    The app is imported once in the master (preload_app). When the master
+    is ready its database connections are closed and every object that
+    survived a full collection is moved to the permanent generation with
+    gc.freeze(), so the garbage collector of the workers never writes to
+    those pages and they stay shared copy-on-write. Each worker then
+    disposes the engine pool it inherited (app.startup.after_fork).
+
+Recycling
+    Workers are restarted after max_requests (+ jitter, so they do not all
+    restart at once); in-flight requests get graceful_timeout to finish.
+"""
+import gc
+import multiprocessing
+import os
+
+
+def _env(name, default, cast=str):
+    value = os.environ.get(f'GUNICORN_{name}')
+    return cast(value) if value not in (None, '') else default
+
+
+worker_class = _env('WORKER_CLASS', 'gthread')
+
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = _env('BIND', '127.0.0.1:8000')
+workers = _env('WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8), int)
+# gunicorn silently turns a sync worker with threads > 1 into gthread
+threads = _env('THREADS', 8, int) if worker_class == 'gthread' else 1
+worker_connections = _env('WORKER_CONNECTIONS', 200, int)  # gevent only
+
+preload_app = True
+
+# above the longest legitimate request: ASR admission wait + ASR deadline + decoding
+timeout = _env('TIMEOUT', 60, int)
+graceful_timeout = _env('GRACEFUL_TIMEOUT', 30, int)
+keepalive = _env('KEEPALIVE', 5, int)
+
+max_requests = _env('MAX_REQUESTS', 1000, int)
+max_requests_jitter = _env('MAX_REQUESTS_JITTER', 100, int)
+
+# uploads of up to MAX_CONTENT_LENGTH are buffered by the worker, not gunicorn
+limit_request_line = 8190
+
+# heartbeat files on tmpfs: a worker blocked on disk I/O is not killed as "timed out"
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = _env('ACCESS_LOG', None)
+errorlog = _env('ERROR_LOG', '-')
+loglevel = _env('LOG_LEVEL', 'info')
+proc_name = 'neurorecall'
+
+
+def when_ready(server):
+    from app.startup import dispose_engines
+
+    app = server.app.wsgi()
+    dispose_engines(app)
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Preloaded app frozen ({gc.get_freeze_count()} objects), worker class {worker_class}")
+
+
+def post_fork(server, worker):
+    from app.startup import after_fork
+
+    after_fork(server.app.wsgi())
+
+
+def worker_abort(worker):
+    worker.log.warning(f"Worker {worker.pid} aborted after {timeout}s (request timeout)")
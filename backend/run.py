@@ -1,6 +1,7 @@
 import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import click
 from dotenv import load_dotenv
 from flask.cli import FlaskGroup
 from app import create_app, db
@@ -100,6 +101,100 @@ def cleanup_tokens():
     with app.app_context():
         count = cleanup_expired_tokens()
         print(f"Cleaned up {count} expired tokens.")
+        from app.idempotency import purge_expired
+        print(f"Purged {purge_expired()} expired idempotency keys.")
+
+@app.cli.command()
+@click.option('--users', default=1000, show_default=True, help='Number of synthetic users')
+@click.option('--attempts-per-user', default=20, show_default=True, help='Test attempts (up to 5 rounds each) per user')
+@click.option('--seed', default=42, show_default=True, help='Random seed; same seed gives the same rows')
+@click.option('--batch-size', default=10000, show_default=True, help='Rows per Core insert batch')
+@click.option('--prefix', default='synth', show_default=True, help='Username prefix of the synthetic users')
+@click.option('--reset', is_flag=True, help='Delete existing users with this prefix first')
+def seed_synthetic(users, attempts_per_user, seed, batch_size, prefix, reset):
+    """Bulk-insert synthetic users, scores and notifications for scale testing.
+
+    About 1M score rows: --users 10000 --attempts-per-user 21
+    """
+    from app.synthetic import seed_synthetic as run_seed, delete_synthetic, SYNTHETIC_PASSWORD
+
+    with app.app_context():
+        if reset:
+            print(f"Deleted {delete_synthetic(prefix)} existing '{prefix}_' users.")
+        try:
+            counts = run_seed(users, attempts_per_user, seed, batch_size, prefix)
+        except ValueError as e:
+            print(str(e))
+            return
+        print(f"Inserted {counts['users']} users, {counts['scores']} scores and "
+              f"{counts['notifications']} notifications in {counts['elapsed_s']:.1f}s "
+              f"(password: {SYNTHETIC_PASSWORD})")
+
+@app.cli.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Input format (default: from the file extension)')
+@click.option('--workers', type=int, default=None, help='Password hashing processes (default: one per CPU)')
+@click.option('--batch-size', default=500, show_default=True, help='Users per insert transaction')
+@click.option('--credentials-out', type=click.Path(dir_okay=False), default=None,
+              help='CSV for generated passwords (default: <path>.credentials.csv)')
+@click.option('--dry-run', is_flag=True, help='Only validate and check for existing users')
+def import_users(path, fmt, workers, batch_size, credentials_out, dry_run):
+    """Bulk-create a cohort from CSV or JSONL (username, email, age, sex, password).
+
+    Rows without a password get a generated one, written to --credentials-out.
+    """
+    from app.user_import import import_users as run_import
+
+    with app.app_context():
+        summary = run_import(path, fmt, workers, batch_size, dry_run, credentials_out)
+    for line_no, username, message in summary['errors']:
+        print(f"Line {line_no} ({username or '-'}): {message}")
+    for line_no, username, message in summary['skipped']:
+        print(f"Line {line_no} ({username}): skipped, {message.lower()}")
+    if dry_run:
+        print(f"{summary['to_import']} of {summary['rows']} rows would be imported "
+              f"({len(summary['skipped'])} existing, {len(summary['errors'])} invalid).")
+        return
+    if summary['generated']:
+        print(f"Generated passwords for {summary['generated']} users written to {summary['credentials']}")
+    print(f"Imported {summary['imported']} of {summary['rows']} rows in {summary['elapsed_s']:.1f}s "
+          f"({len(summary['skipped'])} existing skipped, {len(summary['errors'])} errors).")
+
+@app.cli.command()
+@click.option('--min-age-days', type=float, default=None,
+              help='Only recordings older than this (default: RECORDINGS_ARCHIVE_MIN_AGE)')
+@click.option('--workers', type=int, default=None, help='Transcoding processes (default: RECORDINGS_ARCHIVE_WORKERS)')
+@click.option('--dry-run', is_flag=True, help='Only count the recordings that would be archived')
+def archive_recordings(min_age_days, workers, dry_run):
+    """Transcode stored recordings to 16 kHz mono Opus and report reclaimed space (needs ffmpeg)."""
+    from app.recording_archive import archive_recordings as run_archive
+
+    if min_age_days is None:
+        min_age = app.config['RECORDINGS_ARCHIVE_MIN_AGE'].total_seconds()
+    else:
+        min_age = min_age_days * 86400
+    summary = run_archive(app.config['RECORDINGS_DIR'], min_age, app.config['RECORDINGS_OPUS_BITRATE'],
+                          workers or app.config['RECORDINGS_ARCHIVE_WORKERS'], dry_run=dry_run)
+    if dry_run:
+        print(f"{summary['candidates']} recordings ({summary['candidate_bytes'] / 1e6:.1f} MB) would be archived.")
+        return
+    print(f"Archived {summary['archived']} of {summary['candidates']} recordings "
+          f"({summary['not_smaller']} not smaller, {summary['skipped']} removed meanwhile, "
+          f"{summary['failed']} failed): "
+          f"{summary['bytes_before'] / 1e6:.1f} MB -> {summary['bytes_after'] / 1e6:.1f} MB, "
+          f"reclaimed {summary['reclaimed_bytes'] / 1e6:.1f} MB")
+
+@app.cli.command()
+@click.option('--force', is_flag=True, help='Re-encode variants that are already up to date')
+def build_audio_variants(force):
+    """Precompute the lower-bitrate prompt audio variants (needs ffmpeg)."""
+    from app.prompt_audio import build_variants
+
+    written = build_variants(app.config['PROMPT_AUDIO_DIR'], app.config['PROMPT_AUDIO_VARIANTS'], force=force)
+    for path in written:
+        print(f"Wrote {path}")
+    print(f"{len(written)} variant file(s) written.")
 
 @app.cli.command()
 def show_config():
@@ -120,71 +215,6 @@ def show_config():
                 value = "Not set"
         print(f"{key}: {value}")
 
-# ----------------------------
-# Logging
-# ----------------------------
-def init_logging():
-    import logging
-    from logging.handlers import RotatingFileHandler
-
-    if app.logger.hasHandlers():
-        return
-
-    log_level = getattr(logging, app.config.get('LOG_LEVEL', 'INFO').upper())
-    app.logger.setLevel(log_level)
-    formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-
-    if app.config.get('LOG_TO_STDOUT'):
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(log_level)
-        console_handler.setFormatter(formatter)
-        app.logger.addHandler(console_handler)
-
-    if not app.config.get('TESTING'):
-        log_file = app.config.get('LOG_FILE')
-        if log_file:
-            log_dir = os.path.dirname(log_file)
-            if log_dir and not os.path.exists(log_dir):
-                os.makedirs(log_dir)
-            file_handler = RotatingFileHandler(
-                log_file,
-                maxBytes=app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
-                backupCount=app.config.get('LOG_BACKUP_COUNT', 5)
-            )
-            file_handler.setLevel(logging.INFO)
-            file_handler.setFormatter(formatter)
-            app.logger.addHandler(file_handler)
-
-# ----------------------------
-# Error Handlers
-# ----------------------------
-def setup_error_handlers():
-    @app.errorhandler(404)
-    def not_found_error(error):
-        return {'error': 'Not found'}, 404
-
-    @app.errorhandler(500)
-    def internal_error(error):
-        db.session.rollback()
-        app.logger.error(f'Server Error: {error}')
-        return {'error': 'Internal server error'}, 500
-
-# ----------------------------
-# Production config validation
-# ----------------------------
-def validate_production_config():
-    if os.environ.get('FLASK_ENV') != 'production':
-        return
-
-    required_configs = [
-        'SECRET_KEY',
-        'MAIL_DEFAULT_SENDER',
-        'DATABASE_URL'
-    ]
-    missing_configs = [k for k in required_configs if not os.environ.get(k)]
-    if missing_configs:
-        app.logger.warning(f"Missing required production configurations: {', '.join(missing_configs)}")
-
 # ----------------------------
 # Development server
 # ----------------------------
@@ -209,18 +239,10 @@ def run_development_server():
 # ----------------------------
 # Initialize
 # ----------------------------
-init_logging()
-setup_error_handlers()
-validate_production_config()
+from app.startup import prepare_app
 
-with app.app_context():
-    try:
-        db.create_all()
-        app.logger.info("Database tables verified/created successfully")
-    except Exception as e:
-        app.logger.error(f"Database initialization error: {str(e)}")
-        if __name__ == '__main__':
-            sys.exit(1)
+if not prepare_app(app) and __name__ == '__main__':
+    sys.exit(1)
 
 # ----------------------------
 # Run if main
@@ -0,0 +1,124 @@
+"""
+Fixtures for the request-path tests (run from backend/: python -m pytest -q).
+
+Every test gets its own app on a temporary SQLite file, with recordings and
+stream state under tmp_path and the deterministic stub recognizer, so no
+test touches voices/ or the network.
+"""
+import io
+import os
+import sys
+import wave
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+RATE = 16000
+PASSWORD = 'Tester#2024'
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'config(**overrides): app config overrides for the test')
+
+
+@pytest.fixture
+def app(request, tmp_path):
+    """The app on a fresh database; a @pytest.mark.config(...) marker overrides settings"""
+    import config as config_module
+    from app import create_app, db
+
+    attrs = {
+        'TESTING': True,
+        'DEBUG': False,
+        'LOG_LEVEL': 'WARNING',
+        'LOG_TO_STDOUT': True,
+        'WTF_CSRF_ENABLED': False,
+        'RATELIMIT_ENABLED': False,
+        'SESSION_COOKIE_SECURE': False,
+        'PROFILING_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.db'),
+        'RECORDINGS_DIR': str(tmp_path / 'voices'),
+        'STREAM_DIR': str(tmp_path / 'streams'),
+        'ASR_BACKEND': 'stub',
+        'ASR_FALLBACK': None,
+    }
+    marker = request.node.get_closest_marker('config')
+    if marker:
+        attrs.update(marker.kwargs)
+    config_module.config['pytest'] = type('PytestConfig', (config_module.Config,), attrs)
+    app = create_app('pytest')
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def login(app):
+    """Factory: a test client logged in as a new user"""
+    from app.auth.utils import create_user
+
+    def factory(username='tester'):
+        with app.app_context():
+            create_user(username, f'{username}@example.com', PASSWORD)
+        client = app.test_client()
+        response = client.post('/api/auth/login', json={'username': username, 'password': PASSWORD})
+        assert response.status_code == 200, response.json
+        return client
+
+    return factory
+
+
+@pytest.fixture
+def client(login):
+    return login()
+
+
+def speech_pcm(words=3, seed=0, word_s=1.0, pause_s=0.6, amplitude=0.3):
+    """Tone bursts separated by low noise, as 16 kHz mono 16-bit PCM bytes"""
+    rng = np.random.default_rng(seed)
+    parts = [rng.normal(0, 0.001, int(0.5 * RATE))]
+    t = np.arange(int(word_s * RATE)) / RATE
+    for _ in range(words):
+        freq = 150 + rng.random() * 250
+        parts.append(amplitude * np.sin(2 * np.pi * freq * t) * np.hanning(len(t)))
+        parts.append(rng.normal(0, 0.001, int(pause_s * RATE)))
+    return (np.clip(np.concatenate(parts), -1, 1) * 32767).astype('<i2').tobytes()
+
+
+def to_wav(pcm):
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def submit(client):
+    """Factory: POST a round to /api/tests/submit-audio as a WAV upload"""
+
+    def factory(pcm=None, test_number=1, round_number=1, headers=None, client=client):
+        wav = to_wav(speech_pcm() if pcm is None else pcm)
+        return client.post('/api/tests/submit-audio', headers=headers or {}, data={
+            'test_number': test_number, 'round_number': round_number, 'audio': (io.BytesIO(wav), 'round.wav'),
+        })
+
+    return factory
+
+
+@pytest.fixture
+def score_count(app):
+    """Number of Score rows right now"""
+    from app.models.score import Score
+
+    def count():
+        with app.app_context():
+            return Score.query.count()
+
+    return count
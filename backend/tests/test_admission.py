@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from app.tests.admission import AdmissionGovernor, ASRUnavailable, get_governor
+
+
+def test_queue_full_is_shed_right_away():
+    governor = AdmissionGovernor(max_concurrent=1, max_queue=0, max_wait=10)
+    with governor.admit():
+        with pytest.raises(ASRUnavailable) as excinfo:
+            with governor.admit():
+                pass
+    assert excinfo.value.reason == 'rejected_queue_full'
+    assert excinfo.value.retry_after >= 1
+    assert governor.stats['rejected_queue_full'] == 1
+    assert governor.active == 0
+
+
+def test_queued_request_times_out():
+    governor = AdmissionGovernor(max_concurrent=1, max_queue=1, max_wait=0.05)
+    with governor.admit():
+        with pytest.raises(ASRUnavailable) as excinfo:
+            with governor.admit():
+                pass
+    assert excinfo.value.reason == 'rejected_timeout'
+    assert governor.waiting == 0
+
+
+def test_queued_request_is_admitted_when_a_slot_frees():
+    governor = AdmissionGovernor(max_concurrent=1, max_queue=1, max_wait=5)
+    entered, release = threading.Event(), threading.Event()
+
+    def hold():
+        with governor.admit():
+            entered.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    entered.wait(5)
+    threading.Timer(0.05, release.set).start()
+    with governor.admit():
+        assert governor.active == 1
+    holder.join(5)
+    assert governor.stats['admitted'] == 2
+    assert governor.stats['waited'] == 1
+
+
+def test_retry_after_grows_with_backlog():
+    governor = AdmissionGovernor(max_concurrent=2, max_queue=4, max_wait=5)
+    governor.service_ewma = 3.0
+    governor.active, governor.waiting = 2, 4
+    assert governor.retry_after() == 9
+
+
+@pytest.mark.config(ASR_MAX_CONCURRENT=1, ASR_MAX_QUEUE=0)
+def test_submit_answers_503_with_retry_after(app, submit, score_count):
+    governor = get_governor(app)
+    governor.service_ewma = 4.0
+    with governor.admit():
+        response = submit()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '4'
+    assert 'error' in response.json
+    assert score_count() == 0
+
+    response = submit()
+    assert response.status_code == 200, response.json
+    assert score_count() == 1
@@ -0,0 +1,85 @@
+import io
+
+from conftest import speech_pcm, to_wav
+
+KEY = {'Idempotency-Key': 'round-1-upload'}
+
+
+def test_replay_returns_stored_result(submit, score_count, monkeypatch):
+    first = submit(headers=KEY)
+    assert first.status_code == 200, first.json
+    assert 'Idempotent-Replayed' not in first.headers
+
+    from app.tests import utils
+
+    def fail(audio_content):
+        raise AssertionError("a replay must not transcribe again")
+
+    monkeypatch.setattr(utils, 'transcribe', fail)
+    retry = submit(headers=KEY)
+    assert retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.json == first.json
+    assert score_count() == 1
+
+
+def test_without_key_every_request_is_stored(submit, score_count):
+    assert submit().status_code == 200
+    assert submit().status_code == 200
+    assert score_count() == 2
+
+
+def test_key_reused_for_other_round(submit, score_count):
+    assert submit(headers=KEY).status_code == 200
+    response = submit(round_number=2, headers=KEY)
+    assert response.status_code == 422
+    assert score_count() == 1
+
+
+def test_key_reused_for_other_audio(submit, score_count):
+    assert submit(headers=KEY).status_code == 200
+    response = submit(speech_pcm(seed=1), headers=KEY)
+    assert response.status_code == 422
+    assert score_count() == 1
+
+
+def test_keys_are_per_user(login, submit, score_count):
+    assert submit(headers=KEY).status_code == 200
+    response = submit(headers=KEY, client=login('other'))
+    assert response.status_code == 200
+    assert 'Idempotent-Replayed' not in response.headers
+    assert score_count() == 2
+
+
+def test_in_flight_claim_answers_409(app, submit, score_count):
+    from app.idempotency import CLAIMED, claim, request_fingerprint
+    from app.models.user import User
+
+    with app.app_context():
+        user = User.query.filter_by(username='tester').one()
+        fingerprint = request_fingerprint(1, 1, stream=io.BytesIO(to_wav(speech_pcm())))
+        state, _ = claim(user.id, KEY['Idempotency-Key'], fingerprint)
+        assert state == CLAIMED
+    response = submit(headers=KEY)
+    assert response.status_code == 409
+    assert response.headers['Retry-After'] == '2'
+    assert score_count() == 0
+
+
+def test_failed_request_releases_claim(submit, score_count, monkeypatch):
+    from app.tests import utils
+
+    def fail(audio_content):
+        raise RuntimeError("recognizer crashed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(utils, 'transcribe', fail)
+        assert submit(headers=KEY).status_code == 500
+    response = submit(headers=KEY)
+    assert response.status_code == 200, response.json
+    assert 'Idempotent-Replayed' not in response.headers
+    assert score_count() == 1
+
+
+def test_overlong_key_is_rejected(submit):
+    assert submit(headers={'Idempotency-Key': 'k' * 256}).status_code == 400
@@ -0,0 +1,58 @@
+"""The write paths on a database without INSERT ... ON CONFLICT, emulated on SQLite"""
+import pytest
+
+from app.models.score import Score
+
+KEY = {'Idempotency-Key': 'portable-round'}
+
+
+@pytest.fixture(autouse=True)
+def no_upsert(monkeypatch):
+    from app import data_version, idempotency
+    from app.tests import routes
+
+    for module in (routes, idempotency, data_version):
+        monkeypatch.setattr(module, 'supports_upsert', lambda: False)
+
+
+def attempts(app):
+    with app.app_context():
+        return sorted((s.attempt_number, s.round_number) for s in Score.query.all())
+
+
+def test_rounds_allocate_and_reuse_attempts(app, submit):
+    for round_number in (1, 2, 2, 1, 2):
+        response = submit(round_number=round_number)
+        assert response.status_code == 200, response.json
+    assert attempts(app) == [(1, 1), (1, 2), (2, 1), (2, 2)]
+
+
+def test_round_stored_meanwhile_is_written_over(app, submit, monkeypatch):
+    from app.tests import routes
+
+    insert_if_absent = routes.insert_if_absent
+    races = []
+
+    def racing(table, row):
+        if not races:
+            # another request stores the same round between our UPDATE and INSERT
+            races.append(insert_if_absent(table, dict(row, score=0)))
+        return insert_if_absent(table, row)
+
+    assert submit(round_number=1).status_code == 200
+    monkeypatch.setattr(routes, 'insert_if_absent', racing)
+    response = submit(round_number=2)
+    assert response.status_code == 200, response.json
+    assert races == [True]
+    assert attempts(app) == [(1, 1), (1, 2)]
+    with app.app_context():
+        assert Score.query.filter_by(round_number=2).one().score == response.json['correct_words']
+
+
+def test_idempotency_key_without_upsert(submit, score_count):
+    first = submit(headers=KEY)
+    assert first.status_code == 200, first.json
+    retry = submit(headers=KEY)
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert submit(round_number=2, headers=KEY).status_code == 422
+    assert score_count() == 1
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from conftest import RATE, speech_pcm
+
+from app.tests import quality
+
+THRESHOLDS = {
+    'QUALITY_MIN_DURATION_S': 1.5,
+    'QUALITY_MIN_PEAK_DBFS': -40,
+    'QUALITY_MAX_CLIPPING_RATIO': 0.01,
+    'QUALITY_MIN_SPEECH_RATIO': 0.1,
+}
+
+
+def pcm(samples):
+    return (np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes()
+
+
+def check(data):
+    return quality.check(quality.assess(data, RATE), THRESHOLDS)
+
+
+def test_speech_passes():
+    assert check(speech_pcm()) is None
+
+
+def test_too_short():
+    assert check(speech_pcm(words=1, word_s=0.5, pause_s=0.2)) == quality.TOO_SHORT
+
+
+def test_empty_recording_is_too_short():
+    metrics = quality.assess(b'', RATE)
+    assert metrics.duration_s == 0
+    assert quality.check(metrics, THRESHOLDS) == quality.TOO_SHORT
+
+
+def test_silent():
+    rng = np.random.default_rng(0)
+    assert check(pcm(rng.normal(0, 0.0005, 3 * RATE))) == quality.SILENT
+
+
+def test_clipped():
+    t = np.arange(3 * RATE) / RATE
+    assert check(pcm(2.0 * np.sin(2 * np.pi * 220 * t))) == quality.CLIPPED
+
+
+def test_single_click_has_no_speech():
+    rng = np.random.default_rng(0)
+    samples = rng.normal(0, 0.001, 3 * RATE)
+    samples[RATE:RATE + RATE // 50] = 0.5
+    assert check(pcm(samples)) == quality.NO_SPEECH
+
+
+@pytest.mark.parametrize('key, value, expected', [
+    ('QUALITY_MIN_DURATION_S', 60, quality.TOO_SHORT),
+    ('QUALITY_MIN_PEAK_DBFS', 0, quality.SILENT),
+    ('QUALITY_MAX_CLIPPING_RATIO', -1, quality.CLIPPED),
+    ('QUALITY_MIN_SPEECH_RATIO', 1.01, quality.NO_SPEECH),
+])
+def test_thresholds_come_from_config(key, value, expected):
+    metrics = quality.assess(speech_pcm(), RATE)
+    assert quality.check(metrics, dict(THRESHOLDS, **{key: value})) == expected
+
+
+def test_submit_rejects_before_recognizer(submit, score_count, monkeypatch):
+    from app.tests import utils
+
+    def fail(audio_content):
+        raise AssertionError("the recognizer must not be called")
+
+    monkeypatch.setattr(utils, 'transcribe', fail)
+    response = submit(speech_pcm(words=1, word_s=0.5, pause_s=0.2))
+    assert response.status_code == 400
+    assert response.json['quality'] == quality.TOO_SHORT
+    assert score_count() == 0
+
+
+def test_submit_stores_quality_metrics(app, submit):
+    from app.models.score import Score
+
+    response = submit()
+    assert response.status_code == 200, response.json
+    with app.app_context():
+        score = Score.query.one()
+        assert score.audio_duration_s == pytest.approx(len(speech_pcm()) / 2 / RATE)
+        assert score.audio_speech_ratio > THRESHOLDS['QUALITY_MIN_SPEECH_RATIO']
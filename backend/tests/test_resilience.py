@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from app.tests.admission import ASRUnavailable
+from app.tests.resilience import CLOSED, HALF_OPEN, OPEN, ASRResilience, CircuitBreaker, get_resilience
+
+RESULT = {'alternative': [{'transcript': 'ok'}], 'final': True}
+
+
+def resilience(timeout=1.0, failures=2, reset=30, **kwargs):
+    kwargs.setdefault('hedge_enabled', False)
+    return ASRResilience(timeout, CircuitBreaker(failures, reset), **kwargs)
+
+
+def failing(timeout):
+    raise ConnectionError("recognizer down")
+
+
+def test_deadline_raises_unavailable():
+    layer = resilience(timeout=0.05)
+    release = threading.Event()
+    with pytest.raises(ASRUnavailable) as excinfo:
+        layer.call(lambda timeout: release.wait(5))
+    release.set()
+    assert excinfo.value.reason == 'timeout'
+    assert layer.stats['timeouts'] == 1
+    assert layer.breaker.failures == 1
+
+
+def test_attempt_gets_remaining_time_as_timeout():
+    timeouts = []
+    resilience(timeout=2.0).call(lambda timeout: timeouts.append(timeout) or RESULT)
+    assert 1.5 < timeouts[0] <= 2.0
+
+
+def test_breaker_opens_and_fails_fast():
+    layer = resilience(failures=2)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            layer.call(failing)
+    assert layer.breaker.state == OPEN
+
+    calls = []
+    with pytest.raises(ASRUnavailable) as excinfo:
+        layer.call(lambda timeout: calls.append(timeout) or RESULT)
+    assert excinfo.value.reason == 'circuit_open'
+    assert 1 <= excinfo.value.retry_after <= 30
+    assert calls == []
+    assert layer.stats['short_circuited'] == 1
+
+
+def test_half_open_trial_closes_or_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # only one trial call
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_fallback_answers_while_open():
+    layer = resilience(failures=1)
+    fallback = {'alternative': [{'transcript': 'fallback'}], 'final': True}
+    assert layer.call(failing, lambda: fallback) == fallback
+    assert layer.breaker.state == OPEN
+    assert layer.call(failing, lambda: fallback) == fallback
+    assert layer.stats['fallbacks'] == 2
+
+
+def test_slow_attempt_is_hedged():
+    layer = resilience(timeout=2.0, hedge_enabled=True, hedge_min_samples=1, hedge_min_delay=0.05,
+                       hedge_max_ratio=1.0)
+    layer.attempt_latency.add(0.01)
+    attempts = []
+
+    def attempt(timeout):
+        attempts.append(timeout)
+        if len(attempts) == 1:
+            time.sleep(1.0)
+        return RESULT
+
+    assert layer.call(attempt) == RESULT
+    assert len(attempts) == 2
+    assert layer.stats['hedged'] == layer.stats['hedge_wins'] == 1
+
+
+@pytest.mark.config(ASR_BREAKER_FAILURES=1, ASR_BREAKER_RESET_S=20)
+def test_submit_answers_503_while_breaker_is_open(app, submit, score_count):
+    get_resilience(app).breaker.record_failure()
+    response = submit()
+    assert response.status_code == 503
+    assert 1 <= int(response.headers['Retry-After']) <= 20
+    assert score_count() == 0
@@ -0,0 +1,59 @@
+import subprocess
+import sys
+
+from sqlalchemy import inspect, text
+
+from conftest import BACKEND_DIR
+
+from app import db
+from app.startup import BASELINE_REVISION, check_schema, prepare_app
+
+
+def reset_to_baseline(app):
+    """The database as db.create_all() used to leave it: baseline tables, no alembic_version"""
+    from flask_migrate import upgrade
+
+    with app.app_context():
+        db.drop_all()
+        upgrade(directory=app.config['MIGRATIONS_DIR'], revision=BASELINE_REVISION)
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP TABLE alembic_version'))
+
+
+def revision(app):
+    with app.app_context(), db.engine.connect() as connection:
+        return connection.execute(text('SELECT version_num FROM alembic_version')).scalar()
+
+
+def test_empty_database_is_created_at_head(app):
+    with app.app_context():
+        db.drop_all()
+    assert check_schema(app) == 'created'
+    assert check_schema(app) == 'current'
+
+
+def test_baseline_database_is_stamped_and_refused(app):
+    reset_to_baseline(app)
+    assert check_schema(app) == 'behind'
+    assert revision(app) == BASELINE_REVISION
+    assert not prepare_app(app)
+
+    from flask_migrate import upgrade
+    with app.app_context():
+        upgrade(directory=app.config['MIGRATIONS_DIR'])
+        assert 'idempotency_keys' in inspect(db.engine).get_table_names()
+    assert prepare_app(app)
+
+
+def test_unknown_unversioned_database_is_refused(app):
+    # create_all() of the current models: not the baseline, and no revision to go by
+    assert check_schema(app) == 'unversioned'
+    with app.app_context():
+        assert not inspect(db.engine).has_table('alembic_version')
+    assert not prepare_app(app)
+
+
+def test_create_app_imports_no_heavy_modules():
+    proc = subprocess.run([sys.executable, 'benchmarks/startup_report.py', '--skip-schema-check'],
+                          cwd=BACKEND_DIR, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import RATE, speech_pcm
+
+from app.tests import streaming
+from app.tests.admission import ASRUnavailable
+
+CHUNK_BYTES = RATE * 2 // 2  # 500 ms
+
+
+def start(client, test_number=1, round_number=1):
+    response = client.post('/api/tests/stream/start', json={'test_number': test_number, 'round_number': round_number})
+    assert response.status_code == 201, response.json
+    return response.json['stream_id']
+
+
+def chunk(client, stream_id, seq, data):
+    return client.post(f'/api/tests/stream/{stream_id}/chunk?seq={seq}', data=data,
+                       content_type='application/octet-stream')
+
+
+def chunks(pcm):
+    return [pcm[offset:offset + CHUNK_BYTES] for offset in range(0, len(pcm), CHUNK_BYTES)]
+
+
+def spool(app, stream_id):
+    return open(os.path.join(app.config['STREAM_DIR'], stream_id + '.pcm'), 'rb').read()
+
+
+def stream_round(client, pcm):
+    stream_id = start(client)
+    for seq, data in enumerate(chunks(pcm), start=1):
+        response = chunk(client, stream_id, seq, data)
+        assert response.status_code == 200, response.json
+        assert response.json['seq'] == seq
+    return stream_id
+
+
+def test_chunks_are_appended_in_order(app, client):
+    pcm = speech_pcm()
+    stream_id = stream_round(client, pcm)
+    assert spool(app, stream_id) == pcm
+
+
+def test_segments_are_transcribed_while_streaming(client):
+    stream_id = start(client)
+    responses = [chunk(client, stream_id, seq, data) for seq, data in enumerate(chunks(speech_pcm()), start=1)]
+    assert responses[-1].json['transcribed_words']
+    assert not responses[0].json['transcribed_words']
+
+
+def test_retried_chunk_is_not_appended_twice(app, client):
+    pcm = speech_pcm()
+    parts = chunks(pcm)
+    stream_id = start(client)
+    assert chunk(client, stream_id, 1, parts[0]).status_code == 200
+    assert chunk(client, stream_id, 2, parts[1]).status_code == 200
+    retry = chunk(client, stream_id, 2, parts[1])
+    assert retry.status_code == 200
+    assert retry.json['seq'] == 2
+    assert spool(app, stream_id) == parts[0] + parts[1]
+
+
+@pytest.mark.parametrize('seq', [4, 1, 0])
+def test_out_of_order_chunk_is_rejected(app, client, seq):
+    parts = chunks(speech_pcm())
+    stream_id = start(client)
+    chunk(client, stream_id, 1, parts[0])
+    chunk(client, stream_id, 2, parts[1])
+    response = chunk(client, stream_id, seq, parts[2])
+    assert response.status_code == 409
+    assert response.json['code'] == streaming.OUT_OF_ORDER
+    assert spool(app, stream_id) == parts[0] + parts[1]
+
+
+def test_odd_length_chunk_is_rejected(app, client):
+    parts = chunks(speech_pcm())
+    stream_id = start(client)
+    assert chunk(client, stream_id, 1, parts[0]).status_code == 200
+    response = chunk(client, stream_id, 2, parts[1] + b'\0')
+    assert response.status_code == 400
+    assert response.json['code'] == streaming.MISALIGNED
+    assert chunk(client, stream_id, 2, parts[1]).json['seq'] == 2
+    assert spool(app, stream_id) == parts[0] + parts[1]
+
+
+def test_resume_after_lost_response(client):
+    """A client that lost a response resumes from the seq the retry reports"""
+    parts = chunks(speech_pcm())
+    stream_id = start(client)
+    for seq, data in enumerate(parts[:3], start=1):
+        chunk(client, stream_id, seq, data)
+    resumed = chunk(client, stream_id, 3, parts[2]).json['seq']
+    for seq, data in enumerate(parts[resumed:], start=resumed + 1):
+        assert chunk(client, stream_id, seq, data).status_code == 200
+    assert client.post(f'/api/tests/stream/{stream_id}/finish').status_code == 200
+
+
+def test_finish_stores_score_and_replays(app, client, score_count):
+    stream_id = stream_round(client, speech_pcm())
+    first = client.post(f'/api/tests/stream/{stream_id}/finish')
+    assert first.status_code == 200, first.json
+    assert first.json['transcribed_words']
+    assert not os.path.exists(os.path.join(app.config['STREAM_DIR'], stream_id + '.pcm'))
+
+    retry = client.post(f'/api/tests/stream/{stream_id}/finish')
+    assert retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.json == first.json
+    assert score_count() == 1
+
+    response = chunk(client, stream_id, 99, b'\0\0')
+    assert response.status_code == 409
+    assert response.json['code'] == streaming.FINISHED
+
+
+def test_finish_retried_after_failed_state_save_stores_one_score(client, score_count, monkeypatch):
+    finish = streaming.finish
+
+    def disk_full(directory, state, result):
+        raise OSError(28, 'No space left on device')
+
+    stream_id = stream_round(client, speech_pcm())
+    with monkeypatch.context() as patch:
+        patch.setattr(streaming, 'finish', disk_full)
+        assert client.post(f'/api/tests/stream/{stream_id}/finish').status_code == 500
+    assert score_count() == 1
+
+    assert streaming.finish is finish
+    retry = client.post(f'/api/tests/stream/{stream_id}/finish')
+    assert retry.status_code == 200, retry.json
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.json['transcribed_words']
+    assert score_count() == 1
+    # the stream state was repaired: later retries replay from it
+    assert client.post(f'/api/tests/stream/{stream_id}/finish').json == retry.json
+    assert score_count() == 1
+
+
+def test_finish_applies_quality_gate(client, score_count):
+    stream_id = stream_round(client, speech_pcm(words=1, word_s=0.5, pause_s=0.2))
+    response = client.post(f'/api/tests/stream/{stream_id}/finish')
+    assert response.status_code == 400
+    assert response.json['quality'] == 'too_short'
+    assert score_count() == 0
+
+
+def test_outage_leaves_audio_pending_until_finish(client, score_count, monkeypatch):
+    from app.tests import utils
+
+    transcribe = utils.transcribe
+
+    def unavailable(audio_content):
+        raise ASRUnavailable('rejected_queue_full', 3)
+
+    monkeypatch.setattr(utils, 'transcribe', unavailable)
+    stream_id = start(client)
+    for seq, data in enumerate(chunks(speech_pcm()), start=1):
+        response = chunk(client, stream_id, seq, data)
+        assert response.status_code == 200
+        assert response.json['transcribed_words'] == []
+
+    response = client.post(f'/api/tests/stream/{stream_id}/finish')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+    assert score_count() == 0
+
+    monkeypatch.setattr(utils, 'transcribe', transcribe)
+    response = client.post(f'/api/tests/stream/{stream_id}/finish')
+    assert response.status_code == 200, response.json
+    assert 'Idempotent-Replayed' not in response.headers
+    assert response.json['transcribed_words']
+    assert score_count() == 1
+
+
+def test_stream_of_another_user_is_not_found(client, login):
+    stream_id = start(client)
+    response = chunk(login('other'), stream_id, 1, b'\0\0')
+    assert response.status_code == 404
+    assert response.json['code'] == streaming.NOT_FOUND
+
+
+def test_unknown_stream_is_not_found(client):
+    assert chunk(client, 'x' * 22, 1, b'\0\0').status_code == 404
+    assert chunk(client, '../../etc', 1, b'\0\0').status_code == 404
+
+
+@pytest.mark.config(STREAM_MAX_SECONDS=1)
+def test_stream_longer_than_limit_is_rejected(client):
+    parts = chunks(speech_pcm())
+    stream_id = start(client)
+    assert chunk(client, stream_id, 1, parts[0]).status_code == 200
+    assert chunk(client, stream_id, 2, parts[1]).status_code == 200
+    response = chunk(client, stream_id, 3, parts[2])
+    assert response.status_code == 413
+    assert response.json['code'] == streaming.TOO_LONG
+
+
+def test_requests_of_one_stream_are_serialized(tmp_path):
+    state = streaming.start(str(tmp_path), 1, 1, 1)
+    inside, overlaps = [], []
+
+    def hold():
+        with streaming.locked(str(tmp_path), state['id']):
+            inside.append(1)
+            overlaps.append(len(inside))
+            time.sleep(0.02)
+            inside.pop()
+
+    threads = [threading.Thread(target=hold) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert overlaps == [1, 1, 1, 1]
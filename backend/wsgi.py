@@ -0,0 +1,31 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Unlike run.py this module only builds the app and runs the one-time setup
+(logging, error handlers, schema check); it registers no CLI commands and
+never starts the development server. FLASK_ENV defaults to 'production'.
+Behind nginx set PROXY_FIX_HOPS=1 so per-IP login limits see the client.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app import create_app
+from app.startup import prepare_app
+
+app = create_app(os.environ.get('FLASK_ENV', 'production'))
+
+if app.config['PROXY_FIX_HOPS']:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    hops = app.config['PROXY_FIX_HOPS']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+if not prepare_app(app):
+    raise RuntimeError("Database schema is not usable (check failed or not at head); see the log above")